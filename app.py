@@ -1,12 +1,18 @@
 import sys
 import os
+import base64
 import json
 import math
+import time
 import warnings
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, g
 from flask_cors import CORS
 import traceback
 from src.Agent_Based_Traffic_Simulation.core.Logger import Logger
+from src.Agent_Based_Traffic_Simulation.core.FrameEncoder import FrameEncoder
+from src.Agent_Based_Traffic_Simulation.core.SimulationRunner import SimulationRunner
+from src.Agent_Based_Traffic_Simulation.core.SessionRegistry import SessionRegistry, SessionLimitError
+from src.Agent_Based_Traffic_Simulation.core.ServerMetrics import ServerMetrics, PROMETHEUS_CONTENT_TYPE
 
 import numpy as np
 import logging
@@ -22,11 +28,74 @@ app = Flask(__name__)
 CORS(app)
 warnings.filterwarnings("ignore", category=UserWarning)
 
-simulation_model = None
-simulation_type = None
 dt = 40 #ms
 
-logger = None
+frame_encoder = FrameEncoder()
+
+# Every browser session gets its own model, logger and runner (see SessionRegistry)
+registry = SessionRegistry(
+    max_sessions=int(os.environ.get('SIM_MAX_SESSIONS', 16)),
+    max_memory_bytes=int(os.environ.get('SIM_MAX_MEMORY_MB', 512)) * 1024 * 1024,
+    idle_timeout_s=float(os.environ.get('SIM_IDLE_TIMEOUT_S', 15 * 60)),
+)
+SESSION_COOKIE = 'sim_session'
+
+# Request counts and latencies for /api/metrics, werkzeug's request log is off
+server_metrics = ServerMetrics()
+
+SSE_KEEP_ALIVE_S = 15
+MAX_ADVANCE_STEPS = 100_000
+MAX_ADVANCE_FRAMES = 1_000 # all of them are built while the session lock is held and kept until the response
+
+
+def encode_stream_frame(model, window=None):
+    # SSE only carries text, so the binary frame goes out base64 encoded
+    return base64.b64encode(frame_encoder.encode_binary(model, window)).decode('ascii')
+
+
+def request_window():
+    # ?y_min=&y_max=(&zoom=) is the part of the highway the client shows, only agents near it are sent
+    if 'y_min' not in request.args or 'y_max' not in request.args:
+        return None
+    zoom = float(request.args['zoom']) if 'zoom' in request.args else None
+    return FrameEncoder.view_window(float(request.args['y_min']), float(request.args['y_max']), zoom)
+
+
+def encode_delta_frame(session, base_seq=None, window=None):
+    if base_seq is None:
+        base_seq = int(request.args.get('base', -1))
+    keyframe = request.args.get('keyframe', 'false').lower() == 'true'
+    return session.delta_encoder.encode(session.model, base_seq, keyframe, window)
+
+
+def get_session():
+    # ?session_id= wins over the cookie so scripts can drive several sessions at once.
+    # Held until the request ends (release_session), the registry doesn't evict a session a request is using
+    if 'session' not in g:
+        g.session = registry.acquire(request.args.get('session_id') or request.cookies.get(SESSION_COOKIE))
+    return g.session
+
+
+def no_session_response():
+    return jsonify({'status': 'error', 'message': 'No simulation initialized'}), 400
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # The route pattern, not the path, so the endpoint label only takes a handful of values
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    server_metrics.observe_request(endpoint, response.status_code, time.perf_counter() - g.request_started)
+    return response
+
+@app.teardown_request
+def release_session(exception):
+    session = g.pop('session', None)
+    if session is not None:
+        registry.release(session)
 
 
 @app.route('/')
@@ -35,9 +104,7 @@ def index():
 
 @app.route('/api/init')
 def init_simulation():
-    global simulation_model, simulation_type, logger, logging_dt
     try:
-    
         from src.Agent_Based_Traffic_Simulation.core.TrafficModel import TrafficModel
         from src.Agent_Based_Traffic_Simulation.core.Highway import Highway
         print(request.args)
@@ -51,7 +118,8 @@ def init_simulation():
         is_logging = (request.args.get('is_logging_agents', 'false').lower()) == 'true'
         print(f"is_logging: {is_logging}")
         logging_dt = int(request.args.get('logging_dt', 40))
-        logger = Logger( logging_dt, is_logging )
+        logging_mode = request.args.get('logging_mode', 'sync')
+        logging_backpressure = request.args.get('logging_backpressure', 'block')
 
         aggressive_pct = float(request.args.get('aggressive_pct', 30))
         defensive_pct = float(request.args.get('defensive_pct', 70))
@@ -67,16 +135,30 @@ def init_simulation():
         }
         
         agent_rate = float(request.args.get('agent_rate', 0.5))
+        # ?is_profiling=true times every phase of the step, read it back from /api/profile
+        is_profiling = request.args.get('is_profiling', 'false').lower() == 'true'
 
         generate_agents = True
 
         highway_width = highway_lanes * lane_size * 1.01 # 1.01 due to index out of bounds exceptions
  
-        highway = Highway(highway_width, highway_length, highway_lanes, lane_size)
-        simulation_model = TrafficModel(n_agents,1, dt, highway, generate_agents, agent_rate, percents_and_ratios)
-        simulation_type = 'traffic'
+        real_time_factor = float(request.args.get('real_time_factor', 1.0))
+        max_fps = float(request.args.get('max_fps', 30))
 
-        return jsonify({
+        def build():
+            logger = Logger( logging_dt, is_logging, mode=logging_mode, backpressure=logging_backpressure )
+            highway = Highway(highway_width, highway_length, highway_lanes, lane_size)
+            model = TrafficModel(n_agents,1, dt, highway, generate_agents, agent_rate, percents_and_ratios, is_profiling=is_profiling)
+            return model, logger, SimulationRunner(model, logger, encode_stream_frame, real_time_factor, max_fps)
+
+        session_id = request.args.get('session_id') or request.cookies.get(SESSION_COOKIE) or registry.new_session_id()
+        try:
+            session = registry.create(session_id, build)
+        except SessionLimitError as e:
+            return jsonify({'status': 'error', 'message': f'Server is full: {e}'}), 503
+        simulation_model = session.model
+
+        response = jsonify({
             'status': 'success',
             'message': 'Traffic simulation initialized',
             'x_max': simulation_model.highway.x_max,
@@ -84,8 +166,11 @@ def init_simulation():
             # send lane count and width in case you want to draw lanes later
             'lane_count': len(simulation_model.highway.lanes),
             'lane_width': int(simulation_model.highway.lanes[0].lane_width) if simulation_model.highway.lanes else None,
-                'lane_centers': [int(l.start_position[0]) for l in simulation_model.highway.lanes]
+                'lane_centers': [int(l.start_position[0]) for l in simulation_model.highway.lanes],
+            'session_id': session_id,
         })
+        response.set_cookie(SESSION_COOKIE, session_id, samesite='Lax')
+        return response
 
     except Exception:
         print("Exception in /api/init:\n" + traceback.format_exc())
@@ -93,78 +178,180 @@ def init_simulation():
 
 @app.route('/api/step')
 def step_simulation():
-    global simulation_model, simulation_type
-    if simulation_model is None:
-        return jsonify({'status': 'error', 'message': 'No simulation initialized'}), 400
+    session = get_session()
+    if session is None:
+        return no_session_response()
+
+    if session.runner.is_running:
+        return jsonify({'status': 'error', 'message': 'Simulation is running on the server loop'}), 409
 
     try:
-        simulation_model.step()
-
-        logger.log_all(simulation_model)
-
-
-        agents_data = []
-        aggregate_data = []
-        avg_speed = 0
-        for agent in list(simulation_model.agents):
-          
-            # Real-world values straight from the model (mm, mm/ms)
-            x = float(agent.vehicle.position[0])
-            y = float(agent.vehicle.position[1])
-            vx = float(agent.vehicle.velocity[0])
-            vy = float(agent.vehicle.velocity[1])
-            speed = np.linalg.norm(agent.vehicle.velocity)
-            length_mm = float(agent.vehicle.length)  # already mm
-            width_mm = float(agent.vehicle.width)    # already mm
-            # Heading in radians from velocity; fall back to lane direction if stopped
-            if speed > 0:
-                heading = math.atan2(vy, vx)
-            else:
-                lane = simulation_model.highway.lanes[agent.lane_intent]
-                dx, dy = (lane.end_position - lane.start_position)
-                heading = math.atan2(float(dy), float(dx))
-            dt = simulation_model.dt
-            agents_data.append({
-                'id': agent.unique_id,
-                'x': x,                # mm
-                'y': y,                # mm
-                'vx': vx,              # mm/ms
-                'vy': vy,              # mm/ms
-                'speed': speed,        # mm/ms
-                'length': length_mm,   # mm
-                'width': width_mm,     # mm
-                'heading': heading,    # radians
-                'drive_strategy': getattr(agent.current_drive_strategy, "name", "unknown"),
-                'sensing_distance':  getattr(agent, "sensing_distance", "unknown"),
-            })
-            avg_speed += speed
-
-        avg_speed = 0 if len(agents_data) == 0 else avg_speed / len(simulation_model.agents)
-        avg_speed *= 2.23694   #convert to miles per hour
-        total_time = simulation_model.total_time / 1000 #convert to seconds
-        aggregate_data.append({
-            'avg_speed': round(float(avg_speed), 2),
-            'time_elapsed' : round(float(total_time) , 2)
-        })
+        with session.lock:
+            started = time.perf_counter()
+            session.model.step()
+            stepped = time.perf_counter()
+            session.logger.log_all(session.model)
+            logged = time.perf_counter()
 
-        return jsonify({
-            'status': 'success',
-            'agents': agents_data,
-            'aggregateData': aggregate_data,
-            'step': simulation_model.steps
-        })
+            # ?format=binary packs every agent into typed arrays instead of one JSON object per agent,
+            # ?format=delta only sends what changed since frame ?base= that the client applied last
+            frame_format = request.args.get('format', 'json')
+            window = request_window()
+            if frame_format == 'delta':
+                response = Response(encode_delta_frame(session, window=window), mimetype='application/octet-stream')
+            elif frame_format == 'binary':
+                response = Response(frame_encoder.encode_binary(session.model, window), mimetype='application/octet-stream')
+            else:
+                response = jsonify(frame_encoder.encode_json(session.model, window))
+            server_metrics.observe_step(stepped - started, logged - stepped, time.perf_counter() - logged)
+            return response
 
     except Exception:
         print("Exception in /api/step:\n" + traceback.format_exc())
         return jsonify({'status': 'error', 'message': 'Step failed'}), 500
 
+@app.route('/api/advance')
+def advance_simulation():
+    """
+    Fast forward by ?steps=N or ?seconds=S of simulated time in one call.
+    Only the final frame is built, or every k-th one with ?every=k (at most MAX_ADVANCE_FRAMES frames).
+    Binary frames are concatenated, each one's size follows from its header.
+    """
+    session = get_session()
+    if session is None:
+        return no_session_response()
+
+    if session.runner.is_running:
+        return jsonify({'status': 'error', 'message': 'Simulation is running on the server loop'}), 409
+
+    try:
+        if 'seconds' in request.args:
+            seconds = float(request.args['seconds'])
+            if not math.isfinite(seconds):
+                raise ValueError(f"seconds={seconds}")
+            steps = math.ceil(seconds * 1000 / session.model.dt)
+        else:
+            steps = int(request.args.get('steps', 1))
+        every = int(request.args.get('every', 0))
+        window = request_window()
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'steps, seconds and every have to be finite numbers'}), 400
+    if not 1 <= steps <= MAX_ADVANCE_STEPS:
+        return jsonify({'status': 'error', 'message': f'Can advance 1 to {MAX_ADVANCE_STEPS} steps at a time'}), 400
+    if every < 0:
+        return jsonify({'status': 'error', 'message': 'every has to be 0 (final frame only) or more'}), 400
+    frame_count = -(-steps // every) if every > 0 else 1
+    if frame_count > MAX_ADVANCE_FRAMES:
+        return jsonify({'status': 'error', 'message': f'{steps} steps with every={every} would return {frame_count} frames, '
+                                                      f'at most {MAX_ADVANCE_FRAMES} are sent at a time'}), 400
+
+    try:
+        frame_format = request.args.get('format', 'json')
+        if frame_format == 'delta':
+            # First delta is against the client's base, the rest chain on from it
+            base_seq = int(request.args.get('base', -1))
+            def encode_delta(model):
+                nonlocal base_seq
+                frame = encode_delta_frame(session, base_seq, window)
+                base_seq = session.delta_encoder.seq
+                return frame
+            frames = session.runner.advance(steps, every, encode_delta)
+            return Response(b"".join(frames), mimetype='application/octet-stream')
+        if frame_format == 'binary':
+            frames = session.runner.advance(steps, every, lambda model: frame_encoder.encode_binary(model, window))
+            return Response(b"".join(frames), mimetype='application/octet-stream')
+
+        frames = session.runner.advance(steps, every, lambda model: frame_encoder.encode_json(model, window))
+        return jsonify({**frames[-1], 'frames': frames[:-1] if every > 0 else []})
+
+    except Exception:
+        print("Exception in /api/advance:\n" + traceback.format_exc())
+        return jsonify({'status': 'error', 'message': 'Advance failed'}), 500
+
+@app.route('/api/run/start')
+def start_server_loop():
+    session = get_session()
+    if session is None:
+        return no_session_response()
+    real_time_factor = request.args.get('real_time_factor')
+    session.runner.start(float(real_time_factor) if real_time_factor is not None else None)
+    return jsonify({'status': 'success', **session.runner.stats()})
+
+@app.route('/api/run/stop')
+def stop_server_loop():
+    session = get_session()
+    if session is None:
+        return no_session_response()
+    session.runner.stop()
+    return jsonify({'status': 'success', **session.runner.stats()})
+
+@app.route('/api/stream')
+def stream_simulation():
+    """
+    Server-Sent Events, one base64 binary frame (see FrameEncoder) per event. Slow clients skip frames.
+    If the server loop fails the stream ends with a 'failed' event carrying the error.
+    """
+    session = get_session()
+    if session is None:
+        return no_session_response()
+    runner = session.runner
+    runner.window = request_window()
+    subscription = runner.subscribe()
+
+    def events():
+        try:
+            while not subscription.is_closed and runner.error is None:
+                frame = subscription.get(timeout=SSE_KEEP_ALIVE_S)
+                if frame is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {frame}\n\n"
+            if runner.error is not None:
+                yield f"event: failed\ndata: {json.dumps({'message': runner.error})}\n\n"
+        finally:
+            runner.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/view')
+def update_view():
+    """Change the part of the highway /api/stream frames cover, same ?y_min=&y_max=&zoom= as /api/step."""
+    session = get_session()
+    if session is None:
+        return no_session_response()
+    session.runner.window = request_window()
+    return jsonify({'status': 'success', 'window': session.runner.window})
+
 @app.route('/api/reset')
 def reset_simulation():
-    global simulation_model, simulation_type
-    simulation_model = None
-    simulation_type = None
+    session = get_session()
+    if session:
+        registry.remove(session.session_id)
     return jsonify({'status': 'success', 'message': 'Simulation reset'})
 
+@app.route('/api/profile')
+def profile_stats():
+    """Per step phase timings and counters of a session started with ?is_profiling=true."""
+    session = get_session()
+    if session is None:
+        return no_session_response()
+    if session.model.profiler is None:
+        return jsonify({'status': 'error', 'message': 'Profiling is off, initialize with ?is_profiling=true'}), 400
+    with session.lock:
+        stats = session.model.profiler.stats()
+    return jsonify({'status': 'success', **stats})
+
+@app.route('/api/sessions')
+def session_stats():
+    return jsonify({'status': 'success', **registry.stats()})
+
+@app.route('/api/metrics')
+def metrics():
+    """Prometheus text format: request rates and latencies, /api/step split by phase, sessions, agents and memory."""
+    return Response(server_metrics.render(registry), content_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == '__main__':
     # debug=False to avoid double-running model (Flask reloader)
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    # threaded so /api/stream does not block the other routes
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -0,0 +1,200 @@
+# Named traffic scenarios timed end to end, with the results compared against a stored baseline. Run from the repo root:
+#   python benchmarks/bench_scenarios.py                           run everything, compare with benchmarks/baseline.json
+#   python benchmarks/bench_scenarios.py --only congested lanes_4  just the scenarios whose name contains one of these
+#   python benchmarks/bench_scenarios.py --save-baseline           store this run as the new baseline
+# Exits with 1 when a scenario got slower or bigger than the baseline by more than --tolerance.
+# Baselines are only comparable on the same machine.
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from src.Agent_Based_Traffic_Simulation.core.TrafficModel import TrafficModel
+from src.Agent_Based_Traffic_Simulation.core.Highway import Highway
+from src.Agent_Based_Traffic_Simulation.core.Logger import Logger
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+LANE_SIZE = 3_657
+DT = 200
+SEED = 1
+
+
+def scenario(name: str, agents: int, lanes: int = 3, density: float = 20, steps: int = 100, aggressive: float = 50,
+             trucks: float = 10, motorcycles: float = 10) -> dict:
+    """`density` is agents per km per lane at the start, the highway is as long as that takes."""
+    return {'name': name, 'agents': agents, 'lanes': lanes, 'density': density, 'steps': steps, 'aggressive': aggressive,
+            'trucks': trucks, 'motorcycles': motorcycles}
+
+
+SCENARIOS = [
+    scenario('free_flow_1k', 1_000, density=8),
+    scenario('congested_1k', 1_000, density=45),
+    scenario('lanes_2_1k', 1_000, lanes=2),
+    scenario('lanes_4_1k', 1_000, lanes=4),
+    scenario('lanes_6_1k', 1_000, lanes=6),
+    scenario('aggressive_heavy_1k', 1_000, aggressive=90),
+    scenario('truck_heavy_1k', 1_000, trucks=40, motorcycles=0),
+    scenario('free_flow_10k', 10_000, density=8, steps=20),
+    scenario('congested_10k', 10_000, density=45, steps=20),
+    scenario('free_flow_50k', 50_000, density=8, steps=5),
+]
+
+
+def build_model(config: dict) -> TrafficModel:
+    random.seed(SEED)
+    np.random.seed(SEED)
+    lanes = config['lanes']
+    length = config['agents'] / (lanes * config['density']) * 1_000_000
+    highway = Highway(lanes * LANE_SIZE * 1.01, length, lanes, LANE_SIZE)
+    percents_and_ratios = {
+        'aggressive_percent': config['aggressive'],
+        'defensive_percent': 100 - config['aggressive'],
+        'truck_ratio': config['trucks'],
+        'motorcycle_ratio': config['motorcycles'],
+        'suv_ratio': 100 - config['trucks'] - config['motorcycles'],
+    }
+    return TrafficModel(config['agents'], SEED, DT, highway, True, 6, percents_and_ratios)
+
+
+def run_scenario(config: dict) -> dict:
+    """
+    Runs in its own process, so the peak RSS belongs to this scenario alone.
+    The logger writes synchronously and is timed on its own: comparing against a second run without logging
+    drowns the logging cost in run to run noise, and an async writer hides its work in another thread.
+    It only flushes by row count, flushing every few wall clock seconds would change with the machine's speed.
+    """
+    warnings.filterwarnings('ignore')
+    started = time.perf_counter()
+    model = build_model(config)
+    build_time = time.perf_counter() - started
+
+    step_time = logging_time = 0.0
+    agent_steps = 0
+    with tempfile.TemporaryDirectory() as log_dir:
+        with Logger(DT, True, os.path.join(log_dir, 'agents.csv'), os.path.join(log_dir, 'collisions.csv'),
+                    flush_interval_s=float('inf')) as logger:
+            for _ in range(config['steps']):
+                agent_steps += len(model.agents)
+                started = time.perf_counter()
+                model.step()
+                stepped = time.perf_counter()
+                logger.log_all(model)
+                step_time += stepped - started
+                logging_time += time.perf_counter() - stepped
+            started = time.perf_counter()
+        logging_time += time.perf_counter() - started # flushing on close
+
+    return {
+        'agents': len(model.agents),
+        'steps': config['steps'],
+        'build_s': round(build_time, 3),
+        'steps_per_s': round(config['steps'] / step_time, 3),
+        'agent_step_us': round(step_time / agent_steps * 1e6, 2),
+        'logging_ms_per_step': round(logging_time / config['steps'] * 1000, 3),
+        'logging_overhead_pct': round(logging_time / step_time * 100, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def measure(config: dict, pool_context) -> dict:
+    with pool_context.Pool(1) as pool:
+        return pool.apply(run_scenario, (config,))
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import mesa
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'mesa': mesa.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+# metric -> is bigger better
+COMPARED_METRICS = {
+    'steps_per_s': True,
+    'agent_step_us': False,
+    'logging_ms_per_step': False,
+    'peak_rss_mb': False,
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lines describing every metric that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric, is_higher_better in COMPARED_METRICS.items():
+            if not before.get(metric):
+                continue
+            change = result[metric] / before[metric] - 1
+            if (change < -tolerance) if is_higher_better else (change > tolerance):
+                regressions.append(f"{name}: {metric} {before[metric]} -> {result[metric]} ({change:+.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scenario benchmarks: steps/s, cost per agent step, peak memory and logging overhead")
+    parser.add_argument('--only', nargs='+', default=None, help="run the scenarios whose name contains any of these")
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'results.json'))
+    parser.add_argument('--baseline', default=os.path.join(BENCHMARK_DIR, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help="write the results to --baseline instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative change allowed before it counts as a regression")
+    args = parser.parse_args()
+
+    scenarios = [config for config in SCENARIOS if not args.only or any(part in config['name'] for part in args.only)]
+    # A fresh interpreter per scenario, nothing left over from the previous one
+    pool_context = multiprocessing.get_context('spawn')
+
+    print(f"{'scenario':<22} {'agents':>7} {'steps/s':>9} {'us/agent':>9} {'log ms':>8} {'log %':>6} {'peak MB':>8}")
+    results = {}
+    for config in scenarios:
+        result = measure(config, pool_context)
+        results[config['name']] = result
+        print(f"{config['name']:<22} {result['agents']:>7} {result['steps_per_s']:>9.2f} {result['agent_step_us']:>9.1f} "
+              f"{result['logging_ms_per_step']:>8.2f} {result['logging_overhead_pct']:>6.1f} {result['peak_rss_mb']:>8.1f}", flush=True)
+
+    report = {'environment': environment(), 'scenarios': {config['name']: config for config in scenarios}, 'results': results}
+    path = args.baseline if args.save_baseline else args.output
+    if args.save_baseline and os.path.exists(path):
+        # Keep the scenarios this run skipped
+        with open(path) as f:
+            stored = json.load(f)
+        report['scenarios'] = {**stored.get('scenarios', {}), **report['scenarios']}
+        report['results'] = {**stored.get('results', {}), **results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {path}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        sys.exit(0)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,78 @@
+# Single process TrafficModel against ShardedTrafficModel on a long, filled highway, run from the repo root:
+#   python benchmarks/bench_sharded.py --shards 2 4 8 --km 40 --agents 2000
+# 'speedup' is wall time, it needs a cpu per shard. 'cpu speedup' is the single run's cpu time over the busiest shard's,
+# the speedup the split allows with a cpu per shard (ticks also wait on the slowest neighbor, so it is an upper bound).
+import argparse
+import os
+import random
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from src.Agent_Based_Traffic_Simulation.core.TrafficModel import TrafficModel
+from src.Agent_Based_Traffic_Simulation.core.Highway import Highway
+from src.Agent_Based_Traffic_Simulation.core.ShardedModel import ShardedTrafficModel
+
+
+LANE_COUNT = 3
+LANE_SIZE = 3_657
+DT = 200
+PERCENTS_AND_RATIOS = {'aggressive_percent': 50, 'defensive_percent': 50, 'truck_ratio': 10, 'motorcycle_ratio': 10, 'suv_ratio': 80}
+
+
+def build_model(km: float, agents: int, seed: int) -> TrafficModel:
+    random.seed(seed)
+    np.random.seed(seed)
+    highway = Highway(LANE_COUNT * LANE_SIZE * 1.01, km * 1_000_000, LANE_COUNT, LANE_SIZE)
+    return TrafficModel(agents, seed, DT, highway, True, 6, PERCENTS_AND_RATIOS)
+
+
+def run_single(model: TrafficModel, steps: int) -> dict:
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for _ in range(steps):
+        model.step()
+    wall_time = time.perf_counter() - started
+    return {
+        'wall_time_s': wall_time,
+        'cpu_time_s': time.process_time() - cpu_started,
+        'agents': len(model.agents),
+        'mean_speed': float(np.mean([agent.get_speed() for agent in model.agents])),
+        'spawned_agents': model.spawned_agents,
+        'removed_agents': model.removed_agents,
+    }
+
+
+def run_sharded(model: TrafficModel, shard_count: int, steps: int, seed: int) -> dict:
+    with ShardedTrafficModel(model, shard_count, seed) as sharded:
+        # Process start up and splitting the model are not part of the per tick cost
+        sharded.request('stats')
+        started = time.perf_counter()
+        sharded.advance(steps)
+        wall_time = time.perf_counter() - started
+        stats = sharded.stats()
+    return {**stats, 'wall_time_s': wall_time}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded stepping benchmark: ticks per second and drift from the single process run")
+    parser.add_argument('--shards', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--km', type=float, default=20, help="highway length")
+    parser.add_argument('--agents', type=int, default=600, help="agents placed along the whole highway at the start")
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+    print(f"{os.cpu_count()} cpus")
+
+    single = run_single(build_model(args.km, args.agents, args.seed), args.steps)
+    print(f"{'shards':>6} {'ticks/s':>8} {'speedup':>8} {'cpu speedup':>11} {'agents':>7} {'mean v':>7} {'spawned':>8} {'removed':>8}  agents per shard")
+    print(f"{1:>6} {args.steps / single['wall_time_s']:>8.1f} {1.0:>8.2f} {1.0:>11.2f} {single['agents']:>7} {single['mean_speed']:>7.2f} "
+          f"{single['spawned_agents']:>8} {single['removed_agents']:>8}")
+    for shard_count in args.shards:
+        sharded = run_sharded(build_model(args.km, args.agents, args.seed), shard_count, args.steps, args.seed)
+        print(f"{shard_count:>6} {args.steps / sharded['wall_time_s']:>8.1f} {single['wall_time_s'] / sharded['wall_time_s']:>8.2f} "
+              f"{single['cpu_time_s'] / max(sharded['cpu_time_s']):>11.2f} {sharded['agents']:>7} {sharded['mean_speed']:>7.2f} {sharded['spawned_agents']:>8} {sharded['removed_agents']:>8}  {sharded['agents_per_shard']}")
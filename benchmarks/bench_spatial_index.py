@@ -0,0 +1,99 @@
+# Highway's grid index against Mesa's ContinuousSpace, run from the repo root:
+#   python benchmarks/bench_spatial_index.py --agents 1000 10000 50000
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import warnings
+
+import numpy as np
+from mesa.space import ContinuousSpace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from src.Agent_Based_Traffic_Simulation.core.Highway import Highway
+
+
+LANE_COUNT = 3
+LANE_SIZE = 3_657
+CAR_LENGTH = 4_500
+AGENTS_PER_KM_PER_LANE = 20 # same density at every size, the road grows with the agent count
+DT = 200
+
+
+class PointAgent:
+    """Just enough of an agent for the spaces, so the benchmark only measures the index."""
+
+    def __init__(self, unique_id: int) -> None:
+        self.unique_id: int = unique_id
+        self.pos: tuple = None
+
+
+def make_traffic(agent_count: int, rng: np.random.Generator) -> tuple[float, float, np.ndarray, np.ndarray]:
+    width = LANE_COUNT * LANE_SIZE * 1.01
+    length = agent_count / (LANE_COUNT * AGENTS_PER_KM_PER_LANE) * 1_000_000
+    lanes = rng.integers(0, LANE_COUNT, agent_count)
+    positions = np.column_stack((lanes * LANE_SIZE + LANE_SIZE / 2, rng.uniform(0, length * 0.9, agent_count)))
+    velocities = np.column_stack((np.zeros(agent_count), rng.uniform(20, 35, agent_count))) # mm/ms
+    return width, length, positions, velocities
+
+
+def run(space_class, agent_count: int, steps: int, queries_per_step: int, seed: int) -> tuple[float, float, list]:
+    rng = np.random.default_rng(seed)
+    width, length, positions, velocities = make_traffic(agent_count, rng)
+    if space_class is Highway:
+        space = Highway(width, length, LANE_COUNT, LANE_SIZE)
+    else:
+        space = ContinuousSpace(width, length, False)
+    agents = [PointAgent(i) for i in range(agent_count)]
+    for agent, position in zip(agents, positions.tolist()):
+        space.place_agent(agent, tuple(position))
+
+    # Like timeit, keep the garbage collector out of the timings (it scans every agent and hits both spaces alike)
+    gc.collect()
+    gc.disable()
+    move_time = query_time = 0.0
+    results = []
+    radius = CAR_LENGTH * 15 # what TrafficAgent.is_colliding_at_next_step asks for
+    for _ in range(steps):
+        positions = positions + velocities * DT
+        positions[:, 1] %= length * 0.9
+
+        started = time.perf_counter()
+        if space_class is Highway:
+            space.move_agents(agents, positions)
+        else:
+            for agent, position in zip(agents, positions.tolist()):
+                space.move_agent(agent, tuple(position))
+        move_time += time.perf_counter() - started
+
+        queried = rng.integers(0, agent_count, queries_per_step).tolist()
+        started = time.perf_counter()
+        for index in queried:
+            neighbors = space.get_neighbors(agents[index].pos, radius, False)
+            results.append([neighbor.unique_id for neighbor in neighbors])
+        query_time += time.perf_counter() - started
+    gc.enable()
+    return move_time / steps * 1000, query_time / steps * 1000, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spatial index benchmark: ms per step to move every agent and run the neighbor queries")
+    parser.add_argument('--agents', type=int, nargs='+', default=[1_000, 10_000, 50_000])
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=200, help="get_neighbors calls per step")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+    random.seed(args.seed)
+
+    print(f"{'agents':>8} {'space':>16} {'move ms':>9} {'query ms':>9} {'total ms':>9}")
+    for agent_count in args.agents:
+        timings = {}
+        for space_class in (ContinuousSpace, Highway):
+            move_ms, query_ms, results = run(space_class, agent_count, args.steps, args.queries, args.seed)
+            timings[space_class] = results
+            print(f"{agent_count:>8} {space_class.__name__:>16} {move_ms:>9.2f} {query_ms:>9.2f} {move_ms + query_ms:>9.2f}")
+        if timings[ContinuousSpace] != timings[Highway]:
+            sys.exit(f"neighbor results differ at {agent_count} agents")
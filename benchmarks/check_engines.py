@@ -0,0 +1,93 @@
+# The vectorized engine against the per agent engine on the same seeds, run from the repo root:
+#   python benchmarks/check_engines.py --seeds 1 2 3 4 5 6 7 8 --steps 1500
+# Both engines are meant to give the same run, bit for bit. Every tick's state (positions, velocities, accelerations,
+# strategies, lanes) is hashed and compared, exits 1 at the first tick where a seed's runs differ.
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from src.Agent_Based_Traffic_Simulation.core.TrafficModel import TrafficModel
+from src.Agent_Based_Traffic_Simulation.core.Highway import Highway
+
+
+LANE_COUNT = 3
+LANE_SIZE = 3_657
+DT = 40
+PERCENTS_AND_RATIOS = {'aggressive_percent': 50, 'defensive_percent': 50, 'truck_ratio': 10, 'motorcycle_ratio': 10, 'suv_ratio': 80}
+
+
+def build_model(engine: str, km: float, agents: int, rate: float, seed: int, is_scheduling_decisions: bool = False) -> TrafficModel:
+    random.seed(seed)
+    np.random.seed(seed)
+    highway = Highway(LANE_COUNT * LANE_SIZE * 1.01, km * 1_000_000, LANE_COUNT, LANE_SIZE)
+    return TrafficModel(agents, seed, DT, highway, True, rate, PERCENTS_AND_RATIOS, engine=engine,
+                        is_scheduling_decisions=is_scheduling_decisions)
+
+
+def state_digest(model: TrafficModel) -> bytes:
+    """Hash of everything the agents show of themselves, in creation order."""
+    agents = sorted(model.agents, key=lambda agent: agent.unique_id)
+    digest = hashlib.sha1()
+    digest.update(np.array([[*agent.vehicle.position, *agent.vehicle.velocity, *agent.vehicle.acceleration] for agent in agents], dtype=float).tobytes())
+    digest.update(repr([(agent.unique_id, type(agent.current_drive_strategy).__name__, type(agent.lane_change_strategy).__name__,
+                         agent.current_lane, agent.lane_intent) for agent in agents]).encode())
+    return digest.digest()
+
+
+def run(model: TrafficModel, steps: int) -> dict:
+    speeds = []
+    collisions = 0
+    digests = []
+    wall_time = 0.0
+    for _ in range(steps):
+        started = time.perf_counter()
+        model.step()
+        wall_time += time.perf_counter() - started
+        speeds.append(np.mean([agent.get_speed() for agent in model.agents]) if len(model.agents) else 0.0)
+        collisions += len(model.get_collisions())
+        digests.append(state_digest(model))
+    return {
+        'wall_time_s': wall_time,
+        'mean_speed': float(np.mean(speeds)),
+        'spawned_agents': model.spawned_agents,
+        'removed_agents': model.removed_agents,
+        'collisions': collisions,
+        'digests': digests,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the vectorized engine gives the same runs as the per agent engine")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1, 2, 3, 4, 5, 6, 7, 8])
+    parser.add_argument('--steps', type=int, default=1500)
+    parser.add_argument('--km', type=float, default=2, help="highway length")
+    parser.add_argument('--agents', type=int, default=60, help="agents placed on the highway at the start")
+    parser.add_argument('--rate', type=float, default=2, help="agents spawned per second")
+    parser.add_argument('--scheduler', action='store_true', help="use the model's decision scheduler")
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    is_failed = False
+    print(f"{'seed':>4} {'engine':>10} {'s/run':>6} {'mean v':>7} {'spawned':>8} {'removed':>8} {'collisions':>10}")
+    for seed in args.seeds:
+        results = {}
+        for engine in ('agent', 'vectorized'):
+            result = run(build_model(engine, args.km, args.agents, args.rate, seed, args.scheduler), args.steps)
+            results[engine] = result
+            print(f"{seed:>4} {engine:>10} {result['wall_time_s']:>6.1f} {result['mean_speed']:>7.2f} {result['spawned_agents']:>8} "
+                  f"{result['removed_agents']:>8} {result['collisions']:>10}")
+        first_difference = next((tick for tick, (agent_digest, vectorized_digest)
+                                 in enumerate(zip(results['agent']['digests'], results['vectorized']['digests']))
+                                 if agent_digest != vectorized_digest), None)
+        if first_difference is not None:
+            is_failed = True
+            print(f"{seed:>4} FAILED: the runs differ from tick {first_difference} on")
+    print("FAILED" if is_failed else "identical runs")
+    sys.exit(1 if is_failed else 0)
@@ -0,0 +1,83 @@
+# The sharded model against the single process model on the same seeds, run from the repo root:
+#   python benchmarks/check_sharded.py --shards 2 4 --seeds 1 2 3 4
+# Both run the synchronous update, where every agent reads the others (and the ghosts) as they were at the start of
+# the tick and draws from its own random stream, and the first shard spawns from where the single run's random state
+# is. The sharded run is then meant to be the single process run, bit for bit: the colliding pairs and every agent's
+# state are compared every --every steps, exits 1 at the first difference.
+# With the sequential update the shards read their own agents as already moved but the ghosts as at the start of the
+# tick, which the single process run never does, so those runs only match statistically and are not checked here.
+import argparse
+import os
+import random
+import sys
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from src.Agent_Based_Traffic_Simulation.core.TrafficModel import TrafficModel
+from src.Agent_Based_Traffic_Simulation.core.Highway import Highway
+from src.Agent_Based_Traffic_Simulation.core.ShardedModel import ShardedTrafficModel
+
+
+LANE_COUNT = 3
+LANE_SIZE = 3_657
+DT = 200
+PERCENTS_AND_RATIOS = {'aggressive_percent': 50, 'defensive_percent': 50, 'truck_ratio': 10, 'motorcycle_ratio': 10, 'suv_ratio': 80}
+
+
+def build_model(km: float, agents: int, seed: int) -> TrafficModel:
+    random.seed(seed)
+    np.random.seed(seed)
+    highway = Highway(LANE_COUNT * LANE_SIZE * 1.01, km * 1_000_000, LANE_COUNT, LANE_SIZE)
+    return TrafficModel(agents, seed, DT, highway, True, 6, PERCENTS_AND_RATIOS, is_synchronous=True)
+
+
+def run_single(model: TrafficModel, steps: int, every: int) -> list[tuple]:
+    """(colliding pairs so far, agent states) every `every` steps."""
+    checkpoints = []
+    collision_pairs = 0
+    for step in range(1, steps + 1):
+        model.step()
+        collision_pairs += len(model.get_collisions())
+        if step % every == 0:
+            states = sorted((agent.unique_id, *agent.vehicle.position.tolist(), *agent.vehicle.velocity.tolist()) for agent in model.agents)
+            checkpoints.append((collision_pairs, states))
+    return checkpoints
+
+
+def run_sharded(model: TrafficModel, shard_count: int, steps: int, every: int, seed: int) -> list[tuple]:
+    checkpoints = []
+    with ShardedTrafficModel(model, shard_count, seed) as sharded:
+        for _ in range(steps // every):
+            sharded.advance(every)
+            checkpoints.append((sharded.stats()['collision_pairs'], sharded.agent_states()))
+    return checkpoints
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the sharded model gives the same runs as the single process model")
+    parser.add_argument('--shards', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1, 2, 3, 4])
+    parser.add_argument('--km', type=float, default=10, help="highway length")
+    parser.add_argument('--agents', type=int, default=600, help="agents placed along the whole highway at the start")
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--every', type=int, default=50, help="steps between the comparisons")
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    is_failed = False
+    print(f"{'seed':>4} {'shards':>6} {'collisions':>10} {'agents':>7}")
+    for seed in args.seeds:
+        single = run_single(build_model(args.km, args.agents, seed), args.steps, args.every)
+        print(f"{seed:>4} {1:>6} {single[-1][0]:>10} {len(single[-1][1]):>7}")
+        for shard_count in args.shards:
+            sharded = run_sharded(build_model(args.km, args.agents, seed), shard_count, args.steps, args.every, seed)
+            print(f"{seed:>4} {shard_count:>6} {sharded[-1][0]:>10} {len(sharded[-1][1]):>7}")
+            first_difference = next(((index + 1) * args.every for index, (expected, actual) in enumerate(zip(single, sharded))
+                                     if expected != actual), None)
+            if first_difference is not None:
+                is_failed = True
+                print(f"{seed:>4} {shard_count:>6} FAILED: the runs differ by step {first_difference}")
+    print("FAILED" if is_failed else "identical runs")
+    sys.exit(1 if is_failed else 0)
@@ -2,67 +2,283 @@
 from src.Agent_Based_Traffic_Simulation.core.TrafficModel import TrafficModel
 from src.Agent_Based_Traffic_Simulation.core.Highway import Highway
 from src.Agent_Based_Traffic_Simulation.core.Logger import Logger
+from src.Agent_Based_Traffic_Simulation.core.Checkpoint import Checkpoint
+from src.Agent_Based_Traffic_Simulation.core.ShardedModel import ShardedTrafficModel
 import cProfile, pstats
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
+import numpy as np
 
 
-def run():
-    dt =  200
-    highway_length = 2_000_000
-    highway_lanes = 3
-    lane_size = 3_657
-    n_agents = 0
-
-    is_logging = True
-
-    current_sim_time = 0
-    total_time = 30 * 60 * 1000 # 30 mins
-    
-
-    aggressive_pct =0
-    defensive_pct = 100
-    truck_ratio =  0
-    motorcycle_ratio = 0
-    suv_ratio = 100
-    percents_and_ratios = {
+# Defaults shared by the single profiled run and the sweep
+DT = 200
+HIGHWAY_LENGTH = 2_000_000
+LANE_SIZE = 3_657
+TOTAL_TIME = 30 * 60 * 1000 # 30 mins
+PROGRESS_EVERY_STEPS = 500
+
+
+def make_percents_and_ratios(aggressive_pct: float, truck_ratio: float = 0, motorcycle_ratio: float = 0, suv_ratio: float = 100) -> dict:
+    return {
         'aggressive_percent': aggressive_pct,
-        'defensive_percent': defensive_pct,
+        'defensive_percent': 100 - aggressive_pct,
         'truck_ratio': truck_ratio,
         'motorcycle_ratio': motorcycle_ratio,
         'suv_ratio': suv_ratio
     }
 
-    agent_rate = 6
 
-    generate_agents = True
-    highway_width = highway_lanes * lane_size * 1.01 # 1.01 due to index out of bounds exceptions
+def build_sweep(percents_and_ratios_grid: list[dict], agent_rates: list[float], lane_counts: list[int],
+                seeds_per_config: int = 1, master_seed: int = 1, **run_settings) -> list[dict]:
+    """
+    One run config per combination of the grid and per seed.
+    Every run gets its own seed spawned from `master_seed`, so a sweep is reproducible no matter
+    how many workers run it or in which order the runs finish.
+    """
+    combinations = list(itertools.product(percents_and_ratios_grid, agent_rates, lane_counts, range(seeds_per_config)))
+    seed_streams = np.random.SeedSequence(master_seed).spawn(len(combinations))
+
+    configs = []
+    for run_id, ((percents_and_ratios, agent_rate, lane_count, replicate), stream) in enumerate(zip(combinations, seed_streams)):
+        configs.append({
+            'run_id': run_id,
+            'percents_and_ratios': percents_and_ratios,
+            'agent_rate': agent_rate,
+            'lane_count': lane_count,
+            'replicate': replicate,
+            'seed': int(stream.generate_state(1)[0]),
+            **run_settings,
+        })
+    return configs
 
-    
 
-    for i in range(4,5): 
-        aggressive_pct = i * 25
-        defensive_pct = 100 - aggressive_pct
+def run_single(config: dict, progress_queue=None) -> dict:
+    """Run one configuration to completion, write its logs and summary, and return the summary."""
+    seed = config['seed']
+    dt = config.get('dt', DT)
+    total_time = config.get('total_time', TOTAL_TIME)
+    output_dir = config.get('output_dir', 'logs')
+    os.makedirs(output_dir, exist_ok=True)
+    run_name = f"run{config['run_id']:04d}"
 
-        percents_and_ratios = {
-            'aggressive_percent': aggressive_pct,
-            'defensive_percent': defensive_pct,
-            'truck_ratio': truck_ratio,
-            'motorcycle_ratio': motorcycle_ratio,
-            'suv_ratio': suv_ratio
-        }
-        highway = Highway(highway_width, highway_length, highway_lanes, lane_size)
-        simulation_model = TrafficModel(n_agents,1, dt, highway, generate_agents, agent_rate, percents_and_ratios)
+    checkpoint = None
+    if config.get('checkpoint_every'):
+        checkpoint = Checkpoint(os.path.join(output_dir, f"checkpoint_{run_name}.pkl"), config['checkpoint_every'])
 
-        logger = Logger( dt, is_logging, f"logs/traffic_agent_log_a{aggressive_pct}_d{defensive_pct}.csv", f"logs/collisions_log_a{aggressive_pct}_d{defensive_pct}.csv")
-        current_sim_time = 0
-        while (current_sim_time < total_time):
+    if checkpoint and config.get('resume') and os.path.exists(checkpoint.path):
+        # Continue where the last snapshot left off, RNGs included
+        simulation_model, logger, extra = checkpoint.resume()
+    else:
+        # The model, personalities and vehicle choice draw from the global generators, seed them for this run
+        random.seed(seed)
+        np.random.seed(seed % 2**32)
+
+        lane_count = config['lane_count']
+        lane_size = config.get('lane_size', LANE_SIZE)
+        highway_width = lane_count * lane_size * 1.01 # 1.01 due to index out of bounds exceptions
+        highway = Highway(highway_width, config.get('highway_length', HIGHWAY_LENGTH), lane_count, lane_size)
+        simulation_model = TrafficModel(config.get('n_agents', 0), seed, dt, highway, True, config['agent_rate'],
+                                        config['percents_and_ratios'], engine=config.get('engine', 'agent'),
+                                        substep_dt=config.get('substep_dt'), is_scheduling_decisions=config.get('schedule_decisions', False),
+                                        is_synchronous=config.get('synchronous', False), is_profiling=config.get('profile_phases', False))
+        if config.get('shards', 1) > 1:
+            return run_sharded(config, simulation_model, progress_queue)
+
+        logger = Logger(config.get('logging_dt', dt), config.get('is_logging', True),
+                        os.path.join(output_dir, f"traffic_agent_log_{run_name}.csv"),
+                        os.path.join(output_dir, f"collisions_log_{run_name}.csv"), mode="async")
+        extra = {'wall_time_s': 0.0, 'speed_samples': [], 'collision_count': 0}
+
+    started = time.perf_counter() - extra['wall_time_s']
+    speed_samples = extra['speed_samples']
+    with logger:
+        while simulation_model.total_time < total_time:
             simulation_model.step()
             logger.log_all(simulation_model)
-            current_sim_time = simulation_model.total_time
-        
+
+            if simulation_model.total_time % max(logger.interval_ms, dt) < dt:
+                speeds = [float(np.linalg.norm(agent.vehicle.velocity)) for agent in simulation_model.agents]
+                speed_samples.append(sum(speeds) / len(speeds) if speeds else 0.0)
+                extra['collision_count'] += len(simulation_model.get_collisions())
+
+            if progress_queue is not None and (simulation_model.total_time // dt) % PROGRESS_EVERY_STEPS == 0:
+                progress_queue.put((config['run_id'], simulation_model.total_time, total_time))
+
+            if checkpoint:
+                extra['wall_time_s'] = time.perf_counter() - started
+                checkpoint.maybe_save(simulation_model, logger, extra)
+
+    summary = {
+        **{key: value for key, value in config.items() if key not in ('resume', 'checkpoint_every')},
+        'steps': simulation_model.total_time // dt, # model.steps counts Mesa's two increments per step
+        'sim_time_ms': simulation_model.total_time,
+        'wall_time_s': round(time.perf_counter() - started, 3),
+        'spawned_agents': simulation_model.spawned_agents,
+        'removed_agents': simulation_model.removed_agents,
+        'final_agents': len(simulation_model.agents),
+        'mean_speed_mph': (sum(speed_samples) / len(speed_samples) * 2.23694) if speed_samples else 0.0,
+        'collisions_logged': extra['collision_count'],
+        'substepped_agent_steps': simulation_model.substepped_agent_steps,
+        'coarse_agent_steps': simulation_model.coarse_agent_steps,
+    }
+    if simulation_model.profiler:
+        simulation_model.profiler.end_step()
+        summary['phases'] = simulation_model.profiler.stats()
+    return write_summary(config, summary, progress_queue)
+
+
+def run_sharded(config: dict, simulation_model: TrafficModel, progress_queue=None) -> dict:
+    """
+    Run an already built model split across config['shards'] worker processes.
+    No CSV logs or checkpoints, the agents live in the shard processes. Speed and collisions are sampled every logging_dt.
+    """
+    dt = config.get('dt', DT)
+    total_time = config.get('total_time', TOTAL_TIME)
+    sample_steps = max(config.get('logging_dt', dt), dt) // dt
+    speed_samples = []
+    collision_count = 0
+
+    started = time.perf_counter()
+    with ShardedTrafficModel(simulation_model, config['shards'], config['seed']) as sharded:
+        while sharded.total_time < total_time:
+            sharded.advance(min(sample_steps, -(-(total_time - sharded.total_time) // dt)))
+            stats = sharded.stats()
+            speed_samples.append(stats['mean_speed'])
+            collision_count += stats['collisions']
+            if progress_queue is not None:
+                progress_queue.put((config['run_id'], sharded.total_time, total_time))
+
+    summary = {
+        **{key: value for key, value in config.items() if key not in ('resume', 'checkpoint_every')},
+        'steps': stats['steps'],
+        'sim_time_ms': stats['sim_time_ms'],
+        'wall_time_s': round(time.perf_counter() - started, 3),
+        'spawned_agents': stats['spawned_agents'],
+        'removed_agents': stats['removed_agents'],
+        'final_agents': stats['agents'],
+        'mean_speed_mph': (sum(speed_samples) / len(speed_samples) * 2.23694) if speed_samples else 0.0,
+        'collisions_logged': collision_count,
+        'substepped_agent_steps': stats['substepped_agent_steps'],
+        'coarse_agent_steps': stats['coarse_agent_steps'],
+        'migrated_agents': stats['migrated_out'],
+    }
+    return write_summary(config, summary, progress_queue)
+
+
+def write_summary(config: dict, summary: dict, progress_queue=None) -> dict:
+    run_name = f"run{config['run_id']:04d}"
+    with open(os.path.join(config.get('output_dir', 'logs'), f"summary_{run_name}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    if progress_queue is not None:
+        progress_queue.put((config['run_id'], summary['sim_time_ms'], summary['sim_time_ms']))
+    return summary
+
+
+def failed_summary(config: dict, error: BaseException) -> dict:
+    """Summary of a run that raised, only its config and the error."""
+    return {
+        **{key: value for key, value in config.items() if key not in ('resume', 'checkpoint_every')},
+        'error': f"{type(error).__name__}: {error}",
+    }
+
+
+def run_sweep(configs: list[dict], workers: int = None, summary_path: str = None) -> list[dict]:
+    """
+    Run every config in its own worker process and print the combined progress of all workers.
+    A run that raises doesn't stop the others, its error goes to the 'error' column of the summary.
+    """
+    workers = workers or os.cpu_count() or 1
+    summaries = []
+    with multiprocessing.Manager() as manager:
+        progress_queue = manager.Queue()
+        progress = {config['run_id']: 0.0 for config in configs}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_single, config, progress_queue): config for config in configs}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    config = futures[future]
+                    try:
+                        summaries.append({**future.result(), 'error': ''})
+                    except Exception as error:
+                        summaries.append(failed_summary(config, error))
+                        progress[config['run_id']] = 1.0
+                        print(f"\nrun {config['run_id']} failed: {type(error).__name__}: {error}")
+                while not progress_queue.empty():
+                    run_id, sim_time, total_time = progress_queue.get()
+                    progress[run_id] = sim_time / total_time
+                overall = 100 * sum(progress.values()) / len(progress)
+                print(f"\r{len(summaries)}/{len(configs)} runs done, {overall:5.1f}% simulated", end='', flush=True)
+    print()
+
+    summaries.sort(key=lambda summary: summary['run_id'])
+    if summary_path and summaries:
+        with open(summary_path, 'w', newline='') as f:
+            # Phase timings only go to the per run summary json. Failed runs only have their config and error
+            columns = list(dict.fromkeys(key for summary in summaries for key in summary if key not in ('percents_and_ratios', 'phases', 'error')))
+            columns.append('error')
+            writer = csv.writer(f)
+            writer.writerow(columns + list(summaries[0]['percents_and_ratios']))
+            for summary in summaries:
+                writer.writerow([summary.get(key, '') for key in columns] + list(summary['percents_and_ratios'].values()))
+    return summaries
+
+
+def run():
+    # Single run of the original profiling configuration
+    config = build_sweep([make_percents_and_ratios(100)], [6], [3], master_seed=1)[0]
+    run_single(config)
 
 
 if __name__ == "__main__":
-    cProfile.run("run()", "profile.out")
-    p = pstats.Stats("profile.out")
-    p.sort_stats("cumulative").print_stats(40)
+    parser = argparse.ArgumentParser(description="Headless traffic simulation runs")
+    parser.add_argument('--profile', action='store_true', help="profile a single run with cProfile instead of sweeping")
+    parser.add_argument('--aggressive', type=float, nargs='+', default=[0, 25, 50, 75, 100], help="aggressive driver percentages")
+    parser.add_argument('--truck-ratio', type=float, nargs='+', default=[0])
+    parser.add_argument('--motorcycle-ratio', type=float, nargs='+', default=[0])
+    parser.add_argument('--agent-rate', type=float, nargs='+', default=[6], help="agents per second")
+    parser.add_argument('--lanes', type=int, nargs='+', default=[3])
+    parser.add_argument('--seeds', type=int, default=1, help="seeds per configuration")
+    parser.add_argument('--master-seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--minutes', type=float, default=TOTAL_TIME / 60_000, help="simulated minutes per run")
+    parser.add_argument('--output-dir', default='logs/sweep')
+    parser.add_argument('--checkpoint-minutes', type=float, default=0, help="simulated minutes between snapshots (0 = off)")
+    parser.add_argument('--resume', action='store_true', help="continue each run from its last snapshot if there is one")
+    parser.add_argument('--substep-dt', type=int, default=None,
+                        help="fine step (ms) for agents that are braking, changing lanes or close to their lead, must divide the 200 ms dt")
+    parser.add_argument('--schedule-decisions', action='store_true',
+                        help="agents evaluate lane changes once every decision_time instead of every tick once it has passed")
+    parser.add_argument('--synchronous', action='store_true',
+                        help="agents read each other's state from the previous tick, results don't depend on stepping order")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="split each run's highway into this many stretches stepped by their own processes (no CSV logs)")
+    parser.add_argument('--profile-phases', action='store_true',
+                        help="time every phase of the model step and count lookups, the per step histograms go to each run's summary json")
+    args = parser.parse_args()
+
+    if args.profile:
+        cProfile.run("run()", "profile.out")
+        p = pstats.Stats("profile.out")
+        p.sort_stats("cumulative").print_stats(40)
+    else:
+        grid = [
+            make_percents_and_ratios(aggressive, truck, motorcycle, 100 - truck - motorcycle)
+            for aggressive, truck, motorcycle in itertools.product(args.aggressive, args.truck_ratio, args.motorcycle_ratio)
+        ]
+        configs = build_sweep(grid, args.agent_rate, args.lanes, args.seeds, args.master_seed,
+                              total_time=int(args.minutes * 60_000), output_dir=args.output_dir,
+                              checkpoint_every=int(args.checkpoint_minutes * 60_000), resume=args.resume,
+                              substep_dt=args.substep_dt, schedule_decisions=args.schedule_decisions, shards=args.shards,
+                              synchronous=args.synchronous, profile_phases=args.profile_phases)
+        os.makedirs(args.output_dir, exist_ok=True)
+        run_sweep(configs, args.workers, os.path.join(args.output_dir, 'sweep_summary.csv'))
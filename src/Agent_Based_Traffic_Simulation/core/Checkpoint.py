@@ -0,0 +1,95 @@
+import os
+import pickle
+import random
+import time
+
+import numpy as np
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .TrafficModel import TrafficModel
+    from .Logger import Logger
+
+
+class Checkpoint:
+    """
+    Periodic snapshots of a headless run and resuming from them.
+
+    A snapshot is a single pickle holding the whole TrafficModel (highway, agents with their vehicles,
+    personalities and strategy objects, last_in_lane, timers, Mesa's RNGs), the state of the global
+    `random` / `numpy.random` generators the model draws from, the Logger's position in its CSV files
+    and any extra runner state. Resuming from it continues the run exactly where the snapshot was taken.
+    """
+
+    def __init__(self, path: str, every_ms: int) -> None:
+        """
+        Parameters
+        ----------
+        path : str
+            File the snapshot is written to (replaced atomically each time).
+        every_ms : int
+            Simulated milliseconds between two snapshots.
+        """
+        self.path: str = path
+        self.every_ms: int = every_ms
+        self.last_checkpoint_time: int = 0
+        self.last_size_bytes: int = 0
+        self.last_pause_s: float = 0.0
+
+    def maybe_save(self, model: "TrafficModel", logger: "Logger" = None, extra: dict = None) -> bool:
+        """Write a snapshot if `every_ms` of simulated time passed since the last one."""
+        if model.total_time - self.last_checkpoint_time < self.every_ms:
+            return False
+        self.last_checkpoint_time = model.total_time
+        self.save(self.path, model, logger, extra)
+        return True
+
+    def save(self, path: str, model: "TrafficModel", logger: "Logger" = None, extra: dict = None) -> None:
+        started = time.perf_counter()
+        if logger:
+            # Everything logged so far has to be on disk, the snapshot records where the files end
+            logger.drain()
+        if model.vectorized_engine:
+            model.vectorized_engine.sync_agents()
+
+        state = {
+            'model': model,
+            'logger': logger,
+            'extra': extra,
+            'checkpoint_time': self.last_checkpoint_time,
+            'random_state': random.getstate(),
+            'numpy_random_state': np.random.get_state(),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        self.last_size_bytes = os.path.getsize(path)
+        self.last_pause_s = time.perf_counter() - started
+
+    @staticmethod
+    def load(path: str) -> tuple["TrafficModel", "Logger", dict]:
+        """
+        Restore a snapshot written by save(). Returns (model, logger, extra).
+        The global random generators are restored too, so call this right before continuing the run.
+        """
+        model, logger, extra, _ = Checkpoint.read(path)
+        return model, logger, extra
+
+    def resume(self) -> tuple["TrafficModel", "Logger", dict]:
+        """load() this checkpoint's file and continue the snapshot schedule from it."""
+        model, logger, extra, self.last_checkpoint_time = Checkpoint.read(self.path)
+        return model, logger, extra
+
+    @staticmethod
+    def read(path: str) -> tuple["TrafficModel", "Logger", dict, int]:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+
+        model = state['model']
+        if model.vectorized_engine:
+            model.vectorized_engine.bind_vehicles()
+        random.setstate(state['random_state'])
+        np.random.set_state(state['numpy_random_state'])
+        return model, state['logger'], state['extra'], state['checkpoint_time']
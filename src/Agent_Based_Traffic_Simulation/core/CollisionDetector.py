@@ -0,0 +1,120 @@
+import numpy as np
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .TrafficModel import TrafficModel
+    from .TrafficAgent import TrafficAgent
+
+
+class CollisionDetector:
+    """
+    Finds every pair of overlapping vehicles in one pass over the model.
+
+    Broad phase: sweep and prune. Agents are sorted by y and every agent is only paired with the agents
+    that follow it in that order within reach of its bounding circle. Pairs are then pruned by their
+    lateral (lane) and longitudinal extent.
+    Narrow phase: the same Separating Axis Theorem test as TrafficModel.is_collision, run on all the
+    candidate pairs at once with NumPy.
+
+    In a shard (ShardedModel) the model's ghosts take part too, so collisions across a shard boundary are found.
+    A pair is reported by the shard that owns its smaller-id agent only, so the shards never count a pair twice.
+    """
+
+    def __init__(self, model: "TrafficModel") -> None:
+        self.model: "TrafficModel" = model
+
+    def detect(self) -> list[tuple["TrafficAgent", "TrafficAgent"]]:
+        """Colliding agent pairs, each ordered by unique_id, sorted by (unique_id, unique_id)."""
+        agents, position, velocity, length, width = self.gather()
+        if len(agents) < 2:
+            return []
+
+        first, second = self.broad_phase(position, length, width)
+        if len(first) == 0:
+            return []
+        is_colliding = self.narrow_phase(position, velocity, length, width, first, second)
+
+        ghosts = {id(ghost) for ghost in self.model.ghost_agents}
+        pairs = []
+        for i, j in zip(first[is_colliding].tolist(), second[is_colliding].tolist()):
+            agent_a, agent_b = agents[i], agents[j]
+            if agent_b.unique_id < agent_a.unique_id:
+                agent_a, agent_b = agent_b, agent_a
+            if id(agent_a) in ghosts:
+                continue # the neighbor owning agent_a reports it
+            pairs.append((agent_a, agent_b))
+        pairs.sort(key=lambda pair: (pair[0].unique_id, pair[1].unique_id))
+        return pairs
+
+    def gather(self):
+        engine = self.model.vectorized_engine
+        if engine:
+            n = engine.count
+            return (engine.agents, engine.position[:n], engine.velocity[:n], engine.length[:n], engine.width[:n])
+
+        agents = list(self.model.agents) + self.model.ghost_agents
+        position = np.array([agent.vehicle.position for agent in agents], dtype=float).reshape(-1, 2)
+        velocity = np.array([agent.vehicle.velocity for agent in agents], dtype=float).reshape(-1, 2)
+        length = np.array([agent.vehicle.length for agent in agents], dtype=float)
+        width = np.array([agent.vehicle.width for agent in agents], dtype=float)
+        return agents, position, velocity, length, width
+
+    @staticmethod
+    def broad_phase(position: np.ndarray, length: np.ndarray, width: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Index pairs (i, j) whose bounding circles overlap, found by sweeping along y."""
+        # Radius of the circle around each vehicle, valid for any heading
+        reach = 0.5 * np.hypot(length, width)
+
+        order = np.argsort(position[:, 1], kind="stable")
+        sorted_y = position[order, 1]
+        sorted_reach = reach[order]
+
+        # Everything after i in y order and within its reach plus the largest reach is a candidate
+        window_end = np.searchsorted(sorted_y, sorted_y + sorted_reach + reach.max(), side="right")
+        counts = window_end - np.arange(1, len(order) + 1)
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+
+        first_sorted = np.repeat(np.arange(len(order)), counts)
+        block_start = np.repeat(np.cumsum(counts) - counts, counts)
+        second_sorted = first_sorted + 1 + (np.arange(total) - block_start)
+        first = order[first_sorted]
+        second = order[second_sorted]
+
+        # Prune by lateral (lane) and longitudinal extent
+        limit = reach[first] + reach[second]
+        delta = np.abs(position[first] - position[second])
+        keep = (delta[:, 0] <= limit) & (delta[:, 1] <= limit)
+        return first[keep], second[keep]
+
+    @staticmethod
+    def narrow_phase(position: np.ndarray, velocity: np.ndarray, length: np.ndarray, width: np.ndarray,
+                     first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        """Separating Axis Theorem on every (first, second) pair at once. True where the rectangles overlap."""
+        # Heading of each vehicle, straight up when stopped
+        speed = np.hypot(velocity[:, 0], velocity[:, 1])
+        forward = np.tile(np.array([0.0, 1.0]), (len(velocity), 1))
+        is_moving = speed >= 1e-6
+        forward[is_moving] = velocity[is_moving] / speed[is_moving, None]
+        right = np.stack([-forward[:, 1], forward[:, 0]], axis=1)
+
+        # Corners of every rectangle (center +- forward/right)
+        signs = np.array([[1, 1], [1, -1], [-1, -1], [-1, 1]], dtype=float)
+        half_length = (length / 2)[:, None, None]
+        half_width = (width / 2)[:, None, None]
+        corners = (position[:, None, :]
+                   + signs[None, :, 0, None] * forward[:, None, :] * half_length
+                   + signs[None, :, 1, None] * right[:, None, :] * half_width)
+
+        corners_a = corners[first]
+        corners_b = corners[second]
+        # Projection axes are the rectangle normals of both vehicles
+        axes = np.stack([forward[first], right[first], forward[second], right[second]], axis=1)
+
+        projection_a = np.einsum("pad,pcd->pac", axes, corners_a)
+        projection_b = np.einsum("pad,pcd->pac", axes, corners_b)
+        is_separated = ((projection_a.max(axis=2) < projection_b.min(axis=2)) |
+                        (projection_b.max(axis=2) < projection_a.min(axis=2)))
+        return ~is_separated.any(axis=1)
@@ -0,0 +1,54 @@
+import math
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .TrafficAgent import TrafficAgent
+
+
+class DecisionScheduler:
+    """
+    Calendar of lane change decisions, one bucket per tick.
+
+    Every agent sits in the bucket of the tick its next decision falls on. The model pops the current tick's
+    bucket, so each tick only touches the agents that actually decide, not the whole population.
+    Rescheduling an agent does not search for its old entry, the old one is just skipped when its bucket comes up
+    (it no longer matches agent.next_decision_bucket).
+    """
+
+    def __init__(self, tick_ms: int) -> None:
+        self.tick_ms: int = tick_ms
+        self.buckets: dict[int, list["TrafficAgent"]] = {}
+        self.scheduled: int = 0
+        self.decisions: int = 0
+        self.stale_entries: int = 0
+
+    def bucket_of(self, time_ms: float) -> int:
+        # First tick at or after time_ms
+        return math.ceil(time_ms / self.tick_ms)
+
+    def schedule(self, agent: "TrafficAgent", time_ms: float) -> None:
+        bucket = self.bucket_of(time_ms)
+        if agent.next_decision_bucket == bucket:
+            return
+        agent.next_decision_bucket = bucket
+        self.buckets.setdefault(bucket, []).append(agent)
+        self.scheduled += 1
+
+    def pop_due(self, time_ms: float) -> list["TrafficAgent"]:
+        """Agents whose decision falls on the tick starting at time_ms, in the order they were scheduled."""
+        bucket = self.bucket_of(time_ms)
+        entries = self.buckets.pop(bucket, None)
+        if not entries:
+            return []
+        due = [agent for agent in entries if agent.next_decision_bucket == bucket and not agent.is_removed]
+        self.decisions += len(due)
+        self.stale_entries += len(entries) - len(due)
+        return due
+
+    def stats(self) -> dict:
+        return {
+            'scheduled': self.scheduled,
+            'decisions': self.decisions,
+            'stale_entries': self.stale_entries,
+            'pending_buckets': len(self.buckets),
+        }
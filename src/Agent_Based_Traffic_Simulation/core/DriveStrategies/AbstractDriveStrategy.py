@@ -9,6 +9,7 @@ if TYPE_CHECKING:
 
 
 class AbstractDriveStrategy(AbstractState):
+    __slots__ = ()
 
     def step(self, traffic_agent: "TrafficAgent"):
         pass
@@ -7,6 +7,16 @@ if TYPE_CHECKING:
     from ..TrafficAgent import TrafficAgent
 
 class AbstractState:
+    """
+    Strategies are stateless, every agent shares one instance per strategy (anything per agent lives on the agent).
+    `shared_name` is the module level name of that instance, so pickling refers to it instead of copying it.
+    """
+    __slots__ = ()
     name:str = "abstractState"
+    shared_name: str = None
+
+    def __reduce__(self):
+        return self.shared_name
+
     def step(self, traffic_agent: "TrafficAgent"):  
         pass
\ No newline at end of file
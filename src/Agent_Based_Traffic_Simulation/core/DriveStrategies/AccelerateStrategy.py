@@ -8,21 +8,21 @@ if TYPE_CHECKING:
     from ..TrafficAgent import TrafficAgent
     
 class AccelerateStrategy(AbstractDriveStrategy):
+    __slots__ = ()
     name:str = "accelerate"
+    shared_name: str = "ACCELERATE_STRATEGY"
 
     def step(self, traffic_agent: "TrafficAgent"):
-        a_cmd = self.calculate_accel(traffic_agent)
+        a_cmd = traffic_agent.get_accel()
         #Variabilitiy
 
-        direction = to_unit(traffic_agent.vehicle.velocity) if np.linalg.norm(traffic_agent.vehicle.velocity) > EPS else np.array([0., 1.])
-        new_acceleration = direction * a_cmd
-        traffic_agent.vehicle.setAcceleration(new_acceleration)
+        traffic_agent.vehicle.setAccelerationAlong(traffic_agent.get_heading(), a_cmd)
         
 
 
     def calculate_accel(self, traffic_agent) -> float:
         """Calculates the desired acceleration without applying it."""
-        current_speed = float(np.linalg.norm(traffic_agent.vehicle.velocity))
+        current_speed = float(traffic_agent.get_speed())
         desired_speed = float(traffic_agent.desired_speed)
 
         # reuse the same gain profile as cruise, but never decelerate
@@ -41,3 +41,6 @@ class AccelerateStrategy(AbstractDriveStrategy):
         
 
         return float(acceleration_clipped)
+
+
+ACCELERATE_STRATEGY = AccelerateStrategy()
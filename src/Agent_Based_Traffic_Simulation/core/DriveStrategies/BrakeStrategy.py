@@ -1,12 +1,15 @@
 import numpy as np
 from .AbstractDriveStrategy import AbstractDriveStrategy
+from .CruiseStrategy import CruiseStrategy
 from ..Utils import change_magnitude, EPS, to_unit
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from ..TrafficAgent import TrafficAgent
 class BrakeStrategy(AbstractDriveStrategy):
+    __slots__ = ()
     name:str = "brake"
+    shared_name: str = "BRAKE_STRATEGY"
     
 
     def step(self, traffic_agent: "TrafficAgent"):
@@ -17,13 +20,12 @@ class BrakeStrategy(AbstractDriveStrategy):
         lead = traffic_agent.lead
         if lead is None:
             # Should not happen if logic in TrafficAgent is correct, but as a fallback, stop braking.
-            from .CruiseStrategy import CruiseStrategy
             traffic_agent.assign_strategy(CruiseStrategy)
             traffic_agent.current_drive_strategy.step(traffic_agent)
             return
 
-        v_now = float(np.linalg.norm(traffic_agent.vehicle.velocity))
-        v_lead = float(np.linalg.norm(lead.vehicle.velocity))
+        v_now = float(traffic_agent.get_speed())
+        v_lead = float(lead.get_speed())
         delta_v = v_now - v_lead
         gap = traffic_agent.gap_to_lead
 
@@ -61,9 +63,7 @@ class BrakeStrategy(AbstractDriveStrategy):
 
 
         # Apply along lane direction as a deceleration vector
-        direction = to_unit(traffic_agent.vehicle.velocity) if np.linalg.norm(traffic_agent.vehicle.velocity) > EPS else np.array([0., 1.])
-        new_accel = direction * a_cmd
-        traffic_agent.vehicle.setAcceleration(new_accel)
+        traffic_agent.vehicle.setAccelerationAlong(traffic_agent.get_heading(), a_cmd)
 
     
 
@@ -73,8 +73,8 @@ class BrakeStrategy(AbstractDriveStrategy):
         lead = traffic_agent.lead
         if lead is None or traffic_agent.gap_to_lead is None:
             return 0.0
-        v_now = float(np.linalg.norm(traffic_agent.vehicle.velocity))
-        v_lead = float(np.linalg.norm(lead.vehicle.velocity))
+        v_now = float(traffic_agent.get_speed())
+        v_lead = float(lead.get_speed())
         delta_v = v_now - v_lead
         gap = traffic_agent.gap_to_lead
 
@@ -104,3 +104,6 @@ class BrakeStrategy(AbstractDriveStrategy):
             a_cmd = 0.0
         
         return a_cmd
+
+
+BRAKE_STRATEGY = BrakeStrategy()
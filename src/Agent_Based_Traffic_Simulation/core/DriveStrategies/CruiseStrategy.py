@@ -8,23 +8,23 @@ if TYPE_CHECKING:
 
 # The idea of cruising is trying to get back to your "desired cruising speed and stay there"
 class CruiseStrategy(AbstractDriveStrategy):
+    __slots__ = ()
     name:str = 'cruise'
+    shared_name: str = "CRUISE_STRATEGY"
 
 
     # def step(self, traffic_agent):
     #     traffic_agent.vehicle.setAcceleration(np.array([0,0]))
 
     def step(self, traffic_agent: "TrafficAgent"):
-        a_cmd = self.calculate_accel(traffic_agent)
-        direction = to_unit(traffic_agent.vehicle.velocity) if np.linalg.norm(traffic_agent.vehicle.velocity) > EPS else np.array([0., 1.])
-        new_acceleration = direction * a_cmd
-        traffic_agent.vehicle.setAcceleration(new_acceleration)
+        a_cmd = traffic_agent.get_accel()
+        traffic_agent.vehicle.setAccelerationAlong(traffic_agent.get_heading(), a_cmd)
   
 
     def calculate_accel(self, traffic_agent) -> float:
         cruise_g = traffic_agent.cruise_gain
         desired_v = traffic_agent.desired_speed
-        current_v = np.linalg.norm(traffic_agent.vehicle.velocity)
+        current_v = traffic_agent.get_speed()
 
         # The acceleration/deceleration needed to get to my desired velocity
         acceleration_raw = cruise_g * (desired_v - current_v)
@@ -41,3 +41,6 @@ class CruiseStrategy(AbstractDriveStrategy):
             acceleration_clipped = 0
         
         return acceleration_clipped
+
+
+CRUISE_STRATEGY = CruiseStrategy()
@@ -0,0 +1,397 @@
+import struct
+from typing import NamedTuple
+import numpy as np
+
+from .VectorizedEngine import STRATEGY_TYPES
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .TrafficModel import TrafficModel
+
+
+# Enum tables shared with static/js/simulationApi.js, append only
+DRIVE_STRATEGY_NAMES = ("cruise", "accelerate", "brake")
+VEHICLE_TYPE_NAMES = ("SUV", "Truck", "Motorcycle")
+UNKNOWN_CODE = 255
+
+MPH_PER_MM_PER_MS = 2.23694
+
+# Viewport culling: agents this far outside the visible range are still sent, so panning and the
+# movement until the next frame don't show empty road
+CULL_MARGIN_PX = 200
+CULL_MIN_MARGIN_MM = 20_000
+DENSITY_BINS = 64
+
+
+class FrameArrays(NamedTuple):
+    """Everything the front end draws for one step, one entry per agent."""
+    ids: np.ndarray                 # uint32
+    position: np.ndarray            # (n, 2) mm
+    velocity: np.ndarray            # (n, 2) mm/ms
+    speed: np.ndarray               # mm/ms
+    heading: np.ndarray             # radians
+    length: np.ndarray              # mm
+    width: np.ndarray               # mm
+    sensing_distance: np.ndarray    # mm
+    drive_strategies: np.ndarray    # uint8 codes into DRIVE_STRATEGY_NAMES
+    vehicle_types: np.ndarray       # uint8 codes into VEHICLE_TYPE_NAMES
+    # Whole highway, also when only a window of it is sent
+    total_count: int
+    total_speed: float              # sum of all speeds, mm/ms
+    density: np.ndarray             # uint16 agents per bin of DENSITY_BINS along y, empty if not culled
+
+
+class DynamicArrays(NamedTuple):
+    """The part of FrameArrays that changes from step to step, plus where to look up the rest."""
+    agents: list                    # every agent, the arrays hold agents[rows]
+    rows: np.ndarray                # int64, into agents (and the vectorized engine's arrays when it is active)
+    ids: np.ndarray
+    position: np.ndarray
+    velocity: np.ndarray
+    speed: np.ndarray
+    heading: np.ndarray
+    drive_strategies: np.ndarray
+    total_count: int
+    total_speed: float
+    density: np.ndarray
+
+
+class FrameEncoder:
+    """
+    Packs the state of a model into what /api/step sends to the front end.
+
+    The binary frame is little endian, a fixed header followed by one array per field (structure of arrays),
+    so the browser can wrap every field in a typed array without parsing anything:
+
+        header      magic "TSF1", version u16, header size u16, step u32, agent count u32,
+                    time elapsed f64 (s), average speed f32 (mph), agents on the whole highway u32,
+                    density bins u16, reserved u16, window y min f32, window y max f32 (mm)
+        float32[n]  x, y, vx, vy, speed, length, width, heading, sensing_distance
+        uint32[n]   id
+        uint8[n]    drive strategy, vehicle type    (codes into the tables above, 255 = unknown)
+        uint16[b]   agents per bin along y, when only a window of the highway is sent
+        padding     zero bytes up to a multiple of 4, so frames can be sent back to back and still be aligned
+
+    The average speed is over the whole highway. Without a window, y min/max are 0 and the highway length.
+    """
+    MAGIC = b"TSF1"
+    VERSION = 2
+    HEADER = struct.Struct("<4sHHIIdfIHHff")
+    FLOAT_FIELDS = ("x", "y", "vx", "vy", "speed", "length", "width", "heading", "sensing_distance")
+
+    def __init__(self) -> None:
+        self.drive_strategy_codes: dict[str, int] = {name: code for code, name in enumerate(DRIVE_STRATEGY_NAMES)}
+        self.vehicle_type_codes: dict[str, int] = {name: code for code, name in enumerate(VEHICLE_TYPE_NAMES)}
+        # Vectorized engine strategy code -> code into DRIVE_STRATEGY_NAMES
+        self.engine_strategy_codes: np.ndarray = np.array(
+            [self.drive_strategy_codes.get(strategy_type.name, UNKNOWN_CODE) for strategy_type in STRATEGY_TYPES], dtype=np.uint8)
+
+    @staticmethod
+    def view_window(y_min: float, y_max: float, zoom: float = None) -> tuple[float, float]:
+        """
+        y range to send for a client showing [y_min, y_max] at `zoom` screen px per mm.
+        The margin is CULL_MARGIN_PX on screen, or a quarter of the visible range without a zoom.
+        """
+        margin = CULL_MARGIN_PX / zoom if zoom else (y_max - y_min) / 4
+        margin = max(margin, CULL_MIN_MARGIN_MM)
+        return y_min - margin, y_max + margin
+
+    def gather(self, model: "TrafficModel", window: tuple[float, float] = None) -> FrameArrays:
+        """All agents, or only those with y inside `window` (see view_window)."""
+        dynamic = self.gather_dynamic(model, window)
+        length, width, sensing_distance, vehicle_types = self.gather_static(model, dynamic)
+        return FrameArrays(
+            ids=dynamic.ids,
+            position=dynamic.position,
+            velocity=dynamic.velocity,
+            speed=dynamic.speed,
+            heading=dynamic.heading,
+            length=length,
+            width=width,
+            sensing_distance=sensing_distance,
+            drive_strategies=dynamic.drive_strategies,
+            vehicle_types=vehicle_types,
+            total_count=dynamic.total_count,
+            total_speed=dynamic.total_speed,
+            density=dynamic.density,
+        )
+
+    def gather_dynamic(self, model: "TrafficModel", window: tuple[float, float] = None) -> DynamicArrays:
+        """
+        ids, kinematics and drive strategies of all agents, or only those with y inside `window`.
+        Read from the vectorized engine's arrays when it is active, with the agent engine one pass over the agents.
+        """
+        engine = model.vectorized_engine
+        if engine:
+            n = engine.count
+            agents = engine.agents
+            all_y = engine.position[:n, 1]
+            all_velocity = engine.velocity[:n]
+        else:
+            agents = list(model.agents)
+            all_y = np.fromiter((agent.pos[1] for agent in agents), dtype=float, count=len(agents))
+            all_velocity = np.array([agent.vehicle.velocity for agent in agents], dtype=float).reshape(-1, 2)
+        total_count = len(agents)
+        total_speed = float(np.hypot(all_velocity[:, 0], all_velocity[:, 1]).sum())
+
+        density = np.zeros(0, dtype=np.uint16)
+        if window is not None:
+            # Only the y values of everyone are needed for culling and the density summary
+            counts, _ = np.histogram(all_y, bins=DENSITY_BINS, range=(0, model.highway.y_max))
+            density = np.minimum(counts, 65535).astype(np.uint16)
+            rows = np.flatnonzero((all_y >= window[0]) & (all_y <= window[1]))
+        else:
+            rows = np.arange(total_count)
+
+        if engine:
+            ids = engine.unique_id[rows].astype(np.uint32)
+            position = engine.position[rows]
+            velocity = all_velocity[rows]
+            drive_strategies = self.engine_strategy_codes[engine.strategy[rows]]
+        else:
+            selected = agents if window is None else [agents[i] for i in rows.tolist()]
+            strategy_code = self.drive_strategy_codes.get
+            ids = np.fromiter((agent.unique_id for agent in selected), dtype=np.uint32, count=len(selected))
+            position = np.array([agent.vehicle.position for agent in selected], dtype=float).reshape(-1, 2)
+            velocity = all_velocity[rows]
+            drive_strategies = np.fromiter((strategy_code(getattr(agent.current_drive_strategy, "name", None), UNKNOWN_CODE)
+                                            for agent in selected), dtype=np.uint8, count=len(selected))
+
+        speed = np.hypot(velocity[:, 0], velocity[:, 1])
+        heading = np.arctan2(velocity[:, 1], velocity[:, 0])
+        is_stopped = speed <= 0
+        if is_stopped.any():
+            # Stopped agents face along the lane they are heading for
+            lanes = model.highway.lanes
+            lane_headings = np.array([np.arctan2(*(lane.end_position - lane.start_position)[::-1]) for lane in lanes], dtype=float)
+            lane_intents = np.array([agents[i].lane_intent for i in rows[is_stopped].tolist()], dtype=np.int64)
+            heading[is_stopped] = lane_headings[lane_intents]
+
+        return DynamicArrays(
+            agents=agents,
+            rows=rows,
+            ids=ids,
+            position=position,
+            velocity=velocity,
+            speed=speed,
+            heading=heading,
+            drive_strategies=drive_strategies,
+            total_count=total_count,
+            total_speed=total_speed,
+            density=density,
+        )
+
+    def gather_static(self, model: "TrafficModel", dynamic: DynamicArrays, index: np.ndarray = None) -> tuple[np.ndarray, ...]:
+        """length, width, sensing distance and vehicle type codes of the agents at `index` into `dynamic` (default all)."""
+        rows = dynamic.rows if index is None else dynamic.rows[index]
+        agents = [dynamic.agents[i] for i in rows.tolist()]
+        engine = model.vectorized_engine
+        if engine:
+            length = engine.length[rows]
+            width = engine.width[rows]
+            sensing_distance = engine.sensing_distance[rows]
+        else:
+            length = np.array([agent.vehicle.length for agent in agents], dtype=float)
+            width = np.array([agent.vehicle.width for agent in agents], dtype=float)
+            sensing_distance = np.array([agent.sensing_distance for agent in agents], dtype=float)
+        vehicle_code = self.vehicle_type_codes.get
+        vehicle_types = np.array([vehicle_code(type(agent.vehicle).__name__, UNKNOWN_CODE) for agent in agents], dtype=np.uint8)
+        return length, width, sensing_distance, vehicle_types
+
+    @staticmethod
+    def aggregates(model: "TrafficModel", frame: FrameArrays | DynamicArrays) -> dict:
+        avg_speed = frame.total_speed / frame.total_count * MPH_PER_MM_PER_MS if frame.total_count else 0.0
+        return {
+            'avg_speed': round(avg_speed, 2),
+            'time_elapsed': round(model.total_time / 1000, 2),
+        }
+
+    def encode_binary(self, model: "TrafficModel", window: tuple[float, float] = None) -> bytes:
+        frame = self.gather(model, window)
+        aggregates = self.aggregates(model, frame)
+        n = len(frame.ids)
+        y_min, y_max = window if window is not None else (0, model.highway.y_max)
+
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.HEADER.size, model.steps, n,
+                                  aggregates['time_elapsed'], aggregates['avg_speed'], frame.total_count,
+                                  len(frame.density), 0, y_min, y_max)
+        floats = np.empty((len(self.FLOAT_FIELDS), n), dtype="<f4")
+        floats[0] = frame.position[:, 0]
+        floats[1] = frame.position[:, 1]
+        floats[2] = frame.velocity[:, 0]
+        floats[3] = frame.velocity[:, 1]
+        floats[4] = frame.speed
+        floats[5] = frame.length
+        floats[6] = frame.width
+        floats[7] = frame.heading
+        floats[8] = frame.sensing_distance
+        density = frame.density.astype("<u2").tobytes()
+        padding = bytes(-(2 * n + len(density)) % 4)
+        return b"".join((header, floats.tobytes(), frame.ids.astype("<u4").tobytes(),
+                         frame.drive_strategies.tobytes(), frame.vehicle_types.tobytes(), density, padding))
+
+    def encode_json(self, model: "TrafficModel", window: tuple[float, float] = None) -> dict:
+        frame = self.gather(model, window)
+        strategy_names = DRIVE_STRATEGY_NAMES + ("unknown",)
+        agents_data = []
+        for agent_id, (x, y), (vx, vy), speed, length, width, heading, sensing_distance, strategy in zip(
+                frame.ids.tolist(), frame.position.tolist(), frame.velocity.tolist(), frame.speed.tolist(),
+                frame.length.tolist(), frame.width.tolist(), frame.heading.tolist(), frame.sensing_distance.tolist(),
+                frame.drive_strategies.tolist()):
+            agents_data.append({
+                'id': agent_id,
+                'x': x,                # mm
+                'y': y,                # mm
+                'vx': vx,              # mm/ms
+                'vy': vy,              # mm/ms
+                'speed': speed,        # mm/ms
+                'length': length,      # mm
+                'width': width,        # mm
+                'heading': heading,    # radians
+                'drive_strategy': strategy_names[min(strategy, len(DRIVE_STRATEGY_NAMES))],
+                'sensing_distance': sensing_distance,
+            })
+
+        return {
+            'status': 'success',
+            'agents': agents_data,
+            'aggregateData': [self.aggregates(model, frame)],
+            'step': model.steps,
+            'total_agents': frame.total_count,
+            'density': frame.density.tolist(),
+            'window': list(window) if window is not None else [0, model.highway.y_max],
+        }
+
+
+class DeltaEncoder(FrameEncoder):
+    """
+    Frames that only carry what changed since the last frame this client received.
+
+    Static attributes (length, width, sensing distance, vehicle type) are sent once, when an agent spawns.
+    After that a frame lists the removed ids and, for agents whose quantized state changed, the position
+    delta in whole mm, heading, speed and drive strategy. Positions are tracked on the same mm grid the
+    client has, so rounding never accumulates.
+    A keyframe (every agent sent as spawned, client drops everything it had) goes out every `keyframe_every`
+    frames, when asked for, or when the client's `base_seq` is not the last frame sent, e.g. because the
+    client aborted a request and never applied that frame.
+
+    Layout, little endian:
+
+        header      magic "TSD1", version u16, header size u16, step u32, seq u32, base seq u32,
+                    flags u16 (1 = keyframe, 2 = int32 deltas), density bins u16, time elapsed f64 (s),
+                    average speed f32 (mph), agent count u32, removed u32, spawned u32, updated u32,
+                    agents on the whole highway u32
+        u32[removed]    removed ids
+        spawned         u32 id, i32 x, i32 y (mm), f32 length, f32 width, f32 sensing distance
+        u32[updated]    updated ids
+        updated         i16 (or i32) dx, dy (mm)
+        updated         u16 heading (2 pi / 65536), u16 speed (0.001 mm/ms)
+        u16[bins]       agents per bin along y, when only a window of the highway is sent
+        u8[spawned]     vehicle type
+        u8[updated]     drive strategy
+        padding         up to a multiple of 4
+
+    Spawned agents are also in the updated arrays, with a zero position delta.
+    With a window, agents that leave it are removed and agents that enter it spawn.
+    """
+    MAGIC = b"TSD1"
+    HEADER = struct.Struct("<4sHHIIIHHdfIIIII")
+    KEYFRAME = 1
+    WIDE_DELTAS = 2
+    HEADING_STEPS = 65536
+    SPEED_QUANTUM = 0.001 # mm/ms
+
+    def __init__(self, keyframe_every: int = 100) -> None:
+        super().__init__()
+        self.keyframe_every: int = keyframe_every
+        self.seq: int = 0
+        self.frames_since_keyframe: int = 0
+        self.keyframes_sent: int = 0
+        self.bytes_sent: int = 0
+
+        # What the client has, sorted by id
+        self.sent_ids: np.ndarray = np.zeros(0, dtype=np.uint32)
+        self.sent_state: np.ndarray = np.zeros((0, 5), dtype=np.int64)   # x, y, heading, speed, strategy
+
+    def reset(self) -> None:
+        self.sent_ids = np.zeros(0, dtype=np.uint32)
+        self.sent_state = np.zeros((0, 5), dtype=np.int64)
+
+    def quantize(self, frame: FrameArrays | DynamicArrays) -> np.ndarray:
+        heading = np.round(np.mod(frame.heading, 2 * np.pi) / (2 * np.pi) * self.HEADING_STEPS).astype(np.int64) % self.HEADING_STEPS
+        speed = np.clip(np.round(frame.speed / self.SPEED_QUANTUM), 0, 65535).astype(np.int64)
+        return np.column_stack((np.round(frame.position).astype(np.int64), heading, speed,
+                                frame.drive_strategies.astype(np.int64)))
+
+    def encode(self, model: "TrafficModel", base_seq: int = None, keyframe: bool = False,
+               window: tuple[float, float] = None) -> bytes:
+        """
+        Next frame for a client that applied frame `base_seq` (None: the last frame this encoder sent).
+        Only the dynamic columns are gathered for every agent, the static ones for the spawned agents.
+        """
+        frame = self.gather_dynamic(model, window)
+        aggregates = self.aggregates(model, frame)
+
+        order = np.argsort(frame.ids, kind="stable")
+        ids = frame.ids[order]
+        state = self.quantize(frame)[order]
+
+        is_keyframe = (keyframe or self.frames_since_keyframe >= self.keyframe_every
+                       or (base_seq is not None and base_seq != self.seq))
+        if is_keyframe:
+            self.reset()
+
+        # Match the agents against what the client has
+        slot = np.searchsorted(self.sent_ids, ids)
+        slot_in_range = np.minimum(slot, max(len(self.sent_ids) - 1, 0))
+        is_known = (slot < len(self.sent_ids)) & (self.sent_ids[slot_in_range] == ids) if len(self.sent_ids) else np.zeros(len(ids), dtype=bool)
+        removed = self.sent_ids[~np.isin(self.sent_ids, ids, assume_unique=True)]
+
+        previous = np.zeros_like(state)
+        previous[is_known] = self.sent_state[slot[is_known]]
+        is_spawned = ~is_known
+        previous[is_spawned] = state[is_spawned]
+        previous[is_spawned, 2:] = -1 # always send the dynamic state of new agents
+        is_updated = (state != previous).any(axis=1)
+
+        spawned = np.flatnonzero(is_spawned)
+        updated = np.flatnonzero(is_updated)
+        delta = state[updated, :2] - previous[updated, :2]
+        is_wide = bool(len(delta)) and (np.abs(delta).max() > 32767)
+
+        self.seq += 1
+        self.frames_since_keyframe = 0 if is_keyframe else self.frames_since_keyframe + 1
+        self.keyframes_sent += is_keyframe
+        flags = (self.KEYFRAME if is_keyframe else 0) | (self.WIDE_DELTAS if is_wide else 0)
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.HEADER.size, model.steps, self.seq,
+                                  0 if is_keyframe else self.seq - 1, flags, len(frame.density),
+                                  aggregates['time_elapsed'], aggregates['avg_speed'],
+                                  len(ids), len(removed), len(spawned), len(updated), frame.total_count)
+
+        length, width, sensing_distance, vehicle_types = self.gather_static(model, frame, order[spawned])
+        delta_type = "<i4" if is_wide else "<i2"
+        parts = [
+            header,
+            removed.astype("<u4").tobytes(),
+            ids[spawned].astype("<u4").tobytes(),
+            state[spawned, 0].astype("<i4").tobytes(),
+            state[spawned, 1].astype("<i4").tobytes(),
+            length.astype("<f4").tobytes(),
+            width.astype("<f4").tobytes(),
+            sensing_distance.astype("<f4").tobytes(),
+            ids[updated].astype("<u4").tobytes(),
+            delta[:, 0].astype(delta_type).tobytes(),
+            delta[:, 1].astype(delta_type).tobytes(),
+            state[updated, 2].astype("<u2").tobytes(),
+            state[updated, 3].astype("<u2").tobytes(),
+            frame.density.astype("<u2").tobytes(),
+            vehicle_types.tobytes(),
+            state[updated, 4].astype(np.uint8).tobytes(),
+        ]
+        size = sum(len(part) for part in parts)
+        parts.append(bytes(-size % 4))
+
+        self.sent_ids = ids
+        self.sent_state = state
+        self.bytes_sent += size + (-size % 4)
+        return b"".join(parts)
@@ -1,3 +1,5 @@
+import bisect
+import math
 from mesa.space import ContinuousSpace
 from .Lane import Lane
 import numpy as np
@@ -5,7 +7,18 @@ from typing import List
 
 
 class Highway(ContinuousSpace):
+    """
+    The road. Positions are kept in a uniform grid instead of Mesa's point array: one column per lane width
+    and one row per SEGMENT_LENGTH of road. Moving an agent only touches the grid when it crosses into another cell,
+    and get_neighbors only looks at the cells the radius reaches instead of measuring the distance to every agent.
+    place_agent/move_agent/remove_agent/get_neighbors keep ContinuousSpace's behaviour, results included
+    (same agents, same order).
+    """
 
+    # Extra lateral reach (mm) when building the lane index, so agents drifting sideways during a step stay indexed
+    LANE_INDEX_MARGIN: float = 500.0
+    # Length (mm) of one grid row, a few car lengths so typical queries (10-15 car lengths) touch a handful of rows
+    SEGMENT_LENGTH: float = 25_000.0
 
     def __init__(self, x_max: float, y_max: float, lane_count: int, lane_width: float)-> None: 
         super().__init__(x_max, y_max, False)
@@ -35,9 +48,198 @@ class Highway(ContinuousSpace):
             )
             self.lanes.append(lane)
 
+        # Per-lane index of agents sorted by longitudinal position (y), rebuilt once per step
+        self.lane_index_positions: List[List[float]] = [[] for _ in range(self.lane_count)]
+        self.lane_index_agents: List[list] = [[] for _ in range(self.lane_count)]
+        self.lane_index_slack: float = 0.0
+
+        # Uniform grid: cell key -> agents in that cell (dicts keep insertion order and remove in O(1))
+        self.cell_width: float = float(lane_width)
+        self.column_count: int = max(1, math.ceil(self.width / self.cell_width))
+        self.cells: dict[int, dict] = {}
+        self.cell_of: dict = {}
+        # Order agents were placed in, neighbor queries return agents in this order like ContinuousSpace does
+        self.placement_order: dict = {}
+        self.placement_counter: int = 0
+        # Running totals of get_neighbors calls and of the agents they measured the distance to (TrafficModel.profiler)
+        self.neighbor_queries: int = 0
+        self.neighbor_candidates: int = 0
+
     # Methods for the front end
     def get_lane_centers(self) -> List[float]:
         return list(self.lane_centers)
 
     def get_lane_width(self) -> float:
         return float(self.lane_width)
+
+    # ---------- grid ----------
+    def cell_key(self, x: float, y: float) -> int:
+        column = min(max(int((x - self.x_min) // self.cell_width), 0), self.column_count - 1)
+        return int((y - self.y_min) // self.SEGMENT_LENGTH) * self.column_count + column
+
+    def add_to_cell(self, agent, key: int) -> None:
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = {}
+        cell[agent] = None
+        self.cell_of[agent] = key
+
+    def remove_from_cell(self, agent) -> None:
+        key = self.cell_of.pop(agent)
+        cell = self.cells[key]
+        del cell[agent]
+        if not cell:
+            del self.cells[key]
+
+    def place_agent(self, agent, pos) -> None:
+        pos = self.torus_adj(pos)
+        if agent in self.cell_of:
+            self.remove_from_cell(agent)
+        if agent not in self._agent_to_index:
+            self._agent_to_index[agent] = None
+            self.placement_order[agent] = self.placement_counter
+            self.placement_counter += 1
+        agent.pos = pos
+        self.add_to_cell(agent, self.cell_key(pos[0], pos[1]))
+
+    def remove_agent(self, agent) -> None:
+        if agent not in self._agent_to_index:
+            raise Exception("Agent does not exist in the space")
+        del self._agent_to_index[agent]
+        del self.placement_order[agent]
+        self.remove_from_cell(agent)
+        agent.pos = None
+
+    def move_agent(self, agent, pos) -> None:
+        pos = self.torus_adj(pos)
+        agent.pos = pos
+        key = self.cell_key(pos[0], pos[1])
+        if key != self.cell_of[agent]:
+            self.remove_from_cell(agent)
+            self.add_to_cell(agent, key)
+
+    def move_agents(self, agents: list, positions: np.ndarray) -> None:
+        """
+        Commit the positions of many agents at once instead of calling move_agent per agent.
+        Cells are computed for all of them in one go, only agents that changed cell touch the grid.
+        Positions must already be inside the highway.
+        """
+        if len(agents) == 0:
+            return
+        columns = np.clip(((positions[:, 0] - self.x_min) // self.cell_width).astype(np.int64), 0, self.column_count - 1)
+        keys = ((positions[:, 1] - self.y_min) // self.SEGMENT_LENGTH).astype(np.int64) * self.column_count + columns
+        for agent, pos in zip(agents, positions.tolist()):
+            agent.pos = tuple(pos)
+        previous_keys = np.fromiter(map(self.cell_of.__getitem__, agents), np.int64, len(agents))
+        for index in np.flatnonzero(keys != previous_keys).tolist():
+            agent = agents[index]
+            self.remove_from_cell(agent)
+            self.add_to_cell(agent, int(keys[index]))
+
+    def get_neighbors(self, pos, radius: float, include_center: bool = True) -> list:
+        """
+        All agents within `radius` of `pos`, like ContinuousSpace.get_neighbors
+        (include_center=False leaves out agents sitting exactly on `pos`).
+        """
+        x, y = pos[0], pos[1]
+        first_column = min(max(int((x - radius - self.x_min) // self.cell_width), 0), self.column_count - 1)
+        last_column = min(max(int((x + radius - self.x_min) // self.cell_width), 0), self.column_count - 1)
+        first_row = int((y - radius - self.y_min) // self.SEGMENT_LENGTH)
+        last_row = int((y + radius - self.y_min) // self.SEGMENT_LENGTH)
+
+        radius_squared = radius ** 2
+        neighbors = []
+        cells = self.cells
+        candidates = 0
+        for row in range(first_row, last_row + 1):
+            row_key = row * self.column_count
+            for column in range(first_column, last_column + 1):
+                cell = cells.get(row_key + column)
+                if cell is None:
+                    continue
+                candidates += len(cell)
+                for agent in cell:
+                    dx = agent.pos[0] - x
+                    dy = agent.pos[1] - y
+                    distance_squared = dx * dx + dy * dy
+                    if distance_squared <= radius_squared and (include_center or distance_squared > 0):
+                        neighbors.append(agent)
+        self.neighbor_queries += 1
+        self.neighbor_candidates += candidates
+        if len(neighbors) > 1:
+            neighbors.sort(key=self.placement_order.__getitem__)
+        return neighbors
+
+    # ---------- lane index ----------
+    def update_lane_index(self, agents, dt: float = 0.0) -> None:
+        """
+        Rebuild the per-lane index from the agents' current positions.
+        An agent is listed in every lane it overlaps, so agents in the middle of a lane change
+        are found by queries on both their old and their new lane.
+        `dt` is the time until the next rebuild, it bounds how far past its indexed y an agent can get meanwhile.
+        """
+        entries: List[list] = [[] for _ in range(self.lane_count)]
+        max_speed = 0.0
+        for agent in agents:
+            if agent.pos is None:
+                continue
+            x, y = agent.pos
+            max_speed = max(max_speed, agent.max_speed)
+            # Wide enough for both TrafficAgent.is_in_same_lane and the partly-in-lane check used by MOBIL
+            reach = max(self.lane_width * 0.80, (self.lane_width + agent.vehicle.width) / 2) + self.LANE_INDEX_MARGIN
+            for lane_idx, center in enumerate(self.lane_centers):
+                if abs(x - center) < reach:
+                    entries[lane_idx].append((y, agent))
+
+        for lane_idx, lane_entries in enumerate(entries):
+            lane_entries.sort(key=lambda entry: entry[0])
+            self.lane_index_positions[lane_idx] = [entry[0] for entry in lane_entries]
+            self.lane_index_agents[lane_idx] = [entry[1] for entry in lane_entries]
+        # Agents never move backwards and never go faster than their max_speed, so live y is in [indexed y, indexed y + slack]
+        self.lane_index_slack = max_speed * dt
+
+    def agents_between(self, lane_idx: int, y_min: float, y_max: float) -> list:
+        """
+        Agents indexed in `lane_idx` that can be between `y_min` and `y_max` right now.
+        The index holds positions from the last rebuild and agents have moved since, so callers check
+        the live `agent.pos` themselves; the result is in indexed order, not live order.
+        """
+        positions = self.lane_index_positions[lane_idx]
+        start = bisect.bisect_left(positions, y_min - self.lane_index_slack)
+        end = bisect.bisect_right(positions, y_max, lo=start)
+        return self.lane_index_agents[lane_idx][start:end]
+
+    def get_leader(self, lane_idx: int, y: float, max_distance: float = float("inf"), predicate=None):
+        """Agent in `lane_idx` nearest ahead of `y` (live positions) within `max_distance` that passes `predicate`, or None."""
+        leader = None
+        leader_y = y + max_distance
+        for agent in self.agents_between(lane_idx, y, y + max_distance):
+            agent_y = agent.pos[1]
+            if y < agent_y <= leader_y and (leader is None or agent_y < leader_y) and (predicate is None or predicate(agent)):
+                leader, leader_y = agent, agent_y
+        return leader
+
+    def get_follower(self, lane_idx: int, y: float, max_distance: float = float("inf"), predicate=None):
+        """Agent in `lane_idx` nearest behind `y` (live positions) within `max_distance` that passes `predicate`, or None."""
+        follower = None
+        follower_y = y - max_distance
+        for agent in self.agents_between(lane_idx, y - max_distance, y):
+            agent_y = agent.pos[1]
+            if follower_y <= agent_y < y and (follower is None or agent_y > follower_y) and (predicate is None or predicate(agent)):
+                follower, follower_y = agent, agent_y
+        return follower
+
+    def get_k_nearest_in_lane(self, lane_idx: int, y: float, k: int, max_distance: float = float("inf"), predicate=None) -> list:
+        """Up to `k` agents in `lane_idx` closest to `y` (either direction, live positions), nearest first."""
+        candidates = [
+            agent for agent in self.agents_between(lane_idx, y - max_distance, y + max_distance)
+            if abs(agent.pos[1] - y) <= max_distance
+        ]
+        candidates.sort(key=lambda agent: abs(agent.pos[1] - y))
+        nearest = []
+        for candidate in candidates:
+            if len(nearest) == k:
+                break
+            if predicate is None or predicate(candidate):
+                nearest.append(candidate)
+        return nearest
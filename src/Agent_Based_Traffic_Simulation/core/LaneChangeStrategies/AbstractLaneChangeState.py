@@ -10,5 +10,6 @@ if TYPE_CHECKING:
 
 
 class AbstractLaneChangeState(AbstractState):
+    __slots__ = ()
     def step(self, traffic_agent: "TrafficAgent"):
         pass
\ No newline at end of file
@@ -6,29 +6,26 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from ..TrafficAgent import TrafficAgent
 
+LANE_CHANGE_DURATION = 2000.0 # Default 2 second lane change
+
+
 class LaneChangeStrategy(AbstractLaneChangeState):
     """
     Executes the physical lane change over a set duration.
+    The maneuver itself (target, duration, timer, lateral velocity) is on the agent, see TrafficAgent.start_lane_change.
     """
-    def __init__(self, target_lane_x: float, duration: float = 2000.0, is_emergency_return: bool = False): # Default 2 second lane change
-        self.target_x = target_lane_x
-        self.duration = duration
-        self.timer = 0.0
-        self.lateral_velocity = 0.0
-        self.is_emergency_return = is_emergency_return
+    __slots__ = ()
+    shared_name: str = "LANE_CHANGE_STRATEGY"
 
     def step(self, traffic_agent: "TrafficAgent"):
         dt = traffic_agent.model.dt
-        self.timer += dt
+        traffic_agent.lane_change_timer += dt
 
-        if self.timer >= self.duration:
+        if traffic_agent.lane_change_timer >= traffic_agent.lane_change_duration:
             # Finalize lane change
-            traffic_agent.vehicle.position[0] = self.target_x
+            traffic_agent.vehicle.position[0] = traffic_agent.lane_change_target_x
             traffic_agent.current_lane = traffic_agent.lane_intent
-            
-            from .LaneStayStrategy import LaneStayStrategy
-            self.lateral_velocity = 0.0
-            traffic_agent.lane_change_strategy = LaneStayStrategy()
+            traffic_agent.stay_in_lane()
             return
 
         longitudinal_velocity = traffic_agent.vehicle.velocity[1]
@@ -36,17 +33,17 @@ class LaneChangeStrategy(AbstractLaneChangeState):
 
         # If agent is moving too slowly, pause the lane change to prevent spinning.
         if abs(longitudinal_velocity) < min_speed_for_lane_change:
-            self.lateral_velocity = 0.0
+            traffic_agent.lateral_velocity = 0.0
             # We also pause the timer so the lane change can resume when speed picks up.
-            self.timer -= dt
+            traffic_agent.lane_change_timer -= dt
             return
 
         # Calculate the required lateral velocity to reach the target_x in the remaining time
-        remaining_time = self.duration - self.timer
+        remaining_time = traffic_agent.lane_change_duration - traffic_agent.lane_change_timer
         required_lateral_velocity = 0.0
         if remaining_time > 0:
             # This is velocity per millisecond, which is what we need
-            required_lateral_velocity = (self.target_x - traffic_agent.vehicle.position[0]) / remaining_time
+            required_lateral_velocity = (traffic_agent.lane_change_target_x - traffic_agent.vehicle.position[0]) / remaining_time
 
         # Limit the lateral velocity to achieve a max angle of 30 degrees.
         # tan(30 deg) = lateral_v / longitudinal_v  =>  lateral_v = longitudinal_v * tan(45)
@@ -56,11 +53,14 @@ class LaneChangeStrategy(AbstractLaneChangeState):
         # --- CONTINUOUS DYNAMIC SAFETY CHECK ---
         # Before committing to the lateral movement, check if it will cause a collision.
         # An emergency return maneuver cannot be interrupted.
-        if not self.is_emergency_return and traffic_agent.is_colliding_at_next_step(potential_lateral_v, self.target_x):
+        if not traffic_agent.is_emergency_return and traffic_agent.is_colliding_at_next_step(potential_lateral_v, traffic_agent.lane_change_target_x):
             # EMERGENCY ABORT: A collision is imminent. Change back to the original lane.
             # The new target is the initial X position, and this is now an emergency return.
-            traffic_agent.lane_change_strategy = LaneChangeStrategy(traffic_agent.initial_lane_x, self.duration, is_emergency_return=True)
+            traffic_agent.start_lane_change(traffic_agent.initial_lane_x, traffic_agent.lane_change_duration, is_emergency_return=True)
             traffic_agent.lane_intent = traffic_agent.current_lane
             return
         
-        self.lateral_velocity = potential_lateral_v
\ No newline at end of file
+        traffic_agent.lateral_velocity = potential_lateral_v
+
+
+LANE_CHANGE_STRATEGY = LaneChangeStrategy()
@@ -1,10 +1,11 @@
 
-import random
+import time
+
 import numpy as np
 from ..Highway import Highway
-from ..TrafficAgent import TrafficAgent
+from ..Utils import predict_positions
 from .AbstractLaneChangeState import AbstractLaneChangeState
-from .LaneChangeStrategy import LaneChangeStrategy
+from .LaneChangeStrategy import LaneChangeStrategy, LANE_CHANGE_DURATION
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -16,23 +17,25 @@ class LaneStayStrategy(AbstractLaneChangeState):
     for opportunities to change lanes based on the MOBIL model.
     """
     
-    def __init__(self): # Default 2 second lane change
+    __slots__ = ()
+    shared_name: str = "LANE_STAY_STRATEGY"
+    random_lane_change_percent: float = 1 / 100.0
 
-        self.lateral_velocity = 0.0
-        self.random_lane_change_percent = 1 / 100.0
-        
     def step(self, traffic_agent: "TrafficAgent"):
         # Only check for lane changes on the agent's decision tick
-        if traffic_agent.internal_timer < traffic_agent.decision_time:
+        if not traffic_agent.is_decision_due():
             return
+        traffic_agent.decision_due = False
 
         # COMMITMENT: If a lane change is already in progress, do not evaluate a new one.
         # This prevents wiggling back and forth.
         if isinstance(traffic_agent.lane_change_strategy, LaneChangeStrategy):
             return
+        if traffic_agent.model.profiler:
+            traffic_agent.model.profiler.count('lane_change_evaluations')
 
         # --- 1. Evaluate Incentive to Change Lanes ---
-        current_accel = traffic_agent.current_drive_strategy.calculate_accel(traffic_agent)
+        current_accel = traffic_agent.get_accel()
         
         best_gain = -np.inf
         best_target_lane = -1
@@ -75,7 +78,7 @@ class LaneStayStrategy(AbstractLaneChangeState):
             follower_loss = 0.0
             if new_follower is not None:
                 # Follower's current acceleration, calculated for their actual leader
-                accel_new_follower_current = new_follower.current_drive_strategy.calculate_accel(new_follower)
+                accel_new_follower_current = new_follower.get_accel()
                 follower_loss = accel_new_follower_current - accel_new_follower
 
             incentive = my_gain - (traffic_agent.politeness_factor * follower_loss)
@@ -90,8 +93,9 @@ class LaneStayStrategy(AbstractLaneChangeState):
             gains[target_lane_idx] = my_gain
 
         # --- 5. Execute Lane Change if beneficial ---
-        if(len(safe_lanes) > 0 and random.random() < self.random_lane_change_percent): # randomly let someone change lanes if its safe
-            random_index = random.randint(0, len(safe_lanes) - 1)
+        rng = traffic_agent.get_rng()
+        if(len(safe_lanes) > 0 and rng.random() < self.random_lane_change_percent): # randomly let someone change lanes if its safe
+            random_index = rng.randint(0, len(safe_lanes) - 1)
             best_target_lane = safe_lanes[random_index]
             self.begin_lane_change(traffic_agent, best_target_lane)
 
@@ -106,7 +110,7 @@ class LaneStayStrategy(AbstractLaneChangeState):
         target_lane_x = traffic_agent.model.highway.lanes[best_target_lane].start_position[0]
         traffic_agent.lane_intent = best_target_lane
         traffic_agent.initial_lane_x = traffic_agent.vehicle.position[0]
-        traffic_agent.lane_change_strategy = LaneChangeStrategy(target_lane_x)
+        traffic_agent.start_lane_change(target_lane_x)
 
     def get_follower_accel(self, ego_agent: "TrafficAgent", follower: "TrafficAgent") -> float:
         """
@@ -121,7 +125,7 @@ class LaneStayStrategy(AbstractLaneChangeState):
         follower.gap_to_lead = (ego_agent.pos[1] - ego_agent.vehicle.length / 2) - (follower.pos[1] + follower.vehicle.length / 2)
         
         # Use the follower's current strategy to calculate potential acceleration
-        potential_accel = follower.current_drive_strategy.calculate_accel(follower)
+        potential_accel = follower.get_accel()
         
         # Restore original leader
         follower.lead = original_leader
@@ -143,7 +147,7 @@ class LaneStayStrategy(AbstractLaneChangeState):
         else:
             ego_agent.gap_to_lead = None
 
-        potential_accel = ego_agent.current_drive_strategy.calculate_accel(ego_agent)
+        potential_accel = ego_agent.get_accel()
 
         # Restore original state
         ego_agent.lead = original_leader
@@ -158,9 +162,12 @@ class LaneStayStrategy(AbstractLaneChangeState):
         """
         if follower is None:
             return True
+        profiler = ego_agent.model.profiler
+        if profiler:
+            started = time.perf_counter()
 
         # --- Simulation Parameters ---
-        duration = 2000.0  # Must match the duration in LaneChangeStrategy
+        duration = LANE_CHANGE_DURATION
         dt = ego_agent.model.dt
         time_steps = int(duration / dt)
         target_lane_x = ego_agent.model.highway.lanes[ego_agent.lane_intent].start_position[0]
@@ -171,32 +178,32 @@ class LaneStayStrategy(AbstractLaneChangeState):
         ego_accel = self.get_potential_accel(ego_agent, new_leader)
         follower_accel = self.get_follower_accel(ego_agent, follower) # Follower's accel if we cut in
 
-        # --- Initial States for Simulation ---
-        ego_pos = ego_agent.vehicle.position.copy()
-        ego_vel = ego_agent.vehicle.velocity.copy()
-        follower_pos = follower.vehicle.position.copy()
-        follower_vel = follower.vehicle.velocity.copy()
-
+        # --- Ego's lateral path ---
+        # Each step closes the remaining distance over the remaining time. That's a recurrence on x alone,
+        # so run it on plain floats (same arithmetic as the numpy version), it's only time_steps long
+        ego_x = float(ego_agent.vehicle.position[0])
+        ego_xs = np.empty(time_steps)
         for i in range(time_steps):
-            # --- Predict Ego Agent's Movement ---
-            # Calculate lateral velocity for this step
             remaining_time = duration - (i * dt)
-            lateral_vel_x = (target_lane_x - ego_pos[0]) / remaining_time if remaining_time > 0 else 0
-            ego_vel[0] = lateral_vel_x
-            # Update longitudinal velocity and position
-            ego_vel[1] += ego_accel * dt
-            ego_pos += ego_vel * dt
-            
-            # --- Predict Follower's Movement ---
-            # Follower only moves longitudinally
-            follower_vel[1] += follower_accel * dt
-            follower_pos[1] += follower_vel[1] * dt
-
-            # --- Check for Bounding Box Overlap at this time step ---
-            dx = abs(ego_pos[0] - follower_pos[0])
-            dy = abs(ego_pos[1] - follower_pos[1])
-            if dx < (ego_agent.vehicle.width / 2 + follower.vehicle.width / 2) and \
-               dy < (ego_agent.vehicle.length / 2 + follower.vehicle.length / 2):
-                return False # Collision predicted
-
-        return True # Trajectory is safe
\ No newline at end of file
+            lateral_vel_x = (target_lane_x - ego_x) / remaining_time if remaining_time > 0 else 0
+            ego_x += lateral_vel_x * dt
+            ego_xs[i] = ego_x
+
+        # --- Longitudinal paths of both, all steps at once ---
+        # Follower only moves longitudinally
+        ego_ys = predict_positions(ego_agent.vehicle.position, ego_agent.vehicle.velocity, (0.0, ego_accel), dt, time_steps)[:, 1]
+        follower_ys = predict_positions(follower.vehicle.position, follower.vehicle.velocity, (0.0, follower_accel), dt, time_steps)[:, 1]
+
+        # --- Check for Bounding Box Overlap at every time step ---
+        dx = np.abs(ego_xs - follower.vehicle.position[0])
+        dy = np.abs(ego_ys - follower_ys)
+        is_colliding = np.any((dx < (ego_agent.vehicle.width / 2 + follower.vehicle.width / 2)) &
+                              (dy < (ego_agent.vehicle.length / 2 + follower.vehicle.length / 2)))
+        if profiler:
+            profiler.add_time('trajectory_prediction', time.perf_counter() - started)
+            profiler.count('trajectory_predictions')
+
+        return not is_colliding # False when a collision is predicted
+
+
+LANE_STAY_STRATEGY = LaneStayStrategy()
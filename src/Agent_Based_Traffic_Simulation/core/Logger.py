@@ -1,18 +1,65 @@
 import csv
 import os
+import time
+import queue
 import datetime
+import threading
+from typing import NamedTuple
 import numpy as np
 
 from .TrafficModel import TrafficModel
 
+class LogRecord(NamedTuple):
+    """Compact snapshot of one logging interval, handed from the model thread to the writer thread."""
+    timestamp: int
+    agent_ids: np.ndarray
+    current_lanes: np.ndarray
+    lane_intents: np.ndarray
+    positions: np.ndarray
+    velocities: np.ndarray
+    accelerations: np.ndarray
+    desired_speeds: np.ndarray
+    max_speeds: np.ndarray
+    drive_strategies: np.ndarray   # codes into Logger.names
+    vehicle_types: np.ndarray      # codes into Logger.names
+    collisions: np.ndarray         # (k, 2) agent id pairs
+
+
 class Logger:
-    def __init__(self, interval_ms: int, is_logging: bool = True, agent_log_name: str = None, collisions_log_name: str = None):
+    MODES = ("sync", "async")
+    BACKPRESSURE = ("block", "drop", "downsample")
+
+    def __init__(self, interval_ms: int, is_logging: bool = True, agent_log_name: str = None, collisions_log_name: str = None,
+                 flush_rows: int = 50_000, flush_interval_s: float = 5.0,
+                 mode: str = "sync", queue_size: int = 64, backpressure: str = "block", downsample_every: int = 2):
         """
         Parameters
         ----------
         interval_ms : int
             Desired logging interval in milliseconds.
+        flush_rows : int
+            Buffered rows (agents + collisions) that trigger a write to disk.
+        flush_interval_s : float
+            Wall clock seconds after which buffered rows are written even if flush_rows was not reached.
+
+        mode : str
+            "sync" writes from log_all. "async" only snapshots the agents into a LogRecord and hands it to a
+            writer thread through a bounded queue, so disk I/O never blocks the step loop.
+        queue_size : int
+            Maximum number of records waiting for the writer thread (async mode).
+        backpressure : str
+            What log_all does when the writer falls behind (async mode):
+            "block" waits for room in the queue, "drop" discards the record,
+            "downsample" only queues every `downsample_every`-th record once the queue is half full
+            and drops records when it is full.
+
+        The CSV files stay open for the whole run and rows are written in blocks.
+        Call close() (or use the Logger as a context manager) at the end of the run.
         """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown logging mode '{mode}', expected one of {self.MODES}")
+        if backpressure not in self.BACKPRESSURE:
+            raise ValueError(f"Unknown backpressure '{backpressure}', expected one of {self.BACKPRESSURE}")
 
         if not os.path.exists('logs'):
             os.makedirs('logs')
@@ -22,13 +69,82 @@ class Logger:
         self.last_log_time = 0
         self.is_logging = is_logging
         self.is_files_created = False
+        self.is_closed = False
 
-        
+        # Open files and the rows waiting to be written to them
+        self.flush_rows: int = flush_rows
+        self.flush_interval_s: float = flush_interval_s
+        self.last_flush_time: float = time.monotonic()
+        self.agent_file = None
+        self.collisions_file = None
+        self.agent_writer = None
+        self.collisions_writer = None
+        self.agent_rows: list[list] = []
+        self.collision_rows: list[list] = []
+
+        # Asynchronous mode
+        self.mode: str = mode
+        self.backpressure: str = backpressure
+        self.downsample_every: int = max(1, downsample_every)
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.writer_thread: threading.Thread = None
+        self.names: list[str] = []               # strategy / vehicle type names referenced by LogRecord codes
+        self.name_codes: dict[str, int] = {}
+        self.records_offered: int = 0
+        self.records_written: int = 0
+        self.dropped_records: int = 0
+        self.downsampled_records: int = 0
+        self.max_queue_depth: int = 0
+        self.writer_error: Exception = None      # what went wrong in the writer thread, re-raised on the model thread
+
+    def __getstate__(self) -> dict:
+        """
+        Picklable state for checkpoints: everything but the open files and the writer thread.
+        Call drain() first so the recorded file sizes cover every row logged so far.
+        """
+        state = self.__dict__.copy()
+        for key in ('agent_file', 'collisions_file', 'agent_writer', 'collisions_writer', 'queue', 'writer_thread', 'writer_error'):
+            state.pop(key)
+        state['queue_size'] = self.queue.maxsize
+        state['agent_rows'] = list(self.agent_rows)
+        state['collision_rows'] = list(self.collision_rows)
+        state['agent_file_size'] = self.agent_file.tell() if self.agent_file else None
+        state['collisions_file_size'] = self.collisions_file.tell() if self.collisions_file else None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        agent_file_size = state.pop('agent_file_size')
+        collisions_file_size = state.pop('collisions_file_size')
+        queue_size = state.pop('queue_size')
+        self.is_closed = False # checkpoints from before close() raised
+        self.__dict__.update(state)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writer_thread = None
+        self.writer_error = None
+        self.last_flush_time = time.monotonic()
+        self.agent_file = self.collisions_file = None
+        self.agent_writer = self.collisions_writer = None
+        if agent_file_size is not None:
+            # Drop anything written after the checkpoint, then keep appending
+            os.truncate(self.agent_file_name, agent_file_size)
+            os.truncate(self.collsions_file_name, collisions_file_size)
+            self.agent_file = open(self.agent_file_name, 'a', newline='')
+            self.agent_writer = csv.writer(self.agent_file)
+            self.collisions_file = open(self.collsions_file_name, 'a', newline='')
+            self.collisions_writer = csv.writer(self.collisions_file)
+
+    def __enter__(self) -> "Logger":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
  
     def log_all(self, model):
 
+        self.raise_if_closed()
         if(not self.is_logging):
             return
+        self.raise_writer_error()
         
         if(not self.is_files_created):
             self.create_files()
@@ -37,10 +153,203 @@ class Logger:
         current_time = model.total_time
         if current_time - self.last_log_time < self.interval_ms:
             return  # Not time to log yet
+        # Booked to the step the model just finished
+        profiler = model.profiler
+        if profiler:
+            started = time.perf_counter()
+
+        if self.mode == "async":
+            self.enqueue(self.snapshot(model, current_time))
+            self.last_log_time = current_time
+            if profiler:
+                profiler.add_time('logging', time.perf_counter() - started)
+            return
+
         self.log_collisions(model, current_time)
         self.log_agents(model, current_time)
         self.last_log_time = current_time
 
+        if (len(self.agent_rows) + len(self.collision_rows) >= self.flush_rows
+                or time.monotonic() - self.last_flush_time >= self.flush_interval_s):
+            self.flush()
+        if profiler:
+            profiler.add_time('logging', time.perf_counter() - started)
+
+    def flush(self):
+        """Write every buffered row to disk."""
+        if self.agent_writer:
+            self.agent_writer.writerows(self.agent_rows)
+            self.agent_file.flush()
+        if self.collisions_writer:
+            self.collisions_writer.writerows(self.collision_rows)
+            self.collisions_file.flush()
+        self.agent_rows.clear()
+        self.collision_rows.clear()
+        self.last_flush_time = time.monotonic()
+
+    def drain(self):
+        """Wait until the writer thread handled every queued record, then flush everything to disk."""
+        if self.writer_thread:
+            self.queue.join()
+        self.raise_writer_error()
+        self.flush()
+
+    def close(self):
+        """
+        Flush the remaining rows and close the log files. Safe to call more than once, logging afterwards raises.
+        The files are closed even when the writer thread failed, its error is raised afterwards.
+        """
+        self.is_closed = True
+        if self.writer_thread:
+            # Let the writer drain the queue, then stop it
+            self.queue.put(None)
+            self.writer_thread.join()
+            self.writer_thread = None
+        try:
+            self.flush()
+        finally:
+            for f in (self.agent_file, self.collisions_file):
+                if f:
+                    f.close()
+            self.agent_file = self.collisions_file = None
+            self.agent_writer = self.collisions_writer = None
+        self.raise_writer_error()
+
+    # ---------- asynchronous mode ----------
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def stats(self) -> dict:
+        """Counters of the asynchronous writer."""
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'records_offered': self.records_offered,
+            'records_written': self.records_written,
+            'dropped_records': self.dropped_records,
+            'downsampled_records': self.downsampled_records,
+        }
+
+    def name_code(self, name: str) -> int:
+        code = self.name_codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.names.append(name)
+            self.name_codes[name] = code
+        return code
+
+    def snapshot(self, model: TrafficModel, current_time: int) -> LogRecord:
+        """Copy what log_agents/log_collisions need into arrays, leaving the formatting to the writer thread."""
+        agents = list(model.agents)
+        engine = model.vectorized_engine
+        if engine:
+            # Rows in creation order, like model.agents
+            order = np.argsort(engine.unique_id[:engine.count], kind="stable")
+            agents = [engine.agents[slot] for slot in order.tolist()]
+            positions = engine.position[order]
+            velocities = engine.velocity[order]
+            accelerations = engine.acceleration[order]
+        else:
+            positions = np.array([agent.vehicle.position for agent in agents], dtype=float).reshape(-1, 2)
+            velocities = np.array([agent.vehicle.velocity for agent in agents], dtype=float).reshape(-1, 2)
+            accelerations = np.array([agent.vehicle.acceleration for agent in agents], dtype=float).reshape(-1, 2)
+
+        name_code = self.name_code
+        return LogRecord(
+            timestamp=current_time,
+            agent_ids=np.array([agent.unique_id if getattr(agent, 'unique_id', None) is not None else id(agent) for agent in agents], dtype=np.int64),
+            current_lanes=np.array([agent.current_lane for agent in agents], dtype=np.int16),
+            lane_intents=np.array([agent.lane_intent for agent in agents], dtype=np.int16),
+            positions=positions,
+            velocities=velocities,
+            accelerations=accelerations,
+            desired_speeds=np.array([agent.desired_speed for agent in agents], dtype=float),
+            max_speeds=np.array([agent.max_speed for agent in agents], dtype=float),
+            drive_strategies=np.array([name_code(type(agent.current_drive_strategy).__name__) for agent in agents], dtype=np.uint8),
+            vehicle_types=np.array([name_code(type(agent.vehicle).__name__) for agent in agents], dtype=np.uint8),
+            collisions=np.array([(a.unique_id, b.unique_id) for a, b in model.get_collisions()], dtype=np.int64).reshape(-1, 2),
+        )
+
+    def enqueue(self, record: LogRecord) -> None:
+        # A writer started now would never be stopped
+        self.raise_if_closed()
+        if self.writer_thread is None:
+            self.writer_thread = threading.Thread(target=self.write_records, name="LoggerWriter", daemon=True)
+            self.writer_thread.start()
+
+        self.records_offered += 1
+        if self.backpressure == "block":
+            self.queue.put(record)
+        elif self.backpressure == "downsample" and self.queue.qsize() * 2 >= self.queue.maxsize \
+                and self.records_offered % self.downsample_every != 0:
+            self.downsampled_records += 1
+        else:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped_records += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def write_records(self) -> None:
+        """
+        Writer thread: turn LogRecords into CSV rows until close() sends the None sentinel.
+        An exception is kept in writer_error for the model thread. Until the model thread raised it, records are only
+        taken off the queue, so log_all, drain and close never wait on a writer that stopped writing.
+        """
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    return
+                if self.writer_error is None:
+                    self.append_record_rows(record)
+                    self.records_written += 1
+                    if (len(self.agent_rows) + len(self.collision_rows) >= self.flush_rows
+                            or time.monotonic() - self.last_flush_time >= self.flush_interval_s):
+                        self.flush()
+            except Exception as error:
+                self.writer_error = error
+            finally:
+                self.queue.task_done()
+
+    def raise_if_closed(self) -> None:
+        if self.is_closed:
+            raise ValueError("Logger is closed")
+
+    def raise_writer_error(self) -> None:
+        """
+        Re-raise what went wrong in the writer thread since the last call, on the calling (model) thread.
+        Records queued between the failure and this call were not written.
+        """
+        error = self.writer_error
+        if error is not None:
+            self.writer_error = None
+            raise error
+
+    def append_record_rows(self, record: LogRecord) -> None:
+        """Same rows as log_collisions + log_agents produce for the snapshotted state."""
+        current_time = record.timestamp
+        for agent_a, agent_b in record.collisions.tolist():
+            self.collision_rows.append([current_time, agent_a, agent_b])
+
+        names = self.names
+        rows = self.agent_rows
+        for i, (agent_id, current_lane, lane_intent, (x, y), desired_speed, max_speed, strategy, vehicle_type) in enumerate(zip(
+                record.agent_ids.tolist(), record.current_lanes.tolist(), record.lane_intents.tolist(),
+                record.positions.tolist(), record.desired_speeds.tolist(), record.max_speeds.tolist(),
+                record.drive_strategies.tolist(), record.vehicle_types.tolist())):
+            velocity = record.velocities[i]
+            vel = float(np.linalg.norm(velocity))
+            acc = float(np.dot(record.accelerations[i], velocity / (np.linalg.norm(velocity) + 1e-9)))
+            rows.append([
+                current_time, agent_id, current_lane, lane_intent,
+                x, y, vel, acc,
+                desired_speed, max_speed,
+                names[strategy], names[vehicle_type]
+            ])
+
+    # ---------- synchronous mode ----------
     def log_collisions(self, model:TrafficModel, current_time):
         """
         Log all collisions that happen ie overlap between agents
@@ -50,21 +359,9 @@ class Logger:
         model : TrafficModel
             The running model instance.
         """
-        with open(self.collsions_file_name, 'a', newline='') as f:
-            writer = csv.writer(f)
-            collisions:set[tuple[int,int]] = set()
-            # Get the neighbors for each agent within their length (length is always bigger than width)
-            # Then check for overlap
-            for agent in model.agents:
-                neighbors = model.highway.get_neighbors(agent.pos, agent.vehicle.length * 3, include_center=False)
-                if (len(neighbors) == 0):
-                    continue
-                for neighbor in neighbors:
-                    if(model.is_collision(agent, neighbor)):
-                        collisions.add(tuple(sorted((agent.unique_id, neighbor.unique_id))))
-
-            for collision in collisions:
-                writer.writerow([current_time,collision[0], collision[1]])
+        # The model detects the collisions once per step, every caller shares the result
+        for agent_a, agent_b in model.get_collisions():
+            self.collision_rows.append([current_time, agent_a.unique_id, agent_b.unique_id])
                     
 
     def log_agents(self, model: TrafficModel, current_time):
@@ -76,42 +373,41 @@ class Logger:
         model : TrafficModel
             The running model instance.  
         """
-        with open(self.agent_file_name, 'a', newline='') as f:
-            writer = csv.writer(f)
-            for agent in model.agents:
-                # Use the Mesa-provided unique_id when available; otherwise fall back
-                # to Python’s built‑in id()
-                agent_id = getattr(agent, 'unique_id', None)
-                if agent_id is None:
-                    agent_id = id(agent)
-                pos = agent.vehicle.position
-                vel = float(np.linalg.norm(agent.vehicle.velocity))
-                acc = float(np.dot(agent.vehicle.acceleration, agent.vehicle.velocity / (np.linalg.norm(agent.vehicle.velocity) + 1e-9)))
-                writer.writerow([
-                    current_time,              # timestamp in ms
-                    agent_id,
-                    agent.current_lane,
-                    agent.lane_intent,
-                    float(pos[0]), float(pos[1]),
-                    vel, acc,
-                    agent.desired_speed,
-                    agent.max_speed,
-                    type(agent.current_drive_strategy).__name__,
-                    type(agent.vehicle).__name__
-                ])
+        rows = self.agent_rows
+        for agent in model.agents:
+            # Use the Mesa-provided unique_id when available; otherwise fall back
+            # to Python’s built‑in id()
+            agent_id = getattr(agent, 'unique_id', None)
+            if agent_id is None:
+                agent_id = id(agent)
+            pos = agent.vehicle.position
+            vel = float(np.linalg.norm(agent.vehicle.velocity))
+            acc = float(np.dot(agent.vehicle.acceleration, agent.vehicle.velocity / (np.linalg.norm(agent.vehicle.velocity) + 1e-9)))
+            rows.append([
+                current_time,              # timestamp in ms
+                agent_id,
+                agent.current_lane,
+                agent.lane_intent,
+                float(pos[0]), float(pos[1]),
+                vel, acc,
+                agent.desired_speed,
+                agent.max_speed,
+                type(agent.current_drive_strategy).__name__,
+                type(agent.vehicle).__name__
+            ])
 
     def create_files(self):
-        # Create raw agent file and its columns
-        with open(self.agent_file_name, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'timestamp_ms', 'agent_id', 'current_lane', 'lane_intent',
-                'x_mm', 'y_mm', 'speed', 'acceleration',
-                'desired_speed', 'max_speed', 'drive_strategy', 'vehicle_type'
-            ])
+        # Create raw agent file and its columns, the file stays open until close()
+        self.agent_file = open(self.agent_file_name, 'w', newline='')
+        self.agent_writer = csv.writer(self.agent_file)
+        self.agent_writer.writerow([
+            'timestamp_ms', 'agent_id', 'current_lane', 'lane_intent',
+            'x_mm', 'y_mm', 'speed', 'acceleration',
+            'desired_speed', 'max_speed', 'drive_strategy', 'vehicle_type'
+        ])
         # Create raw collisions file and its columns... do not need many colums because we can cross reference with raw agent file
-        with open(self.collsions_file_name, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'timestamp_ms', 'agent1_id', 'agent2_id'
-            ])
+        self.collisions_file = open(self.collsions_file_name, 'w', newline='')
+        self.collisions_writer = csv.writer(self.collisions_file)
+        self.collisions_writer.writerow([
+            'timestamp_ms', 'agent1_id', 'agent2_id'
+        ])
@@ -6,6 +6,13 @@ if TYPE_CHECKING:
 
 
 class AbstractPersonality(ABC):
+    """
+    Driver parameters, drawn once and read only from then on.
+    Slots and no __dict__, and assigning to a field after the subclass called freeze() raises AttributeError.
+    """
+    __slots__ = ('max_speed', 'desired_speed', 'sensing_distance', 'max_acceleration', 'cruise_gain', 'braking_comfortable',
+                 'desired_time_headway', 'b_max', 'smallest_follow_distance_factor', 'desired_gap_factor',
+                 'politeness_factor', 'lane_change_threshold', 'decision_time', 'is_frozen')
 
     # dynamics and sensing (mm, ms)
     max_speed: float
@@ -33,4 +40,18 @@ class AbstractPersonality(ABC):
     lane_change_threshold: float
     decision_time: int
     def __init__(self  ):
-        pass
\ No newline at end of file
+        object.__setattr__(self, 'is_frozen', False)
+
+    def freeze(self) -> None:
+        object.__setattr__(self, 'is_frozen', True)
+
+    def __setattr__(self, name: str, value) -> None:
+        if self.is_frozen:
+            raise AttributeError(f"{type(self).__name__} is read only, can't set '{name}'")
+        object.__setattr__(self, name, value)
+
+    def __setstate__(self, state: tuple) -> None:
+        # Default slot pickling restores with setattr, which the frozen flag would block
+        _, slots = state
+        for name, value in slots.items():
+            object.__setattr__(self, name, value)
@@ -3,6 +3,8 @@ from .AbstractPersonality import AbstractPersonality
 
 
 class AggressivePersonality(AbstractPersonality):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -23,4 +25,5 @@ class AggressivePersonality(AbstractPersonality):
         # Lane change parameters
         self.politeness_factor = random.uniform(0.0, 0.3) # 0 is egoistic, >1 is altruistic
         self.lane_change_threshold = random.uniform(0.00005, 0.00008) # Min acceleration gain to justify a change
-        self.decision_time = random.randint(60, 120)  # ms
\ No newline at end of file
+        self.decision_time = random.randint(60, 120)  # ms
+        self.freeze()
@@ -3,6 +3,8 @@ from .AbstractPersonality import AbstractPersonality
 
 
 class DefensivePersonality(AbstractPersonality):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -27,4 +29,5 @@ class DefensivePersonality(AbstractPersonality):
         # Lane change parameters
         self.politeness_factor = random.uniform(0.6, 0.9) # 0 is egoistic, >1 is altruistic
         self.lane_change_threshold = random.uniform(0.0001, 0.0002) # Min acceleration gain to justify a change
-        self.decision_time = random.randint(100, 150)  # ms
\ No newline at end of file
+        self.decision_time = random.randint(100, 150)  # ms
+        self.freeze()
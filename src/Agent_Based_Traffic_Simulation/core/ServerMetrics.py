@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+import time
+
+from .StepProfiler import Histogram, TIME_BOUNDS
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .SessionRegistry import SessionRegistry
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsText:
+    """Builds a page in the Prometheus text exposition format, one HELP/TYPE header per metric family."""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+
+    def family(self, name: str, metric_type: str, description: str) -> None:
+        self.lines.append(f"# HELP {name} {description}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name: str, value: float, labels: dict = None) -> None:
+        self.lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+    def histogram(self, name: str, histogram: Histogram, labels: dict = None) -> None:
+        labels = labels or {}
+        for bound, count in histogram.cumulative_counts():
+            self.sample(f"{name}_bucket", count, {**labels, 'le': format_value(bound)})
+        self.sample(f"{name}_sum", histogram.total, labels)
+        self.sample(f"{name}_count", histogram.count, labels)
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def process_memory() -> dict:
+    """Resident and peak resident memory of this process in bytes, whatever the platform can tell."""
+    memory = {}
+    try:
+        with open("/proc/self/statm") as f:
+            memory['resident'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Linux reports KB, macOS bytes
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if os.uname().sysname == 'Darwin' else peak * 1024
+        # The kernel only updates the peak now and then, it can trail the current value
+        memory['peak_resident'] = max(peak, memory.get('resident', 0))
+    return memory
+
+
+def session_label(session_id: str) -> str:
+    # Anyone who knows a session id can drive that session, so the page only shows a digest of it
+    return hashlib.sha256(session_id.encode()).hexdigest()[:12]
+
+
+class ServerMetrics:
+    """
+    What the web server has been doing, for /api/metrics: requests per endpoint and status, how long requests took,
+    and /api/step split into model step, logging and frame encoding. Everything else (sessions, agents, spawns,
+    collisions) is read from the sessions when the page is rendered.
+    Totals only ever grow, Prometheus turns them into rates.
+    """
+
+    STEP_PHASES = ("model_step", "logging", "encode")
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.start_time: float = time.time()
+        self.requests: dict[tuple[str, int], int] = {}
+        self.request_latency: dict[str, Histogram] = {}
+        self.step_latency: dict[str, Histogram] = {phase: Histogram(TIME_BOUNDS) for phase in self.STEP_PHASES}
+
+    def observe_request(self, endpoint: str, status: int, seconds: float) -> None:
+        with self.lock:
+            self.requests[(endpoint, status)] = self.requests.get((endpoint, status), 0) + 1
+            histogram = self.request_latency.get(endpoint)
+            if histogram is None:
+                histogram = self.request_latency[endpoint] = Histogram(TIME_BOUNDS)
+            histogram.observe(seconds)
+
+    def observe_step(self, model_step_s: float, logging_s: float, encode_s: float) -> None:
+        with self.lock:
+            self.step_latency['model_step'].observe(model_step_s)
+            self.step_latency['logging'].observe(logging_s)
+            self.step_latency['encode'].observe(encode_s)
+
+    def render(self, registry: "SessionRegistry") -> str:
+        text = MetricsText()
+
+        text.family("traffic_process_start_time_seconds", "gauge", "Unix time the server started")
+        text.sample("traffic_process_start_time_seconds", self.start_time)
+        memory = process_memory()
+        if 'resident' in memory:
+            text.family("traffic_process_resident_memory_bytes", "gauge", "Resident memory of the server process")
+            text.sample("traffic_process_resident_memory_bytes", memory['resident'])
+        if 'peak_resident' in memory:
+            text.family("traffic_process_peak_resident_memory_bytes", "gauge", "Highest resident memory of the server process so far")
+            text.sample("traffic_process_peak_resident_memory_bytes", memory['peak_resident'])
+
+        with self.lock:
+            text.family("traffic_http_requests_total", "counter", "Requests handled, by endpoint and status code")
+            for (endpoint, status), count in sorted(self.requests.items()):
+                text.sample("traffic_http_requests_total", count, {'endpoint': endpoint, 'status': status})
+            text.family("traffic_http_request_duration_seconds", "histogram", "Time to handle a request, by endpoint")
+            for endpoint, histogram in sorted(self.request_latency.items()):
+                text.histogram("traffic_http_request_duration_seconds", histogram, {'endpoint': endpoint})
+            text.family("traffic_api_step_phase_seconds", "histogram",
+                        "Time /api/step spent stepping the model, logging and building the frame (JSON or binary)")
+            for phase, histogram in self.step_latency.items():
+                text.histogram("traffic_api_step_phase_seconds", histogram, {'phase': phase})
+
+        self.render_sessions(text, registry)
+        return text.render()
+
+    def render_sessions(self, text: MetricsText, registry: "SessionRegistry") -> None:
+        registry_stats = registry.stats()
+        text.family("traffic_sessions", "gauge", "Simulations held by the server")
+        text.sample("traffic_sessions", registry_stats['sessions'])
+        text.family("traffic_sessions_max", "gauge", "Most simulations the server will hold")
+        text.sample("traffic_sessions_max", registry_stats['max_sessions'])
+        text.family("traffic_sessions_estimated_memory_bytes", "gauge", "The registry's estimate of the memory its sessions use")
+        text.sample("traffic_sessions_estimated_memory_bytes", registry_stats['memory_bytes'])
+        text.family("traffic_sessions_evicted_total", "counter", "Sessions evicted for being idle or to make room")
+        text.sample("traffic_sessions_evicted_total", registry_stats['evicted_sessions'])
+
+        # Per session, the session count is capped by the registry so the label stays small.
+        # Counters and lengths are read without the session lock, so a scrape never waits behind a step or an
+        # /api/advance, and the collisions are the ones the model last detected instead of running the detection
+        rows = []
+        for session in list(registry.sessions.values()):
+            model = session.model
+            total_time = model.total_time
+            rows.append(({'session': session_label(session.session_id)}, {
+                'agents': len(model.agents),
+                'steps': total_time // model.dt, # model.steps counts Mesa's two increments per step
+                'sim_time': total_time / 1000,
+                'spawned': model.spawned_agents,
+                'removed': model.removed_agents,
+                'collisions': len(model.collisions),
+                'is_running': int(session.runner.is_running),
+                'subscribers': len(session.runner.subscribers),
+            }))
+        families = [
+            ('traffic_session_agents', 'gauge', "Agents on the highway", 'agents'),
+            ('traffic_session_steps_total', 'counter', "Model steps taken", 'steps'),
+            ('traffic_session_sim_time_seconds', 'gauge', "Simulated time", 'sim_time'),
+            ('traffic_session_spawned_agents_total', 'counter', "Agents that entered the highway", 'spawned'),
+            ('traffic_session_removed_agents_total', 'counter', "Agents that left the highway", 'removed'),
+            ('traffic_session_collisions', 'gauge', "Colliding vehicle pairs the model last detected", 'collisions'),
+            ('traffic_session_running', 'gauge', "1 while the server loop steps the session", 'is_running'),
+            ('traffic_session_stream_subscribers', 'gauge', "Clients on /api/stream", 'subscribers'),
+        ]
+        for name, metric_type, description, key in families:
+            text.family(name, metric_type, description)
+            for labels, values in rows:
+                text.sample(name, values[key], labels)
@@ -0,0 +1,214 @@
+import threading
+import time
+import uuid
+
+from .SimulationRunner import SimulationRunner
+from .FrameEncoder import DeltaEncoder
+
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from .TrafficModel import TrafficModel
+    from .Logger import Logger
+
+
+# Rough memory use of a session, measured with tracemalloc (agent + vehicle + personality + caches)
+AGENT_MEMORY_BYTES = 10_000
+SESSION_MEMORY_BYTES = 64_000
+
+
+class SessionLimitError(RuntimeError):
+    """No room for another session, even after evicting the idle ones."""
+
+
+class Session:
+    """One independent simulation: its model, logger and the runner that owns the model's lock."""
+
+    def __init__(self, session_id: str, model: "TrafficModel", logger: "Logger", runner: SimulationRunner,
+                 simulation_type: str = 'traffic') -> None:
+        self.session_id: str = session_id
+        self.model: "TrafficModel" = model
+        self.logger: "Logger" = logger
+        self.runner: SimulationRunner = runner
+        self.simulation_type: str = simulation_type
+        self.delta_encoder: DeltaEncoder = DeltaEncoder() # remembers what this session's client has
+        self.created_time: float = time.monotonic()
+        self.last_access_time: float = self.created_time
+        self.users: int = 0 # requests between SessionRegistry.acquire and release, guarded by the registry lock
+
+    @property
+    def lock(self) -> threading.Lock:
+        return self.runner.lock
+
+    def touch(self) -> None:
+        self.last_access_time = time.monotonic()
+
+    def idle_time(self, now: float = None) -> float:
+        # Someone watching the stream or the server loop stepping the model counts as activity
+        if self.runner.subscribers or self.runner.is_running:
+            return 0.0
+        return (now or time.monotonic()) - self.last_access_time
+
+    def memory_bytes(self) -> int:
+        return SESSION_MEMORY_BYTES + AGENT_MEMORY_BYTES * len(self.model.agents)
+
+    def is_busy(self) -> bool:
+        # A request is using the session, read under the registry lock
+        return self.users > 0
+
+    def close(self) -> None:
+        # The runner's loop takes the lock every step, so it is stopped before we take it
+        self.runner.close()
+        with self.lock:
+            if self.logger:
+                self.logger.close()
+
+
+class SessionRegistry:
+    """
+    Session id -> Session, for serving many independent simulations from one process.
+
+    The registry lock only guards the dictionary. Stepping, encoding and streaming a session only take that
+    session's own lock, so requests for different sessions run side by side.
+    Sessions idle for longer than `idle_timeout_s` are evicted by a background sweep and whenever a new
+    session needs room, skipping any session a request acquired and has not released yet. create() raises SessionLimitError when `max_sessions` or `max_memory_bytes`
+    would still be exceeded.
+
+    Sessions live in this process's memory, so with several server worker processes the requests of one
+    session have to be routed to the same worker (sticky sessions).
+    """
+
+    def __init__(self, max_sessions: int = 16, max_memory_bytes: int = 512 * 1024 * 1024, idle_timeout_s: float = 15 * 60,
+                 sweep_interval_s: float = 60.0) -> None:
+        self.max_sessions: int = max_sessions
+        self.max_memory_bytes: int = max_memory_bytes
+        self.idle_timeout_s: float = idle_timeout_s
+        self.sweep_interval_s: float = sweep_interval_s
+
+        self.sessions: dict[str, Session] = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.create_lock: threading.Lock = threading.Lock()
+        self.evicted_sessions: int = 0
+        self.sweeper_thread: threading.Thread = None
+        self.stop_event: threading.Event = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> Session:
+        """The session, or None if there is none (never created, reset or evicted)."""
+        if not session_id:
+            return None
+        session = self.sessions.get(session_id)
+        if session:
+            session.touch()
+        return session
+
+    def acquire(self, session_id: str) -> Session:
+        """Like get(), but the session is not evicted until release(session). Returns None if there is none."""
+        if not session_id:
+            return None
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session:
+                session.users += 1
+                session.touch()
+        return session
+
+    def release(self, session: Session) -> None:
+        with self.lock:
+            session.users -= 1
+            session.touch()
+
+    def create(self, session_id: str, build: Callable[[], tuple["TrafficModel", "Logger", SimulationRunner]]) -> Session:
+        """
+        Replace `session_id`'s simulation with the one `build()` returns.
+        Creations are serialized so two of them can't both take the last free slot, but `build` runs outside
+        the registry lock and does not hold up requests for existing sessions.
+        """
+        self.start_sweeper()
+        with self.create_lock:
+            self.remove(session_id)
+            self.make_room()
+
+            model, logger, runner = build()
+            session = Session(session_id, model, logger, runner)
+            with self.lock:
+                self.sessions[session_id] = session
+        return session
+
+    def remove(self, session_id: str) -> bool:
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def memory_bytes(self) -> int:
+        return sum(session.memory_bytes() for session in list(self.sessions.values()))
+
+    def make_room(self) -> None:
+        """Evict idle sessions, then the least recently used ones, until a new session fits."""
+        self.evict_idle()
+        with self.lock:
+            # Oldest access first, sessions someone is streaming or using right now are never evicted for room
+            candidates = sorted((session for session in self.sessions.values()
+                                 if not session.runner.subscribers and not session.is_busy()),
+                                key=lambda session: session.last_access_time)
+        while len(self.sessions) >= self.max_sessions or self.memory_bytes() + SESSION_MEMORY_BYTES > self.max_memory_bytes:
+            if not candidates:
+                raise SessionLimitError(f"{len(self.sessions)} sessions using ~{self.memory_bytes() // 2**20} MB, "
+                                        f"limits are {self.max_sessions} sessions / {self.max_memory_bytes // 2**20} MB")
+            self.evict([candidates.pop(0)], lambda session: not session.runner.subscribers)
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        with self.lock:
+            idle = [session for session in self.sessions.values() if session.idle_time(now) > self.idle_timeout_s]
+        return self.evict(idle, lambda session: session.idle_time(now) > self.idle_timeout_s)
+
+    def evict(self, sessions: list[Session], is_evictable: Callable[[Session], bool]) -> int:
+        """
+        Remove the sessions that are still registered, not acquired and is_evictable, checked under the registry lock
+        so no request can acquire one of them in between.
+        """
+        with self.lock:
+            evicted = [session for session in sessions
+                       if self.sessions.get(session.session_id) is session and not session.is_busy() and is_evictable(session)]
+            for session in evicted:
+                del self.sessions[session.session_id]
+        for session in evicted:
+            session.close()
+        self.evicted_sessions += len(evicted)
+        return len(evicted)
+
+    def start_sweeper(self) -> None:
+        if self.sweeper_thread is not None:
+            return
+        self.sweeper_thread = threading.Thread(target=self.sweep, name="SessionSweeper", daemon=True)
+        self.sweeper_thread.start()
+
+    def sweep(self) -> None:
+        while not self.stop_event.wait(self.sweep_interval_s):
+            self.evict_idle()
+
+    def close(self) -> None:
+        self.stop_event.set()
+        for session_id in list(self.sessions):
+            self.remove(session_id)
+
+    def stats(self) -> dict:
+        return {
+            'sessions': len(self.sessions),
+            'max_sessions': self.max_sessions,
+            'memory_bytes': self.memory_bytes(),
+            'max_memory_bytes': self.max_memory_bytes,
+            'evicted_sessions': self.evicted_sessions,
+        }
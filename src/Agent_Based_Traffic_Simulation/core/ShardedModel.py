@@ -0,0 +1,399 @@
+import io
+import itertools
+import multiprocessing
+import pickle
+import random
+import time
+import traceback
+
+import numpy as np
+
+from .TrafficAgent import TrafficAgent
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from .TrafficModel import TrafficModel
+
+
+class AgentRef:
+    """Stand-in for an agent another agent pointed at (its lead) while it was being sent between shards."""
+
+    __slots__ = ('unique_id',)
+
+    def __init__(self, unique_id: int) -> None:
+        self.unique_id: int = unique_id
+
+
+class AgentPickler(pickle.Pickler):
+    """
+    Pickles agents without their model. The receiving shard plugs in its own model,
+    agents that are not part of the message are replaced by AgentRefs.
+    """
+
+    def __init__(self, file, model: "TrafficModel", agents: set[int]) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.model: "TrafficModel" = model
+        self.agents: set[int] = agents
+
+    def persistent_id(self, obj):
+        if obj is self.model:
+            return 'model'
+        if isinstance(obj, TrafficAgent) and id(obj) not in self.agents:
+            return obj.unique_id
+        return None
+
+
+class AgentUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, model: "TrafficModel") -> None:
+        super().__init__(file)
+        self.model: "TrafficModel" = model
+
+    def persistent_load(self, pid):
+        if pid == 'model':
+            return self.model
+        return AgentRef(pid)
+
+
+def pack_agents(model: "TrafficModel", groups: list[list[TrafficAgent]]) -> bytes:
+    buffer = io.BytesIO()
+    AgentPickler(buffer, model, {id(agent) for group in groups for agent in group}).dump(groups)
+    return buffer.getvalue()
+
+
+def unpack_agents(model: "TrafficModel", data: bytes) -> list[list[TrafficAgent]]:
+    return AgentUnpickler(io.BytesIO(data), model).load()
+
+
+class Shard:
+    """
+    One stretch [y_start, y_end) of the highway, stepped by its own worker process.
+
+    The shard holds a full TrafficModel over the whole highway, but only with the agents in its stretch.
+    Before every tick it trades agents with its neighbors:
+      - agents that drove past y_end are handed to the next shard (traffic only moves forward)
+      - agents within halo_length of a boundary are sent to the neighbor across it as ghosts,
+        read only copies the neighbor's agents see in their lookups but that the neighbor never steps
+    The trade happens after every tick (and once before the first), so the collisions counted right after it see
+    the ghosts where they ended the tick, like the shard's own agents.
+    Only the first shard spawns agents.
+    """
+
+    def __init__(self, model: "TrafficModel", y_start: float, y_end: float, halo_length: float,
+                 left: "Connection" = None, right: "Connection" = None) -> None:
+        self.model: "TrafficModel" = model
+        self.y_start: float = y_start
+        self.y_end: float = y_end
+        self.halo_length: float = halo_length
+        self.left: "Connection" = left
+        self.right: "Connection" = right
+
+        self.migrated_in: int = 0
+        self.migrated_out: int = 0
+        self.ghost_count: int = 0 # ghosts summed over the exchanges
+        self.exchange_count: int = 0
+        self.collision_pairs: int = 0 # colliding pairs summed over the steps
+        self.is_exchanged: bool = False
+        self.step_time_s: float = 0.0
+        self.exchange_time_s: float = 0.0
+        self.cpu_time_s: float = 0.0 # busy time of this process, the wall times also count waiting on the others
+
+        # Everyone starts from the same full model, drop what belongs to the other shards
+        for agent in [agent for agent in model.agents if not y_start <= agent.pos[1] < y_end]:
+            self.release(agent)
+        # Only the first shard spawns, and it carries the totals counted before the split
+        if left is not None:
+            model.is_generate_agents = False
+            model.spawned_agents = model.removed_agents = 0
+
+    def advance(self, steps: int) -> None:
+        cpu_started = time.process_time()
+        if not self.is_exchanged:
+            started = time.perf_counter()
+            self.exchange()
+            self.is_exchanged = True
+            self.exchange_time_s += time.perf_counter() - started
+        for _ in range(steps):
+            started = time.perf_counter()
+            self.model.step()
+            stepped = time.perf_counter()
+            self.exchange()
+            self.step_time_s += stepped - started
+            self.exchange_time_s += time.perf_counter() - stepped
+            self.collision_pairs += len(self.model.get_collisions())
+        self.cpu_time_s += time.process_time() - cpu_started
+
+    def exchange(self) -> None:
+        """
+        Migrants and ghosts go right first, then ghosts go left. A shard only waits on a neighbor that
+        already sent (the last shard has no one to its right, the first no one to its left), so the chain can't deadlock.
+        """
+        model = self.model
+        ghosts = []
+        if self.right:
+            emigrants = [agent for agent in model.agents if agent.pos[1] >= self.y_end and not agent.is_removed]
+            for agent in emigrants:
+                self.release(agent)
+            self.migrated_out += len(emigrants)
+            halo = [agent for agent in model.agents if agent.pos[1] >= self.y_end - self.halo_length]
+            self.right.send_bytes(pack_agents(model, [emigrants, halo]))
+        if self.left:
+            immigrants, left_ghosts = unpack_agents(model, self.left.recv_bytes())
+            for agent in immigrants:
+                self.adopt(agent)
+            self.migrated_in += len(immigrants)
+            ghosts.extend(left_ghosts)
+            halo = [agent for agent in model.agents if agent.pos[1] < self.y_start + self.halo_length]
+            self.left.send_bytes(pack_agents(model, [halo]))
+        if self.right:
+            right_ghosts, = unpack_agents(model, self.right.recv_bytes())
+            ghosts.extend(right_ghosts)
+        self.set_ghosts(ghosts)
+
+    def release(self, agent: TrafficAgent) -> None:
+        """Take an agent out of this shard, it lives on in another one (or nowhere, when pruning)."""
+        self.model.highway.remove_agent(agent)
+        agent.remove()
+        # Its pending decision is dropped by the scheduler, the new owner books it again
+        agent.is_removed = True
+        self.model.kinematics_epoch += 1
+
+    def adopt(self, agent: TrafficAgent) -> None:
+        model = self.model
+        self.forget_neighbors(agent)
+        agent.is_removed = False # set by the sender's release
+        model.register_agent(agent)
+        model.highway.place_agent(agent, tuple(agent.vehicle.position))
+        if model.decision_scheduler and agent.next_decision_bucket is not None:
+            bucket, agent.next_decision_bucket = agent.next_decision_bucket, None
+            model.decision_scheduler.schedule(agent, bucket * model.decision_scheduler.tick_ms)
+        model.kinematics_epoch += 1
+
+    def set_ghosts(self, ghosts: list[TrafficAgent]) -> None:
+        model, highway = self.model, self.model.highway
+        for ghost in model.ghost_agents:
+            highway.remove_agent(ghost)
+        known = {agent.unique_id: agent for agent in itertools.chain(model.agents, ghosts)}
+        for agent in itertools.chain(model.agents, ghosts):
+            if isinstance(agent.lead, AgentRef):
+                agent.lead = known.get(agent.lead.unique_id)
+        for ghost in ghosts:
+            self.forget_neighbors(ghost)
+            highway.place_agent(ghost, ghost.pos)
+        model.ghost_agents = ghosts
+        self.ghost_count += len(ghosts)
+        self.exchange_count += 1
+        model.kinematics_epoch += 1
+        model.collisions_step = None # detected again with the new ghosts
+
+    @staticmethod
+    def forget_neighbors(agent: TrafficAgent) -> None:
+        # The memos point at the sender's agents, set_ghosts swaps the lead's AgentRef for the agent it names here
+        agent.lead_cache_key = None
+        agent.cached_lead_and_gap = (None, None)
+        agent.accel_strategy = None
+
+    def agent_states(self) -> list[tuple]:
+        return [(agent.unique_id, *agent.vehicle.position.tolist(), *agent.vehicle.velocity.tolist()) for agent in self.model.agents]
+
+    def stats(self) -> dict:
+        model = self.model
+        steps = model.total_time // model.dt # model.steps counts Mesa's two increments per step
+        return {
+            'y_start': self.y_start,
+            'y_end': self.y_end,
+            'steps': steps,
+            'sim_time_ms': model.total_time,
+            'agents': len(model.agents),
+            'ghosts': len(model.ghost_agents),
+            'mean_ghosts': self.ghost_count / self.exchange_count if self.exchange_count else 0.0,
+            'speed_sum': float(sum(agent.get_speed() for agent in model.agents)),
+            'collisions': len(model.get_collisions()),
+            'collision_pairs': self.collision_pairs,
+            'spawned_agents': model.spawned_agents,
+            'removed_agents': model.removed_agents,
+            'substepped_agent_steps': model.substepped_agent_steps,
+            'coarse_agent_steps': model.coarse_agent_steps,
+            'migrated_in': self.migrated_in,
+            'migrated_out': self.migrated_out,
+            'step_time_s': self.step_time_s,
+            'exchange_time_s': self.exchange_time_s,
+            'cpu_time_s': self.cpu_time_s,
+        }
+
+
+def run_shard(model_bytes: bytes, seed: int, y_start: float, y_end: float, halo_length: float,
+              commands: "Connection", left: "Connection", right: "Connection", random_state: tuple = None) -> None:
+    """Worker process: build the shard, then answer the coordinator's commands until told to close."""
+    try:
+        if random_state:
+            random.setstate(random_state[0])
+            np.random.set_state(random_state[1])
+        else:
+            random.seed(seed)
+            np.random.seed(seed % 2**32)
+        shard = Shard(pickle.loads(model_bytes), y_start, y_end, halo_length, left, right)
+        while True:
+            command, argument = commands.recv()
+            if command == 'close':
+                commands.send(('ok', None))
+                return
+            if command == 'advance':
+                shard.advance(argument)
+                commands.send(('ok', shard.stats()))
+            elif command == 'stats':
+                commands.send(('ok', shard.stats()))
+            elif command == 'agent_states':
+                commands.send(('ok', shard.agent_states()))
+            else:
+                raise ValueError(f"Unknown shard command '{command}'")
+    except Exception:
+        commands.send(('error', traceback.format_exc()))
+
+
+class ShardedTrafficModel:
+    """
+    Steps one TrafficModel split into `shard_count` stretches of equal length, each in its own process (see Shard).
+
+    The shards talk to their neighbors directly once per tick, the coordinator only hands out
+    `advance(steps)` and collects stats, so it is not in the way between ticks.
+    Only the agent engine is supported (the vectorized engine keeps its own arrays that ghosts are not part of).
+
+    With the synchronous update (is_synchronous) the run is the single process run, bit for bit: every agent reads the
+    others as they were at the start of the tick, which is what the ghosts show, draws from its own random stream, and
+    the first shard spawns from the coordinator's random state (benchmarks/check_sharded.py). With the sequential update
+    results only match statistically: an agent reads the others in its shard as already moved this tick but the ghosts
+    as they were at its start, and the shards other than the first draw from their own generators. Collisions across a boundary are
+    found with the ghosts and reported by one shard only (CollisionDetector), `collisions` in stats() is the count at
+    the current step and `collision_pairs` the sum over the steps, as a single process run would count them.
+    """
+
+    # Farther than any agent looks (sensing distance 120-160 m, neighbor checks 15 car lengths), plus a tick of travel
+    HALO_LENGTH: float = 200_000.0
+
+    def __init__(self, model: "TrafficModel", shard_count: int, seed: int = 0, halo_length: float = None) -> None:
+        """
+        Parameters
+        ----------
+        model : TrafficModel
+            Fully built model to split, the single process run would start from the same one.
+        shard_count : int
+            Number of worker processes.
+        seed : int
+            Master seed, every shard but the first seeds the global random generators with its own stream spawned
+            from it. The first shard, the only one spawning, carries on with the coordinator's random state.
+        halo_length : float
+            Distance (mm) from a boundary within which agents are mirrored to the neighbor.
+        """
+        halo_length = halo_length or self.HALO_LENGTH
+        shard_length = model.highway.y_max / shard_count if shard_count > 0 else 0
+        if model.vectorized_engine:
+            raise ValueError("Sharding needs the agent engine")
+        if shard_count < 1 or (shard_count > 1 and shard_length < halo_length):
+            raise ValueError(f"{shard_count} shards would be shorter than the halo ({halo_length} mm)")
+
+        self.shard_count: int = shard_count
+        self.halo_length: float = halo_length
+        self.dt: int = model.dt
+        self.steps: int = model.total_time // model.dt
+        self.total_time: int = model.total_time
+        self.shard_stats: list[dict] = []
+
+        # The first shard reaches back to the entrance, the last one past the end of the road
+        bounds = [float('-inf')] + [i * shard_length for i in range(1, shard_count)] + [float('inf')]
+        seeds = [int(stream.generate_state(1)[0]) for stream in np.random.SeedSequence(seed).spawn(shard_count)]
+        # The spawns draw what the single process run would have drawn from here on
+        random_state = (random.getstate(), np.random.get_state())
+        links = [multiprocessing.Pipe() for _ in range(shard_count - 1)]
+        model_bytes = pickle.dumps(model, pickle.HIGHEST_PROTOCOL)
+
+        self.connections: list["Connection"] = []
+        self.processes: list[multiprocessing.Process] = []
+        for index in range(shard_count):
+            commands, worker_commands = multiprocessing.Pipe()
+            left = links[index - 1][1] if index > 0 else None
+            right = links[index][0] if index < shard_count - 1 else None
+            process = multiprocessing.Process(target=run_shard, name=f"Shard{index}", daemon=True,
+                                              args=(model_bytes, seeds[index], bounds[index], bounds[index + 1], halo_length,
+                                                    worker_commands, left, right, random_state if index == 0 else None))
+            process.start()
+            worker_commands.close()
+            self.connections.append(commands)
+            self.processes.append(process)
+        for left, right in links:
+            left.close()
+            right.close()
+
+    def __enter__(self) -> "ShardedTrafficModel":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def request(self, command: str, argument=None) -> list:
+        """Send a command to every shard and wait for all the answers."""
+        for connection in self.connections:
+            connection.send((command, argument))
+        replies, errors = [], []
+        for index, connection in enumerate(self.connections):
+            try:
+                status, reply = connection.recv()
+            except (EOFError, OSError):
+                status, reply = 'error', "exited without answering"
+            if status == 'error':
+                # A failing shard takes its neighbors down with it, report all of them
+                errors.append(f"Shard {index}: {reply}")
+            replies.append(reply)
+        if errors:
+            self.terminate()
+            raise RuntimeError("\n".join(errors))
+        return replies
+
+    def step(self) -> None:
+        self.advance(1)
+
+    def advance(self, steps: int) -> None:
+        """Run `steps` ticks, the shards only sync with the coordinator at the end."""
+        self.shard_stats = self.request('advance', steps)
+        self.steps = self.shard_stats[0]['steps']
+        self.total_time = self.shard_stats[0]['sim_time_ms']
+
+    def agent_states(self) -> list[tuple]:
+        """(unique_id, x, y, vx, vy) of every agent on the highway, ordered by unique_id."""
+        return sorted(itertools.chain.from_iterable(self.request('agent_states')))
+
+    def stats(self) -> dict:
+        shard_stats = self.shard_stats or self.request('stats')
+        totals = {key: sum(stats[key] for stats in shard_stats)
+                  for key in ('agents', 'collisions', 'collision_pairs', 'spawned_agents', 'removed_agents',
+                              'substepped_agent_steps', 'coarse_agent_steps', 'migrated_out')}
+        return {
+            'shards': self.shard_count,
+            'steps': self.steps,
+            'sim_time_ms': self.total_time,
+            **totals,
+            'mean_speed': sum(stats['speed_sum'] for stats in shard_stats) / totals['agents'] if totals['agents'] else 0.0,
+            'agents_per_shard': [stats['agents'] for stats in shard_stats],
+            'step_time_s': [round(stats['step_time_s'], 3) for stats in shard_stats],
+            'exchange_time_s': [round(stats['exchange_time_s'], 3) for stats in shard_stats],
+            'cpu_time_s': [round(stats['cpu_time_s'], 3) for stats in shard_stats],
+        }
+
+    def close(self) -> None:
+        if not self.processes:
+            return
+        try:
+            self.request('close')
+        except (RuntimeError, OSError):
+            pass
+        self.terminate()
+
+    def terminate(self) -> None:
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self.connections:
+            connection.close()
+        self.processes, self.connections = [], []
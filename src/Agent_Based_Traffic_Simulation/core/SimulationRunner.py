@@ -0,0 +1,201 @@
+import threading
+import time
+import traceback
+
+from typing import TYPE_CHECKING, Any, Callable
+if TYPE_CHECKING:
+    from .TrafficModel import TrafficModel
+    from .Logger import Logger
+
+
+class Subscription:
+    """
+    Latest frame slot of one subscriber.
+    A new frame replaces the one the subscriber has not picked up yet, so a slow client skips frames
+    instead of holding back the simulation or piling them up in memory.
+    """
+
+    def __init__(self) -> None:
+        self.condition: threading.Condition = threading.Condition()
+        self.frame: Any = None
+        self.is_closed: bool = False
+        self.frames_received: int = 0
+        self.frames_dropped: int = 0
+
+    def publish(self, frame: Any) -> None:
+        with self.condition:
+            if self.frame is not None:
+                self.frames_dropped += 1
+            self.frame = frame
+            self.frames_received += 1
+            self.condition.notify()
+
+    def get(self, timeout: float = None) -> Any:
+        """Wait for the next frame. Returns None on timeout or once the subscription is closed."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame is not None or self.is_closed, timeout)
+            frame, self.frame = self.frame, None
+            return frame
+
+    def close(self) -> None:
+        with self.condition:
+            self.is_closed = True
+            self.condition.notify_all()
+
+
+class SimulationRunner:
+    """
+    Steps a TrafficModel on its own thread and pushes frames to subscribers.
+
+    The model advances `dt` ms of simulated time every `dt / real_time_factor` ms of wall time
+    (real_time_factor <= 0 runs as fast as possible). If the loop falls behind it does not try to catch up
+    with a burst of steps, it just continues from the current time.
+    Frames are encoded at most `max_fps` times per second and only when someone is subscribed.
+    All model access, including single steps requested over HTTP, goes through `lock`.
+    `encode(model, window)` gets the y range the subscribers are looking at (None for everything).
+    If a step raises, the loop stops, keeps the error in `error` (see stats()) and ends every subscription.
+    """
+
+    def __init__(self, model: "TrafficModel", logger: "Logger" = None, encode: Callable[["TrafficModel", tuple], Any] = None,
+                 real_time_factor: float = 1.0, max_fps: float = 30.0) -> None:
+        self.model: "TrafficModel" = model
+        self.logger: "Logger" = logger
+        self.encode: Callable[["TrafficModel", tuple], Any] = encode
+        self.real_time_factor: float = real_time_factor
+        self.max_fps: float = max_fps
+        self.window: tuple[float, float] = None
+
+        self.lock: threading.Lock = threading.Lock()
+        self.thread: threading.Thread = None
+        self.stop_event: threading.Event = threading.Event()
+        self.subscribers: list[Subscription] = []
+        self.subscribers_lock: threading.Lock = threading.Lock()
+        self.last_publish_time: float = 0.0
+        self.frames_published: int = 0
+        self.error: str = None # why the loop stopped on its own
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def step(self) -> None:
+        with self.lock:
+            self.model.step()
+            if self.logger:
+                self.logger.log_all(self.model)
+
+    def advance(self, steps: int, every: int = 0, encode: Callable[["TrafficModel"], Any] = None) -> list:
+        """
+        Step the model `steps` times in one go. The logger still sees every step, so it keeps its interval.
+        Returns encode(model) after every `every`-th step (every <= 0: after the last step only).
+        """
+        frames = []
+        with self.lock:
+            model, logger = self.model, self.logger
+            for step in range(1, steps + 1):
+                model.step()
+                if logger:
+                    logger.log_all(model)
+                if encode and (step == steps if every <= 0 else step % every == 0):
+                    frames.append(encode(model))
+            if encode and every > 0 and steps % every != 0:
+                frames.append(encode(model))
+        # Anyone watching the stream jumps ahead too
+        self.publish(force=True)
+        return frames
+
+    def start(self, real_time_factor: float = None) -> None:
+        if real_time_factor is not None:
+            self.real_time_factor = real_time_factor
+        if self.is_running:
+            return
+        self.error = None
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="SimulationRunner", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.is_running and threading.current_thread() is not self.thread:
+            self.thread.join()
+        self.thread = None
+
+    def close(self) -> None:
+        """Stop the loop and end every subscription."""
+        self.stop()
+        self.close_subscriptions()
+
+    def run(self) -> None:
+        try:
+            self.run_loop()
+        except Exception as error:
+            print("Exception in the simulation loop:\n" + traceback.format_exc())
+            self.error = f"{type(error).__name__}: {error}"
+            # Streams would otherwise wait for frames that never come
+            self.close_subscriptions()
+
+    def run_loop(self) -> None:
+        next_step_time = time.monotonic()
+        while not self.stop_event.is_set():
+            self.step()
+            self.publish()
+
+            if self.real_time_factor <= 0:
+                continue
+            next_step_time += self.model.dt / 1000 / self.real_time_factor
+            delay = next_step_time - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                # Behind schedule, run slower than asked instead of bursting to catch up
+                next_step_time = time.monotonic()
+
+    # ---------- subscribers ----------
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        with self.subscribers_lock:
+            self.subscribers.append(subscription)
+        return subscription
+
+    def close_subscriptions(self) -> None:
+        with self.subscribers_lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscription in subscribers:
+            subscription.close()
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.subscribers_lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+        subscription.close()
+
+    def publish(self, force: bool = False) -> None:
+        """Encode the current state once and hand it to every subscriber, at most max_fps times a second."""
+        if not self.subscribers or self.encode is None:
+            return
+        now = time.monotonic()
+        if not force and self.max_fps > 0 and now - self.last_publish_time < 1 / self.max_fps:
+            return
+        self.last_publish_time = now
+
+        with self.lock:
+            frame = self.encode(self.model, self.window)
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.publish(frame)
+        self.frames_published += 1
+
+    def stats(self) -> dict:
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        return {
+            'is_running': self.is_running,
+            'real_time_factor': self.real_time_factor,
+            'steps': self.model.steps,
+            'sim_time_ms': self.model.total_time,
+            'frames_published': self.frames_published,
+            'subscribers': len(subscribers),
+            'frames_dropped': sum(subscription.frames_dropped for subscription in subscribers),
+            'error': self.error,
+        }
@@ -0,0 +1,153 @@
+import bisect
+import time
+
+
+def log_spaced_bounds(first_exponent: int, last_exponent: int) -> list[float]:
+    """1-2-5 steps per decade from 10**first_exponent to 5 * 10**last_exponent, e.g. 1, 2, 5, 10, 20, 50."""
+    # Parsed from text so the bounds are exactly 5e-06 and not 4.9999999999999996e-06
+    return [float(f"{factor}e{exponent}") for exponent in range(first_exponent, last_exponent + 1) for factor in (1, 2, 5)]
+
+
+# Upper bounds of the buckets, seconds for timings (1 us to 50 s) and plain numbers for counters
+TIME_BOUNDS: list[float] = log_spaced_bounds(-6, 1)
+COUNT_BOUNDS: list[float] = log_spaced_bounds(0, 6)
+
+
+class Histogram:
+    """
+    Fixed buckets with upper bounds `bounds` plus one for everything above the last bound.
+    Keeps the count, sum, min and max exactly, quantiles are estimated from the buckets.
+    """
+
+    def __init__(self, bounds: list[float]) -> None:
+        self.bounds: list[float] = bounds
+        self.bucket_counts: list[int] = [0] * (len(bounds) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.min: float = None
+        self.max: float = None
+
+    def observe(self, value: float) -> None:
+        # bisect_left so a value equal to a bound lands in that bound's bucket (bound is inclusive, like Prometheus' le)
+        self.bucket_counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Interpolated inside the bucket the q-th observation falls in, clamped to the observed min and max."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                value = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(value, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+    def cumulative_counts(self) -> list[tuple[float, int]]:
+        """(upper bound, observations at or below it) per bucket, the last bound is inf."""
+        counts = []
+        seen = 0
+        for bound, bucket_count in zip(self.bounds + [float("inf")], self.bucket_counts):
+            seen += bucket_count
+            counts.append((bound, seen))
+        return counts
+
+    def summary(self, scale: float = 1.0) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.mean() * scale,
+            'p50': self.quantile(0.5) * scale,
+            'p90': self.quantile(0.9) * scale,
+            'p99': self.quantile(0.99) * scale,
+            'max': (self.max or 0.0) * scale,
+        }
+
+
+class StepProfiler:
+    """
+    Wall time per phase of a model step and event counters, totalled per step and collected into histograms.
+
+    The model calls begin_step() at the start of every step, which closes the previous step's record. Anything
+    recorded after the model's step returns (the logger) still goes to that step.
+    Phases are timed with add_time(phase, seconds), or lap(phase): the time since the last lap()/start_lap(),
+    which lets a sequence of phases share one clock read each. Nested phases (trajectory_prediction inside
+    lane_change, the agent phases inside agents) are reported next to their parent, not subtracted from it.
+    Callers check `if profiler:` first, the model's profiler is None when profiling is off.
+    """
+
+    def __init__(self) -> None:
+        self.phase_times: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.is_step_open: bool = False
+        self.lap_start: float = 0.0
+
+        self.time_histograms: dict[str, Histogram] = {}
+        self.count_histograms: dict[str, Histogram] = {}
+        self.steps: int = 0
+
+    # ---------- recording ----------
+    def begin_step(self) -> None:
+        self.end_step()
+        self.is_step_open = True
+
+    def end_step(self) -> None:
+        """Fold the open step's totals into the histograms. A phase or counter missing from a step counts as 0."""
+        if not self.is_step_open:
+            return
+        for phase in self.phase_times.keys() | self.time_histograms.keys():
+            histogram = self.time_histograms.get(phase)
+            if histogram is None:
+                # First seen now, the steps before had none of it
+                histogram = self.time_histograms[phase] = Histogram(TIME_BOUNDS)
+                histogram.bucket_counts[0] = histogram.count = self.steps
+                histogram.min = 0.0 if self.steps else None
+            histogram.observe(self.phase_times.get(phase, 0.0))
+        for name in self.counters.keys() | self.count_histograms.keys():
+            histogram = self.count_histograms.get(name)
+            if histogram is None:
+                histogram = self.count_histograms[name] = Histogram(COUNT_BOUNDS)
+                histogram.bucket_counts[0] = histogram.count = self.steps
+                histogram.min = 0 if self.steps else None
+            histogram.observe(self.counters.get(name, 0))
+        self.steps += 1
+        self.phase_times = {}
+        self.counters = {}
+        self.is_step_open = False
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + seconds
+
+    def start_lap(self) -> None:
+        self.lap_start = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + now - self.lap_start
+        self.lap_start = now
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # ---------- reading ----------
+    def stats(self) -> dict:
+        """
+        Per phase the ms spent in it per step (mean, p50, p90, p99, max over the closed steps),
+        per counter the same for its count per step.
+        """
+        return {
+            'steps': self.steps,
+            'phases_ms': {phase: histogram.summary(1000) for phase, histogram in sorted(self.time_histograms.items())},
+            'counters': {name: histogram.summary() for name, histogram in sorted(self.count_histograms.items())},
+        }
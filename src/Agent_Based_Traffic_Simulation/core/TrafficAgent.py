@@ -1,25 +1,55 @@
 import random
+import time
 from typing import TYPE_CHECKING, Type
 
 import numpy as np
 
 from .Personalities import DefensivePersonality
 from .Personalities.AbstractPersonality import AbstractPersonality
-from .Utils import to_unit, EPS
+from .Utils import to_unit, EPS, predict_positions, max_travel
 from mesa import Agent
 
 # from Agent_Based_Traffic_Simulation.core.DriveStrategies import AbstractDriveStrategy
 from . import TrafficModel
 from .VehicleTypes import AbstractVehicle, SUV, Truck,  Motorcycle
 from .LaneChangeStrategies import AbstractLaneChangeState
+from .DriveStrategies.CruiseStrategy import CruiseStrategy, CRUISE_STRATEGY
+from .DriveStrategies.AccelerateStrategy import AccelerateStrategy, ACCELERATE_STRATEGY
+from .DriveStrategies.BrakeStrategy import BrakeStrategy, BRAKE_STRATEGY
+from .LaneChangeStrategies.LaneStayStrategy import LANE_STAY_STRATEGY
+from .LaneChangeStrategies.LaneChangeStrategy import LANE_CHANGE_STRATEGY, LANE_CHANGE_DURATION
 
 if TYPE_CHECKING:
     from .DriveStrategies.AbstractDriveStrategy import AbstractDriveStrategy
 
 
+# Strategy type -> the instance every agent shares
+DRIVE_STRATEGIES: dict[type, "AbstractDriveStrategy"] = {
+    CruiseStrategy: CRUISE_STRATEGY,
+    AccelerateStrategy: ACCELERATE_STRATEGY,
+    BrakeStrategy: BRAKE_STRATEGY,
+}
+STRAIGHT_UP = np.array([0., 1.]) # heading when stopped, shared, never written
+LEAD_SEARCH_RADIUS = 10_000 # the lead search looks 10 m around me first and doubles the radius from there
+
+
 class TrafficAgent(Agent):
     model: TrafficModel
 
+    # Own attributes live in slots, only mesa's few (unique_id, model, pos) stay in the instance __dict__.
+    # The personality values are references to the personality's read only floats, kept here for the hot paths
+    __slots__ = ('vehicle', 'goal', 'lane_intent', 'current_lane', 'spawn_time', 'is_removed', 'personality',
+                 'max_speed', 'desired_speed', 'sensing_distance', 'max_acceleration', 'cruise_gain', 'braking_comfortable',
+                 'b_max', 'desired_time_headway', 'smallest_follow_distance', 'desired_gap', 'politeness_factor',
+                 'lane_change_threshold', 'decision_time',
+                 'previous_drive_strategy', 'current_drive_strategy', 'lane_change_strategy',
+                 'lateral_velocity', 'lane_change_target_x', 'lane_change_duration', 'lane_change_timer', 'is_emergency_return',
+                 'lead', 'direction', 'gap_to_lead',
+                 'velocity_version', 'speed_version', 'cached_speed', 'heading', 'cached_heading',
+                 'lead_cache_key', 'cached_lead_and_gap',
+                 'accel_strategy', 'accel_version', 'accel_lead', 'accel_lead_version', 'accel_gap', 'cached_accel',
+                 'internal_timer', 'initial_lane_x', 'decision_due', 'next_decision_bucket', 'next_state')
+
     def __init__(self, model: TrafficModel, goal: np.ndarray, lane_intent: int, spawn_time:int, vehicle: AbstractVehicle, 
                  personality: AbstractPersonality = DefensivePersonality(), velocity = 0):
         super().__init__(model)
@@ -51,94 +81,169 @@ class TrafficAgent(Agent):
         self.decision_time:int = personality.decision_time
      
 
-        # strategies
-        from .DriveStrategies.CruiseStrategy import CruiseStrategy
-        from .LaneChangeStrategies.LaneStayStrategy import LaneStayStrategy
+        # strategies, shared instances
+        self.previous_drive_strategy: AbstractDriveStrategy = CRUISE_STRATEGY
+        self.current_drive_strategy:AbstractDriveStrategy = CRUISE_STRATEGY
+        self.lane_change_strategy: AbstractLaneChangeState = LANE_STAY_STRATEGY
 
-        self.previous_drive_strategy: AbstractDriveStrategy = CruiseStrategy()
-        self.current_drive_strategy:AbstractDriveStrategy = CruiseStrategy()
-        self.lane_change_strategy: AbstractLaneChangeState = LaneStayStrategy()
+        # current lane change maneuver, see start_lane_change
+        self.lateral_velocity: float = 0.0
+        self.lane_change_target_x: float = None
+        self.lane_change_duration: float = LANE_CHANGE_DURATION
+        self.lane_change_timer: float = 0.0
+        self.is_emergency_return: bool = False
 
         # tracking
         self.lead: TrafficAgent = None
         self.direction: np.ndarray = None
         self.gap_to_lead:float = None  # center-to-center, longitudinal mm
 
+        # memo of get_speed/get_heading, find_lead_and_gap and get_accel, each keyed on what it was computed from.
+        # Whatever writes vehicle.velocity bumps velocity_version, the speed and accel memos compare versions, not values
+        self.velocity_version: int = 0
+        self.speed_version: int = None
+        self.cached_speed: float = 0.0
+        self.heading: np.ndarray = np.zeros(2) # get_heading writes into it
+        self.cached_heading: np.ndarray = None
+        self.lead_cache_key: tuple = None
+        self.cached_lead_and_gap: tuple = (None, None)
+        self.accel_strategy = None
+        self.accel_version: int = None
+        self.accel_lead: TrafficAgent = None
+        self.accel_lead_version: int = None
+        self.accel_gap: float = None
+        self.cached_accel: float = 0.0
+
         # decision cadence
         self.internal_timer:int = self.decision_time
+        # Only used with the model's decision scheduler, first decision right away like the timer above
+        self.decision_due: bool = False
+        self.next_decision_bucket: int = None
+        if model.decision_scheduler:
+            model.decision_scheduler.schedule(self, model.total_time)
         self.initial_lane_x: float = self.vehicle.position[0]
+        # What step_buffered computed, until the model commits it
+        self.next_state: tuple = None
 
         # small initial push along lane
         if(velocity == 0 ):
             self.vehicle.velocity = self.current_lane_vector() * self.desired_speed/10
         else:
             self.vehicle.velocity = self.current_lane_vector() * velocity
+        self.velocity_version += 1
 
 
 
     # ---------- tick ----------
     def step(self) -> None:
-        from .DriveStrategies.CruiseStrategy import CruiseStrategy
-        from .DriveStrategies.AccelerateStrategy import AccelerateStrategy
-        from .DriveStrategies.BrakeStrategy import BrakeStrategy
         dt = self.model.dt  # ms
-
- 
-     
+        # Splits my step into sense / drive_strategy / lane_change / acceleration / move / highway_move when profiling
+        profiler = self.model.profiler
+        if profiler:
+            profiler.start_lap()
     
         self.sense()
+        if profiler:
+            profiler.lap('sense')
         self.action()
       
         # Make sure the vehicle does not go backwards, some boundary physics night allow that to happen
-        if (np.linalg.norm(self.vehicle.velocity < 0)):
+        if (self.vehicle.velocity < 0).any():
             self.vehicle.velocity[1] = max(0, self.vehicle.velocity[1])
+            self.velocity_version += 1
 
-        if(np.linalg.norm(self.vehicle.velocity) > self.max_speed):
-            self.vehicle.velocity = to_unit(self.vehicle.velocity) * self.max_speed
+        if(self.get_speed() > self.max_speed):
+            np.multiply(self.get_heading(), self.max_speed, out=self.vehicle.velocity)
+            self.velocity_version += 1
 
         self.vehicle.position += self.vehicle.velocity * dt
+        self.model.kinematics_epoch += 1
 
         # Check for out of bounds and remove 
         if (self.check_outside_of_bounds()):
             self.remove_self() # This will now mark the agent for removal
+            if profiler:
+                profiler.lap('move')
             return
                 
         if type(self.current_drive_strategy) is not type(self.previous_drive_strategy):
-            self.internal_timer = -1
+            self.restart_decision_timer()
+        if profiler:
+            profiler.lap('move')
             
-        self.model.highway.move_agent(self, tuple(self.vehicle.position))
+        # The synchronous update moves everyone in the highway at the end of the tick
+        if not self.model.is_synchronous:
+            self.model.highway.move_agent(self, tuple(self.vehicle.position))
+            if profiler:
+                profiler.lap('highway_move')
         self.internal_timer += dt
 
+    def step_buffered(self) -> None:
+        """
+        step() for the synchronous update. What neighbors read of me (kinematics, lead, gap, drive strategy) stays as it
+        was at the start of the tick: I step on copies, keep the result in next_state and put the old values back.
+        """
+        vehicle = self.vehicle
+        published = (vehicle.position, vehicle.velocity, vehicle.acceleration, self.lead, self.gap_to_lead, self.current_drive_strategy)
+        vehicle.position, vehicle.velocity, vehicle.acceleration = vehicle.position.copy(), vehicle.velocity.copy(), vehicle.acceleration.copy()
+        self.step()
+        self.next_state = (vehicle.position, vehicle.velocity, vehicle.acceleration, self.lead, self.gap_to_lead, self.current_drive_strategy)
+        vehicle.position, vehicle.velocity, vehicle.acceleration, self.lead, self.gap_to_lead, self.current_drive_strategy = published
+        self.velocity_version += 1
+
+    def commit_step(self) -> None:
+        vehicle = self.vehicle
+        vehicle.position, vehicle.velocity, vehicle.acceleration, self.lead, self.gap_to_lead, self.current_drive_strategy = self.next_state
+        self.next_state = None
+        self.velocity_version += 1
+
+    def get_rng(self):
+        """
+        Where my random choices come from: the shared `random` module, or with the synchronous update a generator seeded
+        from the model seed, my id and the tick, so my draws don't depend on when the others stepped.
+        """
+        if not self.model.is_synchronous:
+            return random
+        return random.Random(f"{self.model._seed}-{self.unique_id}-{self.model.steps}")
+
     def sense(self) -> None:
         self.previous_drive_strategy = self.current_drive_strategy
         self.lead, self.gap_to_lead = self.find_lead_and_gap(self.sensing_distance)
 
     def action(self) -> None:
+        profiler = self.model.profiler
         self.choose_drive_strategy()
         self.do_drive_strategy()
+        if profiler:
+            profiler.lap('drive_strategy')
         self.choose_lane_change_strategy()
         self.do_lane_change_strategy()
-        longitudinal_accel_magnitude = self.current_drive_strategy.calculate_accel(self)
+        if profiler:
+            profiler.lap('lane_change')
+        longitudinal_accel_magnitude = self.get_accel()
         self.vehicle.velocity[1] += longitudinal_accel_magnitude * self.model.dt
+        self.velocity_version += 1
+        if profiler:
+            profiler.lap('acceleration')
 
     def do_drive_strategy(self):
         self.current_drive_strategy.step(self)
     
     def do_lane_change_strategy(self):
-        # This will set a lateral_velocity on the lane_change_strategy if a change is active
-        self.lane_change_strategy.step(self)
+        # This will set my lateral_velocity if a change is active.
+        # With the scheduler only the agents in model.due_agents (decision_due) have a decision to make in their lane
+        if self.model.decision_scheduler is None or self.decision_due or self.lane_change_strategy is not LANE_STAY_STRATEGY:
+            self.lane_change_strategy.step(self)
 
         # --- Physics Update ---
         # 1. Get longitudinal acceleration from the driving strategy
         # 2. Update longitudinal velocity (y-component)
         # 3. Get lateral velocity from the lane change strategy 
         
-        self.vehicle.velocity[0] = self.lane_change_strategy.lateral_velocity
+        self.vehicle.velocity[0] = self.lateral_velocity
+        self.velocity_version += 1
         
     def choose_drive_strategy(self):
-        from .DriveStrategies.CruiseStrategy import CruiseStrategy
-        from .DriveStrategies.AccelerateStrategy import AccelerateStrategy
-        from .DriveStrategies.BrakeStrategy import BrakeStrategy
         self.previous_drive_strategy = self.current_drive_strategy
         self.lead, self.gap_to_lead = self.find_lead_and_gap(self.sensing_distance)
         
@@ -147,8 +252,8 @@ class TrafficAgent(Agent):
             self.assign_strategy(CruiseStrategy) 
             return
 
-        v_now = np.linalg.norm(self.vehicle.velocity)
-        v_lead = np.linalg.norm(self.lead.vehicle.velocity)
+        v_now = self.get_speed()
+        v_lead = self.lead.get_speed()
         closing_speed = v_now - v_lead # Positive if closing, negative if pulling away
 
         safe_dist = self.get_safe_following_distance()
@@ -166,6 +271,31 @@ class TrafficAgent(Agent):
 
     def choose_lane_change_strategy(self):
         pass
+
+    def is_decision_due(self) -> bool:
+        """Time to evaluate a lane change?"""
+        if self.model.decision_scheduler is None:
+            return self.internal_timer >= self.decision_time
+        return self.decision_due
+
+    def restart_decision_timer(self) -> None:
+        # A new drive strategy postpones the next lane change decision by a full decision_time
+        self.internal_timer = -1
+        if self.model.decision_scheduler:
+            self.decision_due = False
+            self.model.decision_scheduler.schedule(self, self.model.total_time + self.decision_time)
+
+    def start_lane_change(self, target_x: float, duration: float = LANE_CHANGE_DURATION, is_emergency_return: bool = False):
+        self.lane_change_target_x = target_x
+        self.lane_change_duration = duration
+        self.lane_change_timer = 0.0
+        self.lateral_velocity = 0.0
+        self.is_emergency_return = is_emergency_return
+        self.lane_change_strategy = LANE_CHANGE_STRATEGY
+
+    def stay_in_lane(self):
+        self.lateral_velocity = 0.0
+        self.lane_change_strategy = LANE_STAY_STRATEGY
     
     def is_in_same_lane(self, other_agent: "TrafficAgent") -> bool:
         """
@@ -206,8 +336,8 @@ class TrafficAgent(Agent):
         if self.lead is None:
             return 0.0
 
-        v = np.linalg.norm(self.vehicle.velocity)
-        v_lead = np.linalg.norm(self.lead.vehicle.velocity)
+        v = self.get_speed()
+        v_lead = self.lead.get_speed()
         delta_v = v - v_lead
 
         s_star = self.smallest_follow_distance + max(0.0, (v * self.desired_time_headway / 1000.0) + (v * delta_v) / (2 * np.sqrt(self.max_acceleration * self.braking_comfortable)))
@@ -215,7 +345,7 @@ class TrafficAgent(Agent):
 
     def assign_strategy(self, strategy_type: Type['AbstractDriveStrategy']):
         if not isinstance(self.current_drive_strategy, strategy_type):
-            self.current_drive_strategy = strategy_type()
+            self.current_drive_strategy = DRIVE_STRATEGIES[strategy_type]
             
     def is_uncomfortable_closing_speed(self, closing_speed, velocity):
         if(velocity < 15):
@@ -235,29 +365,91 @@ class TrafficAgent(Agent):
     
     
 
+    # ---------- memoized kinematics ----------
+    def get_speed(self) -> float:
+        """np.linalg.norm of the velocity, only recomputed when the velocity was written since the last call."""
+        if self.velocity_version == self.speed_version:
+            self.model.cache_hits['speed'] += 1
+            return self.cached_speed
+        self.model.cache_misses['speed'] += 1
+        self.speed_version = self.velocity_version
+        self.cached_speed = np.linalg.norm(self.vehicle.velocity)
+        self.cached_heading = None
+        return self.cached_speed
+
+    def get_heading(self) -> np.ndarray:
+        """Unit vector along the velocity, straight up when stopped. Only good until the velocity changes, don't keep or modify it."""
+        speed = self.get_speed()
+        if self.cached_heading is None:
+            self.cached_heading = np.divide(self.vehicle.velocity, speed, out=self.heading) if speed > EPS else STRAIGHT_UP
+        return self.cached_heading
+
+    def get_accel(self) -> float:
+        """
+        current_drive_strategy.calculate_accel(self), memoized on everything it reads:
+        the strategy, my velocity, the lead, its velocity and the gap to it. Velocities are compared by version.
+        """
+        lead = self.lead
+        lead_version = lead.velocity_version if lead is not None else None
+        if (self.current_drive_strategy is self.accel_strategy and self.velocity_version == self.accel_version
+                and lead is self.accel_lead and lead_version == self.accel_lead_version and self.gap_to_lead == self.accel_gap):
+            self.model.cache_hits['accel'] += 1
+            return self.cached_accel
+        self.model.cache_misses['accel'] += 1
+        self.accel_strategy = self.current_drive_strategy
+        self.accel_version = self.velocity_version
+        self.accel_lead = lead
+        self.accel_lead_version = lead_version
+        self.accel_gap = self.gap_to_lead
+        self.cached_accel = self.current_drive_strategy.calculate_accel(self)
+        return self.cached_accel
+
     # def find_lead_and_gap(self, sense):
     def find_lead_and_gap(self, max_sense=200_000_000):
+        # Same answer until someone moves, spawns or leaves (model.kinematics_epoch) or I switch lanes
+        key = (self.model.kinematics_epoch, self.current_lane, max_sense)
+        if key == self.lead_cache_key:
+            self.model.cache_hits['lead'] += 1
+            return self.cached_lead_and_gap
+        self.model.cache_misses['lead'] += 1
+        self.lead_cache_key = key
+        self.cached_lead_and_gap = self.find_lead_and_gap_uncached(max_sense)
+        return self.cached_lead_and_gap
+
+    def find_lead_and_gap_uncached(self, max_sense=200_000_000):
         if(len(self.model.agents) <= 1):
             return None, None
-        # Poll candidates until we find one in front of us
-        sense = 10_000 # Start at 10 meters in front of me
-        candidates = []
-        while len(candidates) == 0 and sense < max_sense:
-            candidates = self.model.highway.get_neighbors(self.pos, sense, False)
-            candidates = list(filter(
-                lambda a: a.pos[1] > self.pos[1] and self.is_in_same_lane(a),
-                candidates
-            ))
-            sense *= 2
-
-
-        # Filter: same lane and further along
-        candidates = sorted(candidates, key=lambda a: a.pos[1], reverse=False)
-
-        if len(candidates) == 0:
+
+        # Radii 10 m, 20 m, 40 m... below max_sense; the lead is the nearest agent further along in my lane
+        # inside the first of them that has one. Candidates come from the highway's per-lane index
+        radii = []
+        radius = LEAD_SEARCH_RADIUS
+        while radius < max_sense:
+            radii.append(radius)
+            radius *= 2
+        if not radii:
+            return None, None
+
+        x, y = self.pos
+        lead = None
+        lead_key = None
+        for agent in self.model.highway.agents_between(self.current_lane, y, y + radii[-1]):
+            agent_x, agent_y = agent.pos
+            if agent_y <= y:
+                continue
+            dx = agent_x - x
+            dy = agent_y - y
+            distance_squared = dx * dx + dy * dy
+            ring = next((i for i, r in enumerate(radii) if distance_squared <= r ** 2), None)
+            if ring is None:
+                continue
+            key = (ring, agent_y)
+            if (lead_key is None or key < lead_key) and self.is_in_same_lane(agent):
+                lead, lead_key = agent, key
+
+        if lead is None:
             return None, None
 
-        lead = candidates[0]
         gap = (lead.pos[1] - lead.vehicle.length / 2) - (self.pos[1] + self.vehicle.length / 2)
         return lead, gap
 
@@ -268,7 +460,6 @@ class TrafficAgent(Agent):
 
 
         sense_dist = self.sensing_distance
-        neighbors = self.model.highway.get_neighbors(self.pos, sense_dist, False) 
         
         # Filter for agents in the target lane
         target_lane = self.model.highway.lanes[lane_idx]
@@ -279,24 +470,23 @@ class TrafficAgent(Agent):
 
         # An agent is considered in the lane if any part of its body is inside the lane boundaries
         is_partly_in_lane = lambda a: (a.pos[0] - a.vehicle.width / 2) < lane_max_x and (a.pos[0] + a.vehicle.width / 2) > lane_min_x
-
-        lane_neighbors = [a for a in neighbors if is_partly_in_lane(a)  ]
-        
-        # Agents in front of us
-        leaders = sorted(
-            [a for a in lane_neighbors if a.pos[1] > self.pos[1]],
-            key=lambda a: a.pos[1]
+        # Within my sensing radius (the index only bounds the distance along the road)
+        x, y = self.pos
+        sense_squared = sense_dist ** 2
+        is_sensed = lambda a: (a.pos[0] - x) * (a.pos[0] - x) + (a.pos[1] - y) * (a.pos[1] - y) <= sense_squared
+
+        # Agent in front of us
+        leader = self.model.highway.get_leader(
+            lane_idx, y, sense_dist,
+            lambda a: is_partly_in_lane(a) and is_sensed(a)
         )
-        
-        # Agents behind us
-        followers = sorted(
-            [a for a in lane_neighbors if a.pos[1] < self.pos[1]],
-            key=lambda a: a.pos[1],
-            reverse=True
+
+        # Agent behind us
+        follower = self.model.highway.get_follower(
+            lane_idx, y, sense_dist,
+            lambda a: is_partly_in_lane(a) and is_sensed(a)
         )
 
-        leader = leaders[0] if leaders else None
-        follower = followers[0] if followers else None
         return leader, follower
 
     def get_scalar(self, vec: np.array) -> float:
@@ -307,6 +497,16 @@ class TrafficAgent(Agent):
         Predicts if a collision will occur during a lane change maneuver.
         It simulates forward in time for the expected duration of the maneuver.
         """
+        profiler = self.model.profiler
+        if not profiler:
+            return self.is_colliding_at_next_step_untimed(lateral_velocity, target_lane_x)
+        started = time.perf_counter()
+        is_colliding = self.is_colliding_at_next_step_untimed(lateral_velocity, target_lane_x)
+        profiler.add_time('trajectory_prediction', time.perf_counter() - started)
+        profiler.count('trajectory_predictions')
+        return is_colliding
+
+    def is_colliding_at_next_step_untimed(self, lateral_velocity: float, target_lane_x: float) -> bool:
         dt = self.model.dt
 
 
@@ -321,47 +521,33 @@ class TrafficAgent(Agent):
             return False # No maneuver to predict
 
         # --- 1. Predict the full trajectory for the ego agent ---
-        ego_trajectory = []
-        ego_accel = self.current_drive_strategy.calculate_accel(self)
-        ego_pos = self.vehicle.position.copy()
         ego_vel = self.vehicle.velocity.copy()
-        ego_vel[0] = lateral_velocity 
-
-        # Calculate my trajectory over the enxt couple of steps
-        for _ in range(number_of_steps):
-            ego_vel[1] += ego_accel * dt
-            ego_pos += ego_vel * dt
-            ego_trajectory.append(ego_pos.copy())
-
-        my_half_width = self.vehicle.width / 2
-        my_half_length = self.vehicle.length / 2
+        ego_vel[0] = lateral_velocity
+        ego_accel = np.array([0.0, self.get_accel()])
 
         # Check against nearby agents
         check_radius = self.vehicle.length * 15 # Check for collisions within 15 car lengths
         neighbors = self.model.highway.get_neighbors(self.pos, check_radius, False)
-
-        # Check all the neighbors' trajectories for a collision
-        for neighbor in neighbors:
-            # Get all the neighbor's values 
-            n_pos = neighbor.vehicle.position.copy()
-            n_vel = neighbor.vehicle.velocity.copy()
-            n_accel = neighbor.vehicle.acceleration.copy()
-            n_half_width = neighbor.vehicle.width / 2
-            n_half_length = neighbor.vehicle.length / 2
-
-            # Simulate neighbor's trajectory and check against mine at each step -
-            for i in range(number_of_steps):
-                # Update neighbor's state for the next step
-                n_vel += n_accel * dt
-                n_pos += n_vel * dt
-
-                # Check for collision at this future step
-                ego_future_pos = ego_trajectory[i]
-                dx = abs(ego_future_pos[0] - n_pos[0])
-                dy = abs(ego_future_pos[1] - n_pos[1])
-                
-                #Did we collide
-                if dx < (my_half_width + n_half_width) and dy < (my_half_length + n_half_length):
-                    return True 
-        # No collision
-        return False 
+        if not neighbors:
+            return False
+
+        n_pos = np.array([neighbor.vehicle.position for neighbor in neighbors], dtype=float)
+        n_vel = np.array([neighbor.vehicle.velocity for neighbor in neighbors], dtype=float)
+        n_accel = np.array([neighbor.vehicle.acceleration for neighbor in neighbors], dtype=float)
+        # Sum of half widths / half lengths per neighbor, the boxes overlap when both gaps are below these
+        half_sizes = (np.array([(neighbor.vehicle.width, neighbor.vehicle.length) for neighbor in neighbors], dtype=float)
+                      + (self.vehicle.width, self.vehicle.length)) / 2
+
+        # Drop the neighbors that can't close the gap on either axis before the maneuver is over
+        reach = max_travel(n_vel - ego_vel, n_accel - ego_accel, dt, number_of_steps)
+        reachable = np.all(np.abs(n_pos - self.vehicle.position) - reach < half_sizes, axis=1)
+        if not reachable.any():
+            return False
+
+        # --- 2. Predict every remaining neighbor's trajectory at once and compare step by step ---
+        ego_trajectory = predict_positions(self.vehicle.position, ego_vel, ego_accel, dt, number_of_steps)
+        n_trajectories = predict_positions(n_pos[reachable], n_vel[reachable], n_accel[reachable], dt, number_of_steps)
+        gaps = np.abs(ego_trajectory - n_trajectories)
+
+        # Did we collide at any step
+        return bool(np.any(np.all(gaps < half_sizes[reachable][:, None, :], axis=2)))
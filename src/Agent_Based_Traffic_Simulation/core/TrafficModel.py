@@ -1,6 +1,8 @@
+import itertools
 import random
+import time
 import numpy as np
-from mesa import Model
+from mesa import Agent, Model
 
 from .Highway import Highway
 from .Personalities import DefensivePersonality, AggressivePersonality,AbstractPersonality
@@ -11,6 +13,12 @@ from typing import TYPE_CHECKING, Type
 
 
 from .TrafficAgent import TrafficAgent
+from .VectorizedEngine import VectorizedEngine
+from .DriveStrategies.BrakeStrategy import BrakeStrategy
+from .LaneChangeStrategies.LaneChangeStrategy import LaneChangeStrategy
+from .CollisionDetector import CollisionDetector
+from .DecisionScheduler import DecisionScheduler
+from .StepProfiler import StepProfiler
     
 
 
@@ -20,8 +28,17 @@ class TrafficModel(Model):
     Agents spawn on lane CENTERS coming from Highway.lanes[*].start_position[0].
     """
 
-    def __init__(self, n_agents: int, seed: int, dt: int, highway: Highway, is_generate_agents:bool = False, agent_rate:float = 0.0, percents_and_ratios:dict = None)-> None:
+    ENGINES = ("agent", "vectorized")
+
+    def __init__(self, n_agents: int, seed: int, dt: int, highway: Highway, is_generate_agents:bool = False, agent_rate:float = 0.0, percents_and_ratios:dict = None, engine: str = "agent",
+                 substep_dt: int = None, is_scheduling_decisions: bool = False, is_synchronous: bool = False, is_profiling: bool = False)-> None:
         super().__init__(seed=seed)
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
+        if substep_dt and (engine != "agent" or dt % substep_dt != 0):
+            raise ValueError(f"substep_dt needs the agent engine and has to divide dt ({dt}), got {substep_dt}")
+        if is_synchronous and (engine != "agent" or substep_dt):
+            raise ValueError("The synchronous update needs the agent engine without substep_dt")
         self.highway:Highway = highway
         self.steps: int = 0
         self.dt: int = dt
@@ -32,6 +49,45 @@ class TrafficModel(Model):
         # self.aggressive_percent = aggressive_pct
         self.percents_and_ratios:dict = percents_and_ratios
 
+        # "agent" steps every TrafficAgent on its own, "vectorized" runs the longitudinal dynamics in one batched pass
+        self.engine: str = engine
+        self.vectorized_engine: VectorizedEngine = VectorizedEngine(self) if engine == "vectorized" else None
+
+        # Multi-rate stepping: agents near an interaction take dt / substep_dt steps of substep_dt, the rest one step of dt
+        self.substep_dt: int = substep_dt if substep_dt and substep_dt < dt else None
+        self.substep_headway: float = 1500 # ms, a lead closer than this many ms at my speed is near
+        self.substep_ttc: float = 5000 # ms, closing in on the lead faster than this is near
+        self.substepped_agent_steps: int = 0
+        self.coarse_agent_steps: int = 0
+
+        # With a decision scheduler agents evaluate lane changes once every decision_time, and only the due ones
+        # are visited. Without it they evaluate on every tick once decision_time has passed since their last
+        # drive strategy change
+        self.decision_scheduler: DecisionScheduler = DecisionScheduler(dt) if is_scheduling_decisions else None
+        self.due_agents: list[TrafficAgent] = []
+
+        # Synchronous update: every agent reads the others as they were at the start of the tick (see step_synchronous)
+        self.is_synchronous: bool = is_synchronous
+
+        # Per phase timings and counters of every step, None when off so the checks along the hot path stay cheap
+        self.profiler: StepProfiler = StepProfiler() if is_profiling else None
+
+        # Read only copies of agents a neighboring shard owns (ShardedTrafficModel), lookups see them but they are never stepped
+        self.ghost_agents: list[TrafficAgent] = []
+
+        # Collisions are detected at most once per step and shared by every caller
+        self.collision_detector: CollisionDetector = CollisionDetector(self)
+        self.collisions: list[tuple[TrafficAgent, TrafficAgent]] = []
+        self.collisions_step: int = None
+
+        # Bumped whenever an agent moves, spawns or leaves, agents keep per tick lookups (lead/gap) until it changes
+        self.kinematics_epoch: int = 0
+        self.cache_hits: dict[str, int] = {'speed': 0, 'lead': 0, 'accel': 0}
+        self.cache_misses: dict[str, int] = {'speed': 0, 'lead': 0, 'accel': 0}
+
+        # Running totals of agents that entered and left the highway
+        self.spawned_agents: int = 0
+        self.removed_agents: int = 0
 
         # Congestion management
         self.initial_accelerate_time:int = 500 #ms
@@ -45,6 +101,8 @@ class TrafficModel(Model):
         self.highway.place_agent(agent, tuple(agent.vehicle.position))
         self.agents.add(agent)
         self.last_agent: TrafficAgent = agent
+        if self.vectorized_engine:
+            self.vectorized_engine.add(agent)
 
         if(n_agents == 0):
             return
@@ -71,6 +129,8 @@ class TrafficModel(Model):
             # Place once in the space
             self.highway.place_agent(agent, tuple(agent.vehicle.position))
             self.agents.add(agent)
+            if self.vectorized_engine:
+                self.vectorized_engine.add(agent)
 
         # After populating, find the actual last agent in each lane
         last_in_lane_list = []
@@ -81,16 +141,61 @@ class TrafficModel(Model):
             else:
                 last_in_lane_list.append(None)
         self.last_in_lane = last_in_lane_list
+        self.highway.update_lane_index(self.agents)
+
 
 
+    def __getstate__(self) -> dict:
+        # Mesa wraps step() in an instance attribute, rebuild the wrapper instead of pickling bound methods
+        state = self.__dict__.copy()
+        state.pop('step', None)
+        state.pop('_user_step', None)
+        # Mesa hands out unique_ids from a class level counter per model, carry its position over
+        next_id = next(Agent._ids[self])
+        Agent._ids[self] = itertools.count(next_id)
+        state['next_agent_id'] = next_id
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        next_id = state.pop('next_agent_id')
+        self.__dict__.update(state)
+        self._user_step = self.step
+        self.step = self._wrapped_step
+        Agent._ids[self] = itertools.count(next_id)
 
     def step(self)->None:
-        self.agents.do("step")
+        profiler = self.profiler
+        if profiler:
+            profiler.begin_step()
+            step_started = started = time.perf_counter()
+            lookups_before = (self.highway.neighbor_queries, self.highway.neighbor_candidates, self.cache_misses['lead'])
+
+        # Leader/follower lookups during this step bisect the per-lane index instead of scanning a radius
+        self.highway.update_lane_index(itertools.chain(self.agents, self.ghost_agents), self.dt)
+        self.kinematics_epoch += 1
+        if self.decision_scheduler:
+            self.flag_due_decisions()
+        if profiler:
+            started = self.record_phase('lane_index', started)
+            profiler.count('agent_steps', len(self.agents))
+
+        if self.vectorized_engine:
+            self.vectorized_engine.step()
+        elif self.substep_dt:
+            self.step_multi_rate()
+        elif self.is_synchronous:
+            self.step_synchronous()
+        else:
+            self.agents.do("step")
         self.steps += 1
         self.total_time +=self.dt
+        if profiler:
+            started = self.record_phase('agents', started)
 
         # Safely remove agents that have been marked for removal during the previous step
         self.remove_out_of_bounds_agents()
+        if profiler:
+            started = self.record_phase('removal', started)
 
         if self.is_generate_agents and self.agent_rate > 0:            
             # Time in ms between agent spawns
@@ -103,12 +208,101 @@ class TrafficModel(Model):
                 available_lanes = [i for i in range(self.highway.lane_count) if i != self.last_agent.current_lane]
                 self.try_to_spawn_agent(available_lanes)
 
+        if profiler:
+            self.record_phase('spawning', started)
+            profiler.add_time('step', time.perf_counter() - step_started)
+            neighbor_queries, neighbor_candidates, lead_lookups = lookups_before
+            profiler.count('get_neighbors_calls', self.highway.neighbor_queries - neighbor_queries)
+            profiler.count('get_neighbors_candidates', self.highway.neighbor_candidates - neighbor_candidates)
+            profiler.count('lead_lookups', self.cache_misses['lead'] - lead_lookups)
+
+    def record_phase(self, phase: str, started: float) -> float:
+        """Book the time since `started` to `phase` in the profiler and return now, the start of the next phase."""
+        now = time.perf_counter()
+        self.profiler.add_time(phase, now - started)
+        return now
+
     
+    def flag_due_decisions(self) -> None:
+        """
+        Flag the agents whose decision is due this tick and book their next one.
+        An agent in the middle of a lane change skips this decision and is not in due_agents, a flag kept until the
+        maneuver ends would have it decide right then, off its schedule.
+        """
+        due_agents = self.decision_scheduler.pop_due(self.total_time)
+        for agent in due_agents:
+            agent.decision_due = not isinstance(agent.lane_change_strategy, LaneChangeStrategy)
+            self.decision_scheduler.schedule(agent, self.total_time + agent.decision_time)
+        self.due_agents = [agent for agent in due_agents if agent.decision_due]
+
+    def step_multi_rate(self) -> None:
+        """
+        Substep the agents that need the fine step, then move everyone else by one coarse dt.
+        The substepped ones go first so they see their free flowing neighbours where they were at the start of the tick.
+        """
+        fine, coarse = [], []
+        for agent in self.agents:
+            (fine if self.needs_substeps(agent) else coarse).append(agent)
+
+        dt = self.dt
+        self.dt = self.substep_dt # everything an agent does during its step reads model.dt
+        try:
+            for _ in range(dt // self.substep_dt):
+                for agent in fine:
+                    if not agent.is_removed:
+                        agent.step()
+        finally:
+            self.dt = dt
+        for agent in coarse:
+            agent.step()
+
+        self.substepped_agent_steps += len(fine)
+        self.coarse_agent_steps += len(coarse)
+
+    def step_synchronous(self) -> None:
+        """
+        Step every agent against the start of tick state of the others, then switch everyone to the new state at once.
+        Each agent steps on its own copy of what its neighbors read of it (TrafficAgent.step_buffered) and draws from
+        its own random stream, so the result is the same whatever order, or chunks, the agents are stepped in.
+        """
+        agents = list(self.agents)
+        for agent in agents:
+            agent.step_buffered()
+        for agent in agents:
+            agent.commit_step()
+
+        # One batched position commit, the agents did not move in the highway while stepping
+        moved = [agent for agent in agents if not agent.is_removed]
+        if moved:
+            self.highway.move_agents(moved, np.array([agent.vehicle.position for agent in moved]))
+        self.kinematics_epoch += 1
+
+    def needs_substeps(self, agent: "TrafficAgent") -> bool:
+        """Braking, changing lanes, following closely or closing in fast on the lead."""
+        if isinstance(agent.current_drive_strategy, BrakeStrategy):
+            return True
+        # A lane change paused because the agent is crawling in a jam doesn't move sideways
+        if isinstance(agent.lane_change_strategy, LaneChangeStrategy) and agent.lateral_velocity != 0.0:
+            return True
+        lead, gap = agent.find_lead_and_gap(agent.sensing_distance)
+        if lead is None:
+            return False
+        speed = agent.get_speed()
+        if gap < speed * self.substep_headway:
+            return True
+        closing_speed = speed - lead.get_speed()
+        return closing_speed > 0 and gap < closing_speed * self.substep_ttc
+
     def remove_out_of_bounds_agents(self)-> None:
         agents_to_remove = [agent for agent in self.agents if agent.is_removed]
+        if agents_to_remove:
+            self.kinematics_epoch += 1
         for agent in agents_to_remove:
             self.highway.remove_agent(agent)
             self.agents.remove(agent)
+            if self.vectorized_engine:
+                self.vectorized_engine.remove(agent)
+            self.removed_agents += 1
             # Update last_in_lane if the removed agent was the last one
             if self.last_in_lane[agent.current_lane] == agent:
                 self.last_in_lane[agent.current_lane] = None
@@ -206,29 +400,45 @@ class TrafficModel(Model):
             self.last_in_lane[lane_idx] = agent
             self.highway.place_agent(agent, tuple(agent.vehicle.position))
             self.agents.add(agent)
+            if self.vectorized_engine:
+                self.vectorized_engine.add(agent)
             self.last_generated_agent_time = self.total_time
             self.last_agent = agent
+            self.spawned_agents += 1
+            self.kinematics_epoch += 1
 
             break # Exit the loop since we successfully spawned an agent.
 
+    def cache_stats(self) -> dict:
+        """Hits, misses and hit rate of the agents' speed, lead/gap and acceleration memos."""
+        stats = {}
+        for name, hits in self.cache_hits.items():
+            total = hits + self.cache_misses[name]
+            stats[name] = {'hits': hits, 'misses': self.cache_misses[name], 'hit_rate': hits / total if total else 0.0}
+        return stats
+
+    def get_collisions(self) -> list[tuple["TrafficAgent", "TrafficAgent"]]:
+        """
+        All pairs of colliding agents for the current step, ordered by unique_id.
+        The detection runs once per step, later calls in the same step reuse the result.
+        """
+        if self.collisions_step != self.steps:
+            self.collisions = self.collision_detector.detect()
+            self.collisions_step = self.steps
+        return self.collisions
+
     def is_collision_ahead(self, agent: "TrafficAgent") -> bool:
         """
         Checks if any pair of agents in the local vicinity of the given 'agent'
         is currently colliding.
         """
-        # Get all agents in the local area, including the reference agent.
-        local_agents = self.highway.get_neighbors(agent.pos, agent.vehicle.length * 12, include_center=True)
-        local_agents = [a for a in local_agents if a.current_lane == agent.current_lane or a.lane_intent == agent.lane_intent]
-
-        if len(local_agents) < 2:
-            return False  # Not enough agents to have a collision.
-
-        num_agents = len(local_agents)
-        # Check every unique pair of agents for a potential collision.
-        for i in range(num_agents):
-            for j in range(i + 1, num_agents):
-                if(self.is_collision(local_agents[i], local_agents[j])):
-                   return True
+        radius = agent.vehicle.length * 12
+        is_local = lambda a: (a.current_lane == agent.current_lane or a.lane_intent == agent.lane_intent) and \
+            self.highway.get_distance(a.pos, agent.pos) <= radius
+
+        for agent_a, agent_b in self.get_collisions():
+            if is_local(agent_a) and is_local(agent_b):
+                return True
         return False  # No collisions detected among any pair.
 
     def is_collision(self, agent_a:"TrafficAgent", agent_b:"TrafficAgent"):
@@ -4,6 +4,8 @@
 import numpy as np
 
 EPS = 1e-9
+
+
 def to_unit(vector: np.array) -> np.array:
     if vector is None:
         return None
@@ -14,9 +16,35 @@ def to_unit(vector: np.array) -> np.array:
         return None
     return vector/magnitude
 
+
 def change_magnitude(vector: np.array, scalar: float) -> np.array:
     unit = to_unit(vector)
     # default to straight up   
     if(unit is None):
         return np.array([0.0, 1.0])
-    return unit*scalar
\ No newline at end of file
+    return unit*scalar
+
+
+def predict_positions(position: np.array, velocity: np.array, acceleration: np.array, dt: float, number_of_steps: int) -> np.array:
+    """
+    Positions after each of the next `number_of_steps` steps at constant acceleration.
+    Takes one (2,) state or a stack of them (n, 2) and returns (number_of_steps, 2) or (n, number_of_steps, 2).
+
+    The sums are accumulated in the same order as stepping `vel += accel * dt; pos += vel * dt` one step at a time
+    (cumsum adds sequentially), so the results are bit for bit the same as that loop.
+    """
+    position = np.asarray(position, dtype=float)[..., None, :]
+    velocity = np.asarray(velocity, dtype=float)[..., None, :]
+    velocity_steps = np.repeat(np.asarray(acceleration, dtype=float)[..., None, :] * dt, number_of_steps, axis=-2)
+    velocities = np.cumsum(np.concatenate((velocity, velocity_steps), axis=-2), axis=-2)[..., 1:, :]
+    return np.cumsum(np.concatenate((position, velocities * dt), axis=-2), axis=-2)[..., 1:, :]
+
+
+def max_travel(velocity: np.array, acceleration: np.array, dt: float, number_of_steps: int) -> np.array:
+    """
+    Upper bound on how far (per axis) something can move from its start in `number_of_steps` steps, for pruning.
+    Has a little slack on top so rounding can never make it too small.
+    """
+    horizon = number_of_steps * dt
+    travel = np.abs(velocity) * horizon + np.abs(acceleration) * (number_of_steps * (number_of_steps + 1) / 2) * dt * dt
+    return travel * (1 + 1e-9) + 1e-6
@@ -0,0 +1,776 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from .Utils import EPS
+from .TrafficAgent import LEAD_SEARCH_RADIUS, DRIVE_STRATEGIES
+from .DriveStrategies.CruiseStrategy import CruiseStrategy
+from .DriveStrategies.AccelerateStrategy import AccelerateStrategy
+from .DriveStrategies.BrakeStrategy import BrakeStrategy
+from .LaneChangeStrategies.LaneChangeStrategy import LaneChangeStrategy, LANE_CHANGE_DURATION
+from .LaneChangeStrategies.LaneStayStrategy import LANE_STAY_STRATEGY
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .TrafficModel import TrafficModel
+    from .TrafficAgent import TrafficAgent
+
+
+# Strategy codes used in the strategy array
+CRUISE, ACCELERATE, BRAKE = 0, 1, 2
+STRATEGY_TYPES = (CruiseStrategy, AccelerateStrategy, BrakeStrategy)
+STRATEGY_CODES = {strategy_type: code for code, strategy_type in enumerate(STRATEGY_TYPES)}
+SHARED_STRATEGIES = tuple(DRIVE_STRATEGIES[strategy_type] for strategy_type in STRATEGY_TYPES)
+
+NO_LEAD = -1
+
+
+def norm(x: float, y: float) -> float:
+    """np.linalg.norm((x, y)). Going straight is common: then it is |y| (the square root of a rounded y*y is |y|)."""
+    if x == 0.0:
+        return abs(y)
+    return float(np.linalg.norm((x, y)))
+
+
+def drive_accel(code: int, v: float, lead_speed: float, gap: float, cruise_gain: float, desired_speed: float,
+                max_acceleration: float, two_sqrt_ab: float, smallest_follow_distance: float, time_headway: float,
+                b_max: float) -> float:
+    """calculate_accel of the Cruise, Accelerate and Brake strategies on plain floats, same operations in the same order."""
+    if code == CRUISE:
+        acceleration = min(cruise_gain * (desired_speed - v), max_acceleration)
+        if acceleration <= 0 and v < EPS:
+            acceleration = 0
+        return acceleration
+    if code == ACCELERATE:
+        acceleration = min(max(cruise_gain * (desired_speed - v), 0.0), max_acceleration)
+        if v < EPS and acceleration < 0:
+            acceleration = 0.0
+        return acceleration
+
+    # BrakeStrategy (IDM)
+    if gap is None:
+        return 0.0
+    s0 = smallest_follow_distance
+    s_star = s0 + max(0.0, (v * time_headway) + (v * (v - lead_speed)) / two_sqrt_ab)
+    free_road_term = max_acceleration * (1 - (v / desired_speed) ** 4.0 if desired_speed > 0 else 1)
+    interaction_term = -max_acceleration * (s_star / max(gap, s0)) ** 2
+    if gap < s0:
+        acceleration = -b_max
+    else:
+        acceleration = min(max(free_road_term + interaction_term, -b_max), 0.0)
+    if v < EPS and acceleration < 0.0:
+        acceleration = 0.0
+    return acceleration
+
+
+class VectorizedEngine:
+    """
+    Structure-of-arrays step engine, stepping all agents in one go instead of one TrafficAgent.step at a time.
+
+    Positions, velocities, accelerations and personality parameters of every agent live in contiguous
+    NumPy arrays, one row per agent. Each vehicle's position/velocity/acceleration are views into those rows,
+    so the rest of the code (lane change strategies, logger, front end) keeps reading agent.vehicle as before.
+
+    A tick ends exactly where stepping every agent in creation order ends, down to the last bit
+    (benchmarks/check_engines.py compares the two engines):
+    - sweep senses, drives and moves the agents in that order, on plain floats and with the same operations as
+      TrafficAgent and the DriveStrategies. Only agents in the middle of a lane change run their LaneChangeStrategy
+      object on the way.
+    - decide_lane_changes makes the MOBIL decisions of the agents that were due, all at once. A decision doesn't
+      change how the deciding agent moves in the tick it is made, so it can wait until everyone moved, as long as it
+      reads each neighbor as the decider would have seen it: already moved if it comes earlier in the order, else
+      as it was at the start of the tick. The random draws are then taken in creation order, like the agents do.
+    Leads, gaps and decision timers are only kept here, sync_agents writes them back onto the agents.
+    """
+
+    def __init__(self, model: "TrafficModel", capacity: int = 1024) -> None:
+        self.model: "TrafficModel" = model
+        self.count: int = 0
+        self.agents: list["TrafficAgent"] = []
+        self.slot_of: dict["TrafficAgent", int] = {}
+        # Each agent's lead and gap to it, as the agents would have them (None, None without a lead)
+        self.leads: list["TrafficAgent"] = []
+        self.gaps: list[float] = []
+        self._allocate(max(1, capacity))
+
+    # ---------- storage ----------
+    def _allocate(self, capacity: int) -> None:
+        old_count = self.count
+        old = self.__dict__.copy()
+        self.capacity: int = capacity
+
+        # dynamic state (mm, mm/ms, mm/ms^2)
+        self.position: np.ndarray = np.zeros((capacity, 2), dtype=float)
+        self.velocity: np.ndarray = np.zeros((capacity, 2), dtype=float)
+        self.acceleration: np.ndarray = np.zeros((capacity, 2), dtype=float)
+        self.strategy: np.ndarray = np.zeros(capacity, dtype=np.int8)
+        self.internal_timer: np.ndarray = np.zeros(capacity, dtype=float)
+        self.decision_due: np.ndarray = np.zeros(capacity, dtype=bool)
+        self.current_lane: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self.is_lane_changing: np.ndarray = np.zeros(capacity, dtype=bool)
+
+        # static per agent parameters (personality + vehicle)
+        self.length: np.ndarray = np.zeros(capacity, dtype=float)
+        self.width: np.ndarray = np.zeros(capacity, dtype=float)
+        self.max_speed: np.ndarray = np.zeros(capacity, dtype=float)
+        self.desired_speed: np.ndarray = np.zeros(capacity, dtype=float)
+        self.sensing_distance: np.ndarray = np.zeros(capacity, dtype=float)
+        self.sensing_distance_squared: np.ndarray = np.zeros(capacity, dtype=float)
+        self.lead_search_rings: np.ndarray = np.zeros(capacity, dtype=np.int64) # radii of the lead search, see sweep
+        self.max_acceleration: np.ndarray = np.zeros(capacity, dtype=float)
+        self.cruise_gain: np.ndarray = np.zeros(capacity, dtype=float)
+        self.braking_comfortable: np.ndarray = np.zeros(capacity, dtype=float)
+        self.b_max: np.ndarray = np.zeros(capacity, dtype=float)
+        self.desired_time_headway: np.ndarray = np.zeros(capacity, dtype=float)
+        self.smallest_follow_distance: np.ndarray = np.zeros(capacity, dtype=float)
+        self.desired_gap: np.ndarray = np.zeros(capacity, dtype=float)
+        self.politeness_factor: np.ndarray = np.zeros(capacity, dtype=float)
+        self.lane_change_threshold: np.ndarray = np.zeros(capacity, dtype=float)
+        self.decision_time: np.ndarray = np.zeros(capacity, dtype=float)
+        self.spawn_time: np.ndarray = np.zeros(capacity, dtype=float)
+        self.unique_id: np.ndarray = np.zeros(capacity, dtype=np.int64) # creation order, the per agent engine's step order
+
+        if old_count == 0:
+            return
+        for name, value in old.items():
+            if isinstance(value, np.ndarray):
+                getattr(self, name)[:old_count] = value[:old_count]
+        self.bind_vehicles()
+
+    def _bind_vehicle(self, slot: int) -> None:
+        vehicle = self.agents[slot].vehicle
+        vehicle.position = self.position[slot]
+        vehicle.velocity = self.velocity[slot]
+        vehicle.acceleration = self.acceleration[slot]
+
+    def bind_vehicles(self) -> None:
+        """Point every vehicle back at its rows, e.g. after unpickling (pickle does not keep views)."""
+        for slot in range(self.count):
+            self._bind_vehicle(slot)
+
+    def add(self, agent: "TrafficAgent") -> None:
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        slot = self.count
+        self.count += 1
+        self.agents.append(agent)
+        self.slot_of[agent] = slot
+        self.leads.append(agent.lead)
+        self.gaps.append(agent.gap_to_lead)
+
+        vehicle = agent.vehicle
+        self.position[slot] = vehicle.position
+        self.velocity[slot] = vehicle.velocity
+        self.acceleration[slot] = vehicle.acceleration
+        self.strategy[slot] = STRATEGY_CODES[type(agent.current_drive_strategy)]
+        self.internal_timer[slot] = agent.internal_timer
+        self.decision_due[slot] = agent.decision_due
+        self.current_lane[slot] = agent.current_lane
+        self.is_lane_changing[slot] = isinstance(agent.lane_change_strategy, LaneChangeStrategy)
+
+        self.length[slot] = vehicle.length
+        self.width[slot] = vehicle.width
+        self.max_speed[slot] = agent.max_speed
+        self.desired_speed[slot] = agent.desired_speed
+        self.sensing_distance[slot] = agent.sensing_distance
+        self.sensing_distance_squared[slot] = agent.sensing_distance ** 2
+        rings = 0
+        while LEAD_SEARCH_RADIUS * 2 ** rings < agent.sensing_distance:
+            rings += 1
+        self.lead_search_rings[slot] = rings
+        self.max_acceleration[slot] = agent.max_acceleration
+        self.cruise_gain[slot] = agent.cruise_gain
+        self.braking_comfortable[slot] = agent.braking_comfortable
+        self.b_max[slot] = agent.b_max
+        self.desired_time_headway[slot] = agent.desired_time_headway
+        self.smallest_follow_distance[slot] = agent.smallest_follow_distance
+        self.desired_gap[slot] = agent.desired_gap
+        self.politeness_factor[slot] = agent.politeness_factor
+        self.lane_change_threshold[slot] = agent.lane_change_threshold
+        self.decision_time[slot] = agent.decision_time
+        self.spawn_time[slot] = agent.spawn_time
+        self.unique_id[slot] = agent.unique_id
+        self._bind_vehicle(slot)
+
+    def remove(self, agent: "TrafficAgent") -> None:
+        slot = self.slot_of.pop(agent)
+        vehicle = agent.vehicle
+        # Detach the removed vehicle from the shared rows before they get reused
+        vehicle.position = self.position[slot].copy()
+        vehicle.velocity = self.velocity[slot].copy()
+        vehicle.acceleration = self.acceleration[slot].copy()
+        self.sync_agent(slot)
+
+        last = self.count - 1
+        if slot != last:
+            # Move the last row into the freed slot
+            for value in self.__dict__.values():
+                if isinstance(value, np.ndarray):
+                    value[slot] = value[last]
+            moved = self.agents[last]
+            self.agents[slot] = moved
+            self.leads[slot] = self.leads[last]
+            self.gaps[slot] = self.gaps[last]
+            self.slot_of[moved] = slot
+            self._bind_vehicle(slot)
+        self.agents.pop()
+        self.leads.pop()
+        self.gaps.pop()
+        self.count -= 1
+
+    def sync_agent(self, slot: int) -> None:
+        agent = self.agents[slot]
+        agent.lead = self.leads[slot]
+        agent.gap_to_lead = self.gaps[slot]
+        agent.internal_timer = float(self.internal_timer[slot])
+        agent.decision_due = bool(self.decision_due[slot])
+
+    def sync_agents(self) -> None:
+        """Write the state only the engine keeps up to date (leads, gaps, decision timers) back onto the agent objects."""
+        for slot in range(self.count):
+            self.sync_agent(slot)
+
+    # ---------- tick ----------
+    def step(self) -> None:
+        model = self.model
+        n = self.count
+        if n == 0:
+            return
+
+        # Step order: creation order, like model.agents
+        order = np.argsort(self.unique_id[:n], kind="stable")
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+
+        # The start of tick state, the decisions read it for agents that step after the decider
+        start_position = self.position[:n].copy()
+        start_velocity = self.velocity[:n].copy()
+        start_strategy = self.strategy[:n].copy()
+        start_leads = list(self.leads)
+        start_gaps = list(self.gaps)
+
+        # Who makes a lane change decision this tick: agents staying in their lane whose decision is due
+        timer = self.internal_timer[:n]
+        if model.decision_scheduler:
+            # Flags only last for the tick they are due in, model.due_agents leaves out the agents changing lanes
+            is_due = np.zeros(n, dtype=bool)
+            is_due[[self.slot_of[agent] for agent in model.due_agents]] = True
+            self.decision_due[:n] = is_due
+        else:
+            is_due = timer >= self.decision_time[:n]
+        deciding = np.flatnonzero(is_due & ~self.is_lane_changing[:n])
+
+        speed, lead_slots, drive_accels, is_outside = self.sweep(order)
+        self.decide_lane_changes(deciding, rank, start_position, start_velocity, start_strategy, start_leads, start_gaps,
+                                 speed, lead_slots, drive_accels, is_outside)
+
+        # --- decision timers ---
+        inside = ~is_outside
+        changed_strategy = self.strategy[:n] != start_strategy
+        timer[inside & changed_strategy] = -1
+        timer[inside] += model.dt
+
+    def sweep(self, order: np.ndarray) -> tuple[list, list, list, np.ndarray]:
+        """
+        TrafficAgent.step for every agent in `order`, except the lane change decisions (see decide_lane_changes).
+        Works on lists of plain floats and writes them into the arrays, and the highway, when a lane changing agent
+        needs the others' live state and at the end.
+        Returns the speeds at the end of the tick, the leads' slots, the drive accelerations and who left the highway.
+        """
+        model = self.model
+        highway = model.highway
+        dt = model.dt
+        n = self.count
+        agents = self.agents
+        slot_of = self.slot_of
+        position = self.position
+        velocity = self.velocity
+        acceleration = self.acceleration
+
+        # dynamic state: x, y is the vehicle position, px, py the position in the highway (what agent.pos reads),
+        # which stays put for agents that left it
+        x = position[:n, 0].tolist()
+        y = position[:n, 1].tolist()
+        px = list(x)
+        py = list(y)
+        vx = velocity[:n, 0].tolist()
+        vy = velocity[:n, 1].tolist()
+        ax = [0.0] * n
+        ay = [0.0] * n
+        speed = [norm(vx_, vy_) for vx_, vy_ in zip(vx, vy)]
+        strategy = self.strategy[:n].tolist()
+        lane = self.current_lane[:n].tolist()
+        is_lane_changing = self.is_lane_changing[:n].tolist()
+        lead_slots = [NO_LEAD] * n
+        gaps = self.gaps
+        drive_accels = [0.0] * n
+        is_outside = [False] * n
+
+        # static parameters
+        length = self.length[:n].tolist()
+        max_speed = self.max_speed[:n].tolist()
+        desired_speed = self.desired_speed[:n].tolist()
+        lead_search_rings = self.lead_search_rings[:n].tolist()
+        max_acceleration = self.max_acceleration[:n].tolist()
+        cruise_gain = self.cruise_gain[:n].tolist()
+        b_max = self.b_max[:n].tolist()
+        smallest_follow_distance = self.smallest_follow_distance[:n].tolist()
+        desired_gap = self.desired_gap[:n].tolist()
+        spawn_time = self.spawn_time[:n].tolist()
+        time_headway = (self.desired_time_headway[:n] / 1000.0).tolist()
+        two_sqrt_ab = (2 * np.sqrt(self.max_acceleration[:n] * self.braking_comfortable[:n])).tolist()
+        desired_time_headway = self.desired_time_headway[:n].tolist()
+        total_time = model.total_time
+        initial_accelerate_time = model.initial_accelerate_time
+
+        # The highway's lane index, as slots
+        index_positions = highway.lane_index_positions
+        index_slots = [[slot_of[agent] for agent in lane_agents] for lane_agents in highway.lane_index_agents]
+        slack = highway.lane_index_slack
+        lane_centers = [float(lane.start_position[0]) for lane in highway.lanes]
+        lane_bands = [lane.lane_width * 0.80 for lane in highway.lanes]
+        x_min, x_max, y_min, y_max = highway.x_min, highway.x_max, highway.y_min, highway.y_max
+        has_others = n > 1
+
+        # TrafficAgent.find_lead_and_gap searches rings of radius 10 m, 20 m, 40 m... below the sensing distance
+        ring_radii = [(LEAD_SEARCH_RADIUS * 2 ** ring) ** 2 for ring in range(max(lead_search_rings, default=0))]
+
+        committed = []
+        def commit() -> None:
+            """Write the agents stepped since the last commit into the arrays and the highway."""
+            if len(committed) < 32:
+                # Row by row is cheaper than the batched writes for a few
+                for slot in committed:
+                    position[slot] = x[slot], y[slot]
+                    velocity[slot] = vx[slot], vy[slot]
+                    agents[slot].velocity_version += 1
+                    acceleration[slot] = ax[slot], ay[slot]
+                    if not is_outside[slot]:
+                        highway.move_agent(agents[slot], (x[slot], y[slot]))
+                model.kinematics_epoch += 1
+                committed.clear()
+                return
+            slots = np.array(committed)
+            position[slots] = [(x[slot], y[slot]) for slot in committed]
+            velocity[slots] = [(vx[slot], vy[slot]) for slot in committed]
+            for slot in committed:
+                agents[slot].velocity_version += 1
+            acceleration[slots] = [(ax[slot], ay[slot]) for slot in committed]
+            moved = [slot for slot in committed if not is_outside[slot]]
+            highway.move_agents([agents[slot] for slot in moved], position[moved])
+            model.kinematics_epoch += 1
+            committed.clear()
+
+        for i in order.tolist():
+            # --- sense: TrafficAgent.find_lead_and_gap ---
+            xi = px[i]
+            yi = py[i]
+            current_lane = lane[i]
+            lead = NO_LEAD
+            rings = lead_search_rings[i]
+            if has_others and rings:
+                radii = ring_radii[:rings]
+                positions = index_positions[current_lane]
+                start = bisect_left(positions, yi - slack)
+                end = bisect_right(positions, yi + LEAD_SEARCH_RADIUS * 2 ** (rings - 1), start)
+                center = lane_centers[current_lane]
+                band = lane_bands[current_lane]
+                lead_ring = lead_y = None
+                for other in index_slots[current_lane][start:end]:
+                    other_y = py[other]
+                    if other_y <= yi:
+                        continue
+                    dx = px[other] - xi
+                    dy = other_y - yi
+                    distance_squared = dx * dx + dy * dy
+                    for ring, radius_squared in enumerate(radii):
+                        if distance_squared <= radius_squared:
+                            break
+                    else:
+                        continue
+                    if (lead_ring is None or (ring, other_y) < (lead_ring, lead_y)) and abs(x[other] - center) < band:
+                        lead, lead_ring, lead_y = other, ring, other_y
+
+            # --- choose drive strategy ---
+            v_now = speed[i]
+            gap = None
+            lead_speed = 0.0
+            if lead != NO_LEAD:
+                gap = (py[lead] - length[lead] / 2) - (yi + length[i] / 2)
+                lead_speed = speed[lead]
+            if lead == NO_LEAD or spawn_time[i] + initial_accelerate_time > total_time:
+                code = CRUISE
+            else:
+                closing_speed = v_now - lead_speed
+                safe_dist = smallest_follow_distance[i] + max(0.0, (v_now * desired_time_headway[i] / 1000.0) + (v_now * closing_speed) / two_sqrt_ab[i])
+                if v_now < 15:
+                    is_uncomfortable = closing_speed > 10
+                elif v_now < 25:
+                    is_uncomfortable = closing_speed > 13
+                elif v_now < 45:
+                    is_uncomfortable = closing_speed > 15
+                elif v_now < 65:
+                    is_uncomfortable = closing_speed > 20
+                else:
+                    is_uncomfortable = closing_speed > 25
+                if gap < safe_dist or is_uncomfortable:
+                    code = BRAKE
+                elif gap < desired_gap[i]:
+                    code = CRUISE
+                else:
+                    code = ACCELERATE
+            lead_slots[i] = lead
+            gaps[i] = gap
+            previous_code = strategy[i]
+            if code != previous_code:
+                strategy[i] = code
+                agents[i].current_drive_strategy = SHARED_STRATEGIES[code]
+
+            # --- do drive strategy: acceleration along the heading ---
+            parameters = (cruise_gain[i], desired_speed[i], max_acceleration[i], two_sqrt_ab[i], smallest_follow_distance[i], time_headway[i], b_max[i])
+            a_cmd = drive_accel(code, v_now, lead_speed, gap, *parameters)
+            drive_accels[i] = a_cmd
+            if v_now > EPS:
+                ax[i] = vx[i] / v_now * a_cmd
+                ay[i] = vy[i] / v_now * a_cmd
+            else:
+                ax[i] = 0.0 * a_cmd
+                ay[i] = 1.0 * a_cmd
+
+            # --- lane change: only a maneuver in progress, the decisions come after the sweep ---
+            lateral_velocity = 0.0
+            if is_lane_changing[i]:
+                # It reads the others' live state and my lead
+                commit()
+                agent = agents[i]
+                agent.lead = agents[lead] if lead != NO_LEAD else None
+                agent.gap_to_lead = gap
+                agent.lane_change_strategy.step(agent)
+                lateral_velocity = float(agent.lateral_velocity)
+                x[i] = float(position[i, 0])
+                lane[i] = agent.current_lane
+                is_lane_changing[i] = isinstance(agent.lane_change_strategy, LaneChangeStrategy)
+
+            # --- longitudinal update with the post lane change speed ---
+            new_vx = lateral_velocity
+            new_vy = vy[i]
+            if new_vx != vx[i]:
+                a_cmd = drive_accel(code, norm(new_vx, new_vy), lead_speed, gap, *parameters)
+            new_vy += a_cmd * dt
+
+            # Make sure the vehicle does not go backwards
+            if (new_vx < 0 or new_vy < 0) and not new_vy > 0:
+                new_vy = 0.0
+
+            new_speed = norm(new_vx, new_vy)
+            if new_speed > max_speed[i]:
+                new_vx = new_vx / new_speed * max_speed[i]
+                new_vy = new_vy / new_speed * max_speed[i]
+                new_speed = norm(new_vx, new_vy)
+            vx[i] = new_vx
+            vy[i] = new_vy
+            speed[i] = new_speed
+            new_x = x[i] + new_vx * dt
+            new_y = y[i] + new_vy * dt
+            x[i] = new_x
+            y[i] = new_y
+            committed.append(i)
+
+            # --- out of bounds agents are marked for removal and not moved in the highway ---
+            if new_x >= x_max or new_x <= x_min or new_y >= y_max or new_y <= y_min:
+                is_outside[i] = True
+                agents[i].remove_self()
+                continue
+            if code != previous_code and model.decision_scheduler:
+                agents[i].restart_decision_timer()
+                self.decision_due[i] = False
+            px[i] = new_x
+            py[i] = new_y
+
+        commit()
+        self.strategy[:n] = strategy
+        self.current_lane[:n] = lane
+        self.is_lane_changing[:n] = is_lane_changing
+        table = agents + [None] # NO_LEAD is -1, the None
+        self.leads = [table[lead] for lead in lead_slots]
+        return speed, lead_slots, drive_accels, np.array(is_outside, dtype=bool)
+
+    # ---------- lane change decisions ----------
+    def decide_lane_changes(self, deciding: np.ndarray, rank: np.ndarray, start_position: np.ndarray, start_velocity: np.ndarray,
+                            start_strategy: np.ndarray, start_leads: list, start_gaps: list, speed: list, lead_slots: list,
+                            drive_accels: list, is_outside: np.ndarray) -> None:
+        """
+        LaneStayStrategy.step (MOBIL) for the `deciding` slots, batched. Everything a decider reads of another agent
+        is the state after that agent's step if it comes before the decider, else the start of tick state,
+        see neighbor_view.
+        """
+        if len(deciding) == 0:
+            return
+        model = self.model
+        if model.profiler:
+            model.profiler.count('lane_change_evaluations', len(deciding))
+        self.decision_due[deciding] = False
+        n = self.count
+        highway = model.highway
+        lane_count = len(highway.lanes)
+
+        # Both versions of everyone. Agents that left the highway keep their start of tick highway position
+        end_position = self.position[:n]
+        end_pos = np.where(is_outside[:, None], start_position, end_position)
+        end_velocity = self.velocity[:n]
+        end_speed = np.array(speed, dtype=float)
+        start_speed = np.abs(start_velocity[:, 1])
+        for slot in np.flatnonzero(start_velocity[:, 0] != 0.0).tolist():
+            start_speed[slot] = norm(start_velocity[slot, 0], start_velocity[slot, 1])
+        end_strategy = self.strategy[:n]
+        slot_of = self.slot_of
+
+        def neighbor_view(viewer: np.ndarray, other: np.ndarray, end: np.ndarray, start: np.ndarray) -> np.ndarray:
+            """`end` or `start` rows of `other`, depending on whether it stepped before `viewer`."""
+            has_stepped = rank[other] < rank[viewer]
+            if end.ndim == 2:
+                has_stepped = has_stepped[:, None]
+            return np.where(has_stepped, end[other], start[other])
+
+        def accels(slots: np.ndarray, codes: np.ndarray, v: np.ndarray, lead_speed: np.ndarray, gap: np.ndarray, has_lead: np.ndarray) -> np.ndarray:
+            """drive_accel for every row."""
+            cruise_gain = self.cruise_gain[slots]
+            desired_speed = self.desired_speed[slots]
+            max_acceleration = self.max_acceleration[slots]
+            acceleration_raw = cruise_gain * (desired_speed - v)
+            cruise = np.minimum(acceleration_raw, max_acceleration)
+            cruise[(cruise <= 0) & (v < EPS)] = 0.0
+            result = np.where(codes == ACCELERATE, np.clip(acceleration_raw, 0.0, max_acceleration), cruise)
+            for row in np.flatnonzero(codes == BRAKE).tolist():
+                slot = slots[row]
+                result[row] = drive_accel(BRAKE, float(v[row]), float(lead_speed[row]), float(gap[row]) if has_lead[row] else None,
+                                          0.0, float(desired_speed[row]), float(max_acceleration[row]),
+                                          float(2 * np.sqrt(self.max_acceleration[slot] * self.braking_comfortable[slot])),
+                                          float(self.smallest_follow_distance[slot]), float(self.desired_time_headway[slot] / 1000.0),
+                                          float(self.b_max[slot]))
+            return result
+
+        # --- the lanes to look at: left and right of the current one ---
+        ego = np.repeat(deciding, 2)
+        target_lane = self.current_lane[ego] + np.tile([-1, 1], len(deciding))
+        valid = (target_lane >= 0) & (target_lane < lane_count)
+        ego = ego[valid]
+        target_lane = target_lane[valid]
+        is_left = np.tile([True, False], len(deciding))[valid]
+
+        ego_x = start_position[ego, 0]
+        ego_y = start_position[ego, 1]
+        ego_length = self.length[ego]
+        ego_speed = start_speed[ego]
+        ego_strategy = end_strategy[ego]
+
+        # --- new neighbors in the target lanes, and the leader in the lane I intend to be in for the trajectory check ---
+        leader = self.find_neighbors(ego, target_lane, rank, start_position, end_pos, ahead=True)
+        follower = self.find_neighbors(ego, target_lane, rank, start_position, end_pos, ahead=False)
+        lane_intent = np.array([self.agents[slot].lane_intent for slot in deciding.tolist()], dtype=np.int64)
+        intent_leader = self.find_neighbors(deciding, lane_intent, rank, start_position, end_pos, ahead=True)
+        intent_leader = intent_leader[np.searchsorted(deciding, ego)]
+        intent_lane = lane_intent[np.searchsorted(deciding, ego)]
+
+        def potential_accel(new_leader: np.ndarray) -> np.ndarray:
+            """LaneStayStrategy.get_potential_accel: my acceleration behind `new_leader` (NO_LEAD for none)."""
+            has_leader = new_leader != NO_LEAD
+            leader_slot = np.where(has_leader, new_leader, 0)
+            leader_y = neighbor_view(ego, leader_slot, end_pos[:, 1], start_position[:, 1])
+            gap = (leader_y - self.length[leader_slot] / 2) - (ego_y + ego_length / 2)
+            leader_speed = neighbor_view(ego, leader_slot, end_speed, start_speed)
+            return accels(ego, ego_strategy, ego_speed, leader_speed, gap, has_leader)
+
+        # --- the new follower: its acceleration behind me and with its current lead ---
+        has_follower = follower != NO_LEAD
+        follower_slot = np.where(has_follower, follower, 0)
+        follower_pos_y = neighbor_view(ego, follower_slot, end_pos[:, 1], start_position[:, 1])
+        follower_position = neighbor_view(ego, follower_slot, end_position, start_position)
+        follower_velocity = neighbor_view(ego, follower_slot, end_velocity, start_velocity)
+        follower_speed = neighbor_view(ego, follower_slot, end_speed, start_speed)
+        follower_strategy = neighbor_view(ego, follower_slot, end_strategy, start_strategy)
+        follower_length = self.length[follower_slot]
+        gap_behind_me = (ego_y - ego_length / 2) - (follower_pos_y + follower_length / 2)
+        accel_new_follower = accels(follower_slot, follower_strategy, follower_speed, ego_speed, gap_behind_me, np.ones(len(ego), dtype=bool))
+
+        # What the follower published as its lead and gap, this tick's if it stepped before me, else last tick's
+        current_lead_speed = np.zeros(len(ego))
+        current_gap = np.zeros(len(ego))
+        current_has_lead = np.zeros(len(ego), dtype=bool)
+        for row in np.flatnonzero(has_follower).tolist():
+            viewer = ego[row]
+            slot = follower_slot[row]
+            if rank[slot] < rank[viewer]:
+                lead, gap = lead_slots[slot], self.gaps[slot]
+                lead_agent = None
+            else:
+                lead_agent, gap = start_leads[slot], start_gaps[slot]
+                lead = slot_of.get(lead_agent, NO_LEAD) if lead_agent is not None else NO_LEAD
+            if gap is None:
+                continue
+            current_has_lead[row] = True
+            current_gap[row] = gap
+            if lead != NO_LEAD:
+                current_lead_speed[row] = speed[lead] if rank[lead] < rank[viewer] else start_speed[lead]
+            else:
+                # Left the highway last tick, its vehicle keeps its last velocity
+                current_lead_speed[row] = norm(*lead_agent.vehicle.velocity.tolist())
+        accel_follower_current = accels(follower_slot, follower_strategy, follower_speed, current_lead_speed, current_gap, current_has_lead)
+
+        # --- safety: the follower doesn't have to brake too hard, and our trajectories don't cross ---
+        is_safe = ~has_follower
+        needs_trajectory = has_follower & (accel_new_follower >= -self.braking_comfortable[follower_slot])
+        if needs_trajectory.any():
+            rows = np.flatnonzero(needs_trajectory)
+            is_safe[rows] = self.is_trajectory_safe(
+                ego[rows], start_position[ego[rows]], start_velocity[ego[rows]], intent_lane[rows],
+                potential_accel(intent_leader)[rows], follower_slot[rows], follower_position[rows], follower_velocity[rows],
+                accel_new_follower[rows]
+            )
+
+        # --- incentive ---
+        my_gain = potential_accel(leader) - np.array(drive_accels)[ego]
+        follower_loss = np.where(has_follower, accel_follower_current - accel_new_follower, 0.0)
+        incentive = my_gain - (self.politeness_factor[ego] * follower_loss)
+        is_better = incentive > self.lane_change_threshold[ego]
+
+        # --- decide, in step order because of the random draws ---
+        rows_of = {}
+        for row, slot in enumerate(ego.tolist()):
+            rows_of.setdefault(slot, []).append(row)
+        random_lane_change_percent = LANE_STAY_STRATEGY.random_lane_change_percent
+        for slot in deciding[np.argsort(rank[deciding], kind="stable")].tolist():
+            agent = self.agents[slot]
+            safe_lanes = []
+            gains = {}
+            best_gain = -np.inf
+            best_target_lane = -1
+            for row in rows_of.get(slot, ()):
+                if not is_safe[row]:
+                    continue
+                target = int(target_lane[row])
+                safe_lanes.append(target)
+                gain = float(my_gain[row])
+                if is_better[row] and gain > best_gain:
+                    best_gain = gain
+                    best_target_lane = target
+                gains[target] = gain * 1.2 if is_left[row] else gain
+
+            rng = agent.get_rng()
+            if len(safe_lanes) > 0 and rng.random() < random_lane_change_percent:
+                best_target_lane = safe_lanes[rng.randint(0, len(safe_lanes) - 1)]
+            elif best_target_lane != -1:
+                best_target_lane = max(gains, key=gains.get)
+            else:
+                continue
+            LANE_STAY_STRATEGY.begin_lane_change(agent, best_target_lane)
+            self.is_lane_changing[slot] = True
+
+    def find_neighbors(self, ego: np.ndarray, lane: np.ndarray, rank: np.ndarray, start_pos: np.ndarray, end_pos: np.ndarray,
+                       ahead: bool) -> np.ndarray:
+        """
+        TrafficAgent.find_neighbors_in_lane for every (ego, lane) pair at once: the slot of the agent nearest ahead
+        (or behind) of ego in `lane` that is partly in the lane and within ego's sensing distance, NO_LEAD if none.
+        Candidates come from the same Highway.agents_between windows and ties go to the first one in the window.
+        """
+        highway = self.model.highway
+        result = np.full(len(ego), NO_LEAD, dtype=np.int64)
+        if self.count <= 1 or len(ego) == 0:
+            return result
+        y = start_pos[ego, 1]
+        x = start_pos[ego, 0]
+        sense = self.sensing_distance[ego]
+        slack = highway.lane_index_slack
+
+        # Window of each query in the concatenated lane index
+        index_slots = np.array([self.slot_of[agent] for lane_agents in highway.lane_index_agents for agent in lane_agents], dtype=np.int64)
+        lane_sizes = [len(positions) for positions in highway.lane_index_positions]
+        lane_offsets = np.concatenate(([0], np.cumsum(lane_sizes)))
+        first = np.zeros(len(ego), dtype=np.int64)
+        last = np.zeros(len(ego), dtype=np.int64)
+        for lane_idx, positions in enumerate(highway.lane_index_positions):
+            rows = np.flatnonzero(lane == lane_idx)
+            if len(rows) == 0 or not positions:
+                continue
+            positions = np.asarray(positions, dtype=float)
+            if ahead:
+                low, high = y[rows] - slack, y[rows] + sense[rows]
+            else:
+                low, high = (y[rows] - sense[rows]) - slack, y[rows]
+            start = np.searchsorted(positions, low, side="left")
+            end = np.maximum(np.searchsorted(positions, high, side="right"), start)
+            first[rows] = start + lane_offsets[lane_idx]
+            last[rows] = end + lane_offsets[lane_idx]
+
+        counts = last - first
+        total = int(counts.sum())
+        if total == 0:
+            return result
+        query = np.repeat(np.arange(len(ego)), counts)
+        index = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + first[query]
+        candidate = index_slots[index]
+        has_stepped = rank[candidate] < rank[ego[query]]
+        candidate_x = np.where(has_stepped, end_pos[candidate, 0], start_pos[candidate, 0])
+        candidate_y = np.where(has_stepped, end_pos[candidate, 1], start_pos[candidate, 1])
+
+        # Partly in the lane and within my sensing distance
+        lane_center = np.array([lane.start_position[0] for lane in highway.lanes], dtype=float)[lane[query]]
+        lane_width = np.array([lane.lane_width for lane in highway.lanes], dtype=float)[lane[query]]
+        half_width = self.width[candidate] / 2
+        dx = candidate_x - x[query]
+        dy = candidate_y - y[query]
+        matches = (((candidate_x - half_width) < lane_center + lane_width / 2) & ((candidate_x + half_width) > lane_center - lane_width / 2)
+                   & (dx * dx + dy * dy <= self.sensing_distance_squared[ego[query]]))
+        if ahead:
+            matches &= (candidate_y > y[query]) & (candidate_y <= y[query] + sense[query])
+        else:
+            matches &= (candidate_y >= y[query] - sense[query]) & (candidate_y < y[query])
+        if not matches.any():
+            return result
+
+        query = query[matches]
+        # Nearest first, then first in the window
+        order = np.lexsort((index[matches], candidate_y[matches] if ahead else -candidate_y[matches], query))
+        query = query[order]
+        is_first = np.ones(len(query), dtype=bool)
+        is_first[1:] = query[1:] != query[:-1]
+        result[query[is_first]] = candidate[matches][order][is_first]
+        return result
+
+    def is_trajectory_safe(self, ego: np.ndarray, ego_position: np.ndarray, ego_velocity: np.ndarray, intent_lane: np.ndarray,
+                           ego_accel: np.ndarray, follower: np.ndarray, follower_position: np.ndarray, follower_velocity: np.ndarray,
+                           follower_accel: np.ndarray) -> np.ndarray:
+        """LaneStayStrategy.is_trajectory_safe for every row, the paths of all rows are stepped together."""
+        model = self.model
+        dt = model.dt
+        duration = LANE_CHANGE_DURATION
+        time_steps = int(duration / dt)
+        if model.profiler:
+            model.profiler.count('trajectory_predictions', len(ego))
+        target_lane_x = np.array([lane.start_position[0] for lane in model.highway.lanes], dtype=float)[intent_lane]
+
+        # Ego's lateral path, same recurrence as there
+        ego_x = ego_position[:, 0].copy()
+        ego_xs = np.empty((len(ego), time_steps))
+        for step in range(time_steps):
+            remaining_time = duration - (step * dt)
+            lateral_vel_x = (target_lane_x - ego_x) / remaining_time if remaining_time > 0 else 0
+            ego_x += lateral_vel_x * dt
+            ego_xs[:, step] = ego_x
+
+        ego_ys = self.predict_ys(ego_position[:, 1], ego_velocity[:, 1], ego_accel, dt, time_steps)
+        follower_ys = self.predict_ys(follower_position[:, 1], follower_velocity[:, 1], follower_accel, dt, time_steps)
+
+        dx = np.abs(ego_xs - follower_position[:, 0, None])
+        dy = np.abs(ego_ys - follower_ys)
+        is_colliding = np.any((dx < (self.width[ego] / 2 + self.width[follower] / 2)[:, None]) &
+                              (dy < (self.length[ego] / 2 + self.length[follower] / 2)[:, None]), axis=1)
+        return ~is_colliding
+
+    @staticmethod
+    def predict_ys(y: np.ndarray, vy: np.ndarray, ay: np.ndarray, dt: float, number_of_steps: int) -> np.ndarray:
+        """Utils.predict_positions along y for many states, (n, number_of_steps)."""
+        velocity_steps = np.repeat((ay * dt)[:, None], number_of_steps, axis=1)
+        velocities = np.cumsum(np.concatenate((vy[:, None], velocity_steps), axis=1), axis=1)[:, 1:]
+        return np.cumsum(np.concatenate((y[:, None], velocities * dt), axis=1), axis=1)[:, 1:]
+
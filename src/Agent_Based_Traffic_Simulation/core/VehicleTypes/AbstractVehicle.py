@@ -2,6 +2,9 @@ import numpy as np
 
 
 class AbstractVehicle:
+    # Fixed attributes, no per instance __dict__ (there can be tens of thousands of vehicles)
+    __slots__ = ('position', 'length', 'width', 'velocity', 'acceleration')
+
     def __init__(self, position: np.ndarray, length: float, width: float):
         self.position: np.ndarray = position
         self.length:float = length
@@ -12,5 +15,10 @@ class AbstractVehicle:
 
 
     def setAcceleration(self, new_a: np.array):
-        # absolute set, not incremental
-        self.acceleration = np.array(new_a, dtype=float)
+        # absolute set, not incremental. Written in place, so no new array per call and
+        # the vectorized engine's row views stay bound
+        self.acceleration[:] = new_a
+
+    def setAccelerationAlong(self, direction: np.array, magnitude: float):
+        # acceleration = direction * magnitude, without the temporary array
+        np.multiply(direction, magnitude, out=self.acceleration)
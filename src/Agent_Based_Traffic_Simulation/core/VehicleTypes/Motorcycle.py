@@ -6,7 +6,7 @@ from .AbstractVehicle import AbstractVehicle
 # Using it's dimensions
 
 class Motorcycle(AbstractVehicle):
+    __slots__ = ()
+
     def __init__(self, position: np.ndarray):
         super().__init__(position, 2410, 975)
-        self.velocity = np.array([0.0, 0.0], dtype=float)  # mm/ms
-        self.acceleration = np.array([0.0, 0.0], dtype=float)  # mm/ms^2
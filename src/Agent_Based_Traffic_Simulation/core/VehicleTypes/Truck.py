@@ -5,7 +5,7 @@ from .AbstractVehicle import AbstractVehicle
 # Using it's dimensions
 
 class Truck(AbstractVehicle):
+    __slots__ = ()
+
     def __init__(self, position: np.ndarray):
         super().__init__(position, 5887, 2690)
-        self.velocity = np.array([0.0, 0.0], dtype=float)  # mm/ms
-        self.acceleration = np.array([0.0, 0.0], dtype=float)  # mm/ms^2
@@ -110,21 +110,22 @@ function drawHighwayBorders() {
 // Agents
 function drawAgents() {
   if (!simReady) return;
-  for (const a of lastAgents) {
-    const [px, py] = worldToScreen(a.x, a.y);
-    const halfL = Math.max(0.5, (a.length * s - 1) / 2);
-    const halfW = (a.width * s) / 2;
+  const a = lastAgents;
+  for (let i = 0; i < a.count; i++) {
+    const [px, py] = worldToScreen(a.x[i], a.y[i]);
+    const halfL = Math.max(0.5, (a.length[i] * s - 1) / 2);
+    const halfW = (a.width[i] * s) / 2;
 
     const color =
       {
         brake: "#f77926",
         accelerate: "#22c55e",
         cruise: "#eab308",
-      }[a.drive_strategy] || "#ffffff";
+      }[DRIVE_STRATEGY_NAMES[a.driveStrategy[i]]] || "#ffffff";
 
     ctx.save();
     ctx.translate(px, py);
-    const heading = simType === "traffic" ? -a.heading : a.heading;
+    const heading = simType === "traffic" ? -a.heading[i] : a.heading[i];
     ctx.rotate(heading);
     ctx.fillStyle = color;
     ctx.strokeStyle = "#111";
@@ -155,6 +156,34 @@ function maskOutsideHighway() {
   if (R.y1 < H) ctx.fillRect(R.x0, R.y1, R.w, H - R.y1);
 }
 
+// Strip along the right edge with the agent density of the whole highway and the part on screen
+function drawDensity() {
+  if (!simReady || !lastDensity || lastDensity.length === 0) return;
+  const dpr = window.devicePixelRatio || 1;
+  const W = canvas.width / dpr;
+  const H = canvas.height / dpr;
+  const stripW = 8;
+  const binH = H / lastDensity.length;
+  const maxCount = Math.max(1, ...lastDensity);
+
+  ctx.save();
+  ctx.fillStyle = "#111";
+  ctx.fillRect(W - stripW, 0, stripW, H);
+  for (let i = 0; i < lastDensity.length; i++) {
+    if (!lastDensity[i]) continue;
+    // bin 0 starts at y = 0, the bottom of the highway
+    ctx.fillStyle = `rgba(234, 179, 8, ${0.2 + (0.8 * lastDensity[i]) / maxCount})`;
+    ctx.fillRect(W - stripW, H - (i + 1) * binH, stripW, Math.ceil(binH));
+  }
+  const { y_min, y_max } = visibleWindow();
+  ctx.strokeStyle = "#f5f5f5";
+  ctx.lineWidth = 1;
+  const top = H * (1 - Math.min(maxY, y_max) / maxY);
+  const bottom = H * (1 - Math.max(0, y_min) / maxY);
+  ctx.strokeRect(W - stripW + 0.5, top, stripW - 1, Math.max(1, bottom - top));
+  ctx.restore();
+}
+
 // Main redraw
 function redraw() {
   clearCanvas();
@@ -162,4 +191,5 @@ function redraw() {
   drawHighway();
   drawAgents();
   maskOutsideHighway();
+  drawDensity();
 }
@@ -181,6 +181,10 @@ function setSettings() {
     parseFloat(document.getElementById("laneSize").value) * 1000; // m to mm
   settings.isLogging = document.getElementById("isLogging").checked;
   settings.logDt = parseInt(document.getElementById("logDt").value, 10);
+  settings.isServerLoop = document.getElementById("isServerLoop").checked;
+  settings.realTimeFactor = parseFloat(
+    document.getElementById("realTimeFactor").value
+  );
 
   // Close the card
   if (settingsPanel) {
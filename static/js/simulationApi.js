@@ -2,6 +2,252 @@
 
 let pollingMs = 50;
 
+// Binary /api/step frame, see core/FrameEncoder.py
+const FRAME_MAGIC = "TSF1";
+const FRAME_FLOAT_FIELDS = ["x", "y", "vx", "vy", "speed", "length", "width", "heading", "sensingDistance"];
+const DRIVE_STRATEGY_NAMES = ["cruise", "accelerate", "brake"];
+const VEHICLE_TYPE_NAMES = ["SUV", "Truck", "Motorcycle"];
+
+// Decodes the frame starting at byte `start`, /api/advance can send several back to back
+function decodeFrame(buffer, start = 0) {
+  const view = new DataView(buffer, start);
+  const magic = frameMagic(buffer, start);
+  if (magic !== FRAME_MAGIC) throw new Error(`Unknown frame format ${magic}`);
+  const headerSize = view.getUint16(6, true);
+  const step = view.getUint32(8, true);
+  const count = view.getUint32(12, true);
+  const timeElapsed = view.getFloat64(16, true);
+  const avgSpeed = view.getFloat32(24, true);
+  const totalCount = view.getUint32(28, true);
+  const densityBins = view.getUint16(32, true);
+
+  // Every field is one typed array view over the response, no copying
+  const agents = { count };
+  let offset = start + headerSize;
+  for (const field of FRAME_FLOAT_FIELDS) {
+    agents[field] = new Float32Array(buffer, offset, count);
+    offset += 4 * count;
+  }
+  agents.id = new Uint32Array(buffer, offset, count);
+  offset += 4 * count;
+  agents.driveStrategy = new Uint8Array(buffer, offset, count);
+  offset += count;
+  agents.vehicleType = new Uint8Array(buffer, offset, count);
+  offset += count;
+  const density = new Uint16Array(buffer, offset, densityBins);
+  offset += 2 * densityBins;
+  offset += (4 - ((offset - start) % 4)) % 4; // frames are padded to 4 bytes
+
+  return {
+    status: "success",
+    step,
+    agents,
+    totalCount,
+    density,
+    byteLength: offset - start,
+    aggregateData: [
+      {
+        avg_speed: Math.round(avgSpeed * 100) / 100,
+        time_elapsed: Math.round(timeElapsed * 100) / 100,
+      },
+    ],
+  };
+}
+
+// Delta frame, see DeltaEncoder in core/FrameEncoder.py
+const DELTA_MAGIC = "TSD1";
+const DELTA_KEYFRAME = 1;
+const DELTA_WIDE = 2;
+const HEADING_STEPS = 65536;
+const SPEED_QUANTUM = 0.001;
+
+function frameMagic(buffer, start = 0) {
+  return String.fromCharCode(...new Uint8Array(buffer, start, 4));
+}
+
+function decodeDeltaFrame(buffer, start = 0) {
+  const view = new DataView(buffer, start);
+  if (frameMagic(buffer, start) !== DELTA_MAGIC) throw new Error("Not a delta frame");
+  const headerSize = view.getUint16(6, true);
+  const flags = view.getUint16(20, true);
+  const densityBins = view.getUint16(22, true);
+  const nRemoved = view.getUint32(40, true);
+  const nSpawned = view.getUint32(44, true);
+  const nUpdated = view.getUint32(48, true);
+
+  let offset = start + headerSize;
+  const take = (Type, n) => {
+    const array = new Type(buffer, offset, n);
+    offset += Type.BYTES_PER_ELEMENT * n;
+    return array;
+  };
+  const removed = take(Uint32Array, nRemoved);
+  const spawned = {
+    id: take(Uint32Array, nSpawned),
+    x: take(Int32Array, nSpawned),
+    y: take(Int32Array, nSpawned),
+    length: take(Float32Array, nSpawned),
+    width: take(Float32Array, nSpawned),
+    sensingDistance: take(Float32Array, nSpawned),
+  };
+  const DeltaArray = flags & DELTA_WIDE ? Int32Array : Int16Array;
+  const updated = {
+    id: take(Uint32Array, nUpdated),
+    dx: take(DeltaArray, nUpdated),
+    dy: take(DeltaArray, nUpdated),
+    heading: take(Uint16Array, nUpdated),
+    speed: take(Uint16Array, nUpdated),
+  };
+  const density = take(Uint16Array, densityBins);
+  spawned.vehicleType = take(Uint8Array, nSpawned);
+  updated.driveStrategy = take(Uint8Array, nUpdated);
+  offset += (4 - ((offset - start) % 4)) % 4;
+
+  return {
+    status: "success",
+    step: view.getUint32(8, true),
+    seq: view.getUint32(12, true),
+    baseSeq: view.getUint32(16, true),
+    isKeyframe: (flags & DELTA_KEYFRAME) !== 0,
+    count: view.getUint32(36, true),
+    totalCount: view.getUint32(52, true),
+    density,
+    removed,
+    spawned,
+    updated,
+    aggregateData: [
+      {
+        avg_speed: Math.round(view.getFloat32(32, true) * 100) / 100,
+        time_elapsed: Math.round(view.getFloat64(24, true) * 100) / 100,
+      },
+    ],
+    byteLength: offset - start,
+  };
+}
+
+// Apply a delta frame to deltaState. Returns false if it does not follow the frame we have
+function applyDeltaFrame(frame) {
+  if (frame.isKeyframe) deltaState.agents.clear();
+  else if (frame.baseSeq !== deltaState.seq) {
+    deltaState.seq = -1; // ask for a keyframe
+    return false;
+  }
+  const agents = deltaState.agents;
+  for (const id of frame.removed) agents.delete(id);
+
+  const sp = frame.spawned;
+  for (let i = 0; i < sp.id.length; i++) {
+    agents.set(sp.id[i], {
+      x: sp.x[i],
+      y: sp.y[i],
+      length: sp.length[i],
+      width: sp.width[i],
+      sensingDistance: sp.sensingDistance[i],
+      vehicleType: sp.vehicleType[i],
+      heading: 0,
+      speed: 0,
+      driveStrategy: 255,
+    });
+  }
+
+  const up = frame.updated;
+  for (let i = 0; i < up.id.length; i++) {
+    const a = agents.get(up.id[i]);
+    a.x += up.dx[i];
+    a.y += up.dy[i];
+    a.heading = (up.heading[i] / HEADING_STEPS) * 2 * Math.PI;
+    a.speed = up.speed[i] * SPEED_QUANTUM;
+    a.driveStrategy = up.driveStrategy[i];
+  }
+  deltaState.seq = frame.seq;
+  return true;
+}
+
+// deltaState in the same columns as decodeFrame
+function deltaStateToColumns() {
+  const count = deltaState.agents.size;
+  const agents = { count };
+  for (const field of FRAME_FLOAT_FIELDS) agents[field] = new Float32Array(count);
+  agents.id = new Uint32Array(count);
+  agents.driveStrategy = new Uint8Array(count);
+  agents.vehicleType = new Uint8Array(count);
+  let i = 0;
+  for (const [id, a] of deltaState.agents) {
+    agents.id[i] = id;
+    agents.x[i] = a.x;
+    agents.y[i] = a.y;
+    agents.vx[i] = a.speed * Math.cos(a.heading);
+    agents.vy[i] = a.speed * Math.sin(a.heading);
+    agents.speed[i] = a.speed;
+    agents.length[i] = a.length;
+    agents.width[i] = a.width;
+    agents.heading[i] = a.heading;
+    agents.sensingDistance[i] = a.sensingDistance;
+    agents.driveStrategy[i] = a.driveStrategy;
+    agents.vehicleType[i] = a.vehicleType;
+    i++;
+  }
+  return agents;
+}
+
+// Any /api/step or /api/advance response: full frames, delta frames (several back to back) or JSON.
+// Returns the frame to show, or null if deltas went out of sync (the next request gets a keyframe)
+async function readFrameResponse(res) {
+  if (res.headers.get("Content-Type") !== "application/octet-stream") {
+    const data = await res.json();
+    if (data.status === "success") {
+      data.agents = agentsToColumns(data.agents);
+      data.totalCount = data.total_agents;
+    }
+    return data;
+  }
+  const buffer = await res.arrayBuffer();
+  let frame = null;
+  for (let offset = 0; offset < buffer.byteLength; offset += frame.byteLength) {
+    if (frameMagic(buffer, offset) === DELTA_MAGIC) {
+      frame = decodeDeltaFrame(buffer, offset);
+      if (!applyDeltaFrame(frame)) return null;
+      frame.agents = null;
+    } else frame = decodeFrame(buffer, offset);
+  }
+  if (frame && frame.agents === null) frame.agents = deltaStateToColumns();
+  return frame;
+}
+
+function frameParams(params = {}) {
+  return new URLSearchParams({
+    format: frameFormat,
+    ...(frameFormat === "delta" ? { base: deltaState.seq } : {}),
+    ...visibleWindow(),
+    ...params,
+  });
+}
+
+// Same columns as decodeFrame from the JSON response
+function agentsToColumns(list) {
+  const count = list.length;
+  const agents = { count };
+  for (const field of FRAME_FLOAT_FIELDS) agents[field] = new Float32Array(count);
+  agents.id = new Uint32Array(count);
+  agents.driveStrategy = new Uint8Array(count);
+  agents.vehicleType = new Uint8Array(count).fill(255);
+  list.forEach((a, i) => {
+    agents.x[i] = a.x;
+    agents.y[i] = a.y;
+    agents.vx[i] = a.vx;
+    agents.vy[i] = a.vy;
+    agents.speed[i] = a.speed;
+    agents.length[i] = a.length;
+    agents.width[i] = a.width;
+    agents.heading[i] = a.heading;
+    agents.sensingDistance[i] = a.sensing_distance;
+    agents.id[i] = a.id;
+    const code = DRIVE_STRATEGY_NAMES.indexOf(a.drive_strategy);
+    agents.driveStrategy[i] = code < 0 ? 255 : code;
+  });
+  return agents;
+}
+
 async function initSimulation(type) {
   if (isRunning) {
     return;
@@ -23,6 +269,7 @@ async function initSimulation(type) {
       truck_ratio: settings.truckRatio,
       suv_ratio: settings.suv_ratio,
       motorcycle_ratio: settings.motorcycle_ratio,
+      real_time_factor: settings.realTimeFactor,
     });
     const res = await fetch(`/api/init?${params.toString()}`);
     const data = await res.json();
@@ -42,7 +289,9 @@ async function initSimulation(type) {
       startBtn.disabled = false;
       stopBtn.disabled = true;
       initBtn.disabled = true;
-      lastAgents = [];
+      lastAgents = emptyAgents();
+      resetDeltaState();
+      lastDensity = null;
       redraw();
     } else setStatus(`Error: ${data.message}`);
   } catch (err) {
@@ -58,7 +307,73 @@ function startSimulation() {
   stopBtn.disabled = false;
   initBtn.disabled = true;
   setStatus("Simulation running...", true);
-  intervalId = setInterval(stepSimulation, pollingMs);
+  if (settings.isServerLoop) startServerLoop();
+  else intervalId = setInterval(stepSimulation, pollingMs);
+}
+
+// The server steps the model on its own and pushes frames, slow clients just skip frames
+async function startServerLoop() {
+  const myRunId = runId;
+  try {
+    const params = new URLSearchParams({
+      real_time_factor: settings.realTimeFactor,
+    });
+    const res = await fetch(`/api/run/start?${params.toString()}`);
+    const data = await res.json();
+    if (!isRunning || myRunId !== runId) return;
+    if (data.status !== "success") {
+      setStatus(`Error: ${data.message}`);
+      stopSimulation();
+      return;
+    }
+    eventSource = new EventSource(
+      `/api/stream?${new URLSearchParams(visibleWindow())}`
+    );
+    eventSource.onmessage = (event) => {
+      if (!isRunning || myRunId !== runId) return;
+      const bytes = Uint8Array.from(atob(event.data), (c) => c.charCodeAt(0));
+      const frame = decodeFrame(bytes.buffer);
+      showFrame(frame, frame.agents);
+    };
+    // The server loop stopped on an error, don't let EventSource reconnect
+    eventSource.addEventListener("failed", (event) => {
+      if (myRunId !== runId) return;
+      stopSimulation();
+      setStatus(`Error: ${JSON.parse(event.data).message}`);
+    });
+  } catch (err) {
+    setStatus(`Error: ${err.message}`);
+    stopSimulation();
+  }
+}
+
+function showFrame(data, agents) {
+  lastAgents = agents;
+  lastDensity = data.density ?? null;
+  redraw();
+  stepCountSpan.textContent = data.step;
+  const totalCount = data.totalCount ?? agents.count;
+  agentCountSpan.textContent = totalCount;
+  let aggData = "";
+  for (const d of data.aggregateData) {
+    for (const key of Object.keys(d)) {
+      aggData += "| " + key + ": " + d[key] + " ";
+    }
+  }
+  aggData += "| off_screen: " + (totalCount - agents.count) + " ";
+  aggregateData.textContent = aggData;
+}
+
+// Tell the server loop what we are looking at, at most every viewUpdateMs
+let viewUpdateTimer = null;
+const viewUpdateMs = 200;
+function scheduleViewUpdate() {
+  if (!eventSource || viewUpdateTimer) return;
+  viewUpdateTimer = setTimeout(() => {
+    viewUpdateTimer = null;
+    if (!eventSource) return;
+    fetch(`/api/view?${new URLSearchParams(visibleWindow())}`).catch(() => {});
+  }, viewUpdateMs);
 }
 
 function stopSimulation() {
@@ -73,6 +388,11 @@ function stopSimulation() {
     stepAbortController.abort();
     stepAbortController = null;
   }
+  if (eventSource) {
+    eventSource.close();
+    eventSource = null;
+  }
+  if (settings.isServerLoop) fetch("/api/run/stop").catch(() => {});
   isRunning = false;
   startBtn.disabled = false;
   stopBtn.disabled = true;
@@ -86,7 +406,9 @@ async function resetSimulation() {
     const data = await res.json();
     if (data.status === "success") {
       simType = null;
-      lastAgents = [];
+      lastAgents = emptyAgents();
+      resetDeltaState();
+      lastDensity = null;
       simReady = false;
       startBtn.disabled = true;
       stopBtn.disabled = true;
@@ -102,6 +424,25 @@ async function resetSimulation() {
   }
 }
 
+// Fast forward `seconds` of simulated time in one request, only the last frame comes back
+async function advanceSimulation(seconds) {
+  if (!simReady || (isRunning && settings.isServerLoop)) return;
+  const myRunId = runId;
+  try {
+    const res = await fetch(`/api/advance?${frameParams({ seconds })}`);
+    if (myRunId !== runId) return;
+    const frame = await readFrameResponse(res);
+    if (!frame) return;
+    if (frame.status !== "success") {
+      setStatus(`Error: ${frame.message}`);
+      return;
+    }
+    showFrame(frame, frame.agents);
+  } catch (err) {
+    setStatus(`Error: ${err.message}`);
+  }
+}
+
 async function stepSimulation() {
   if (!isRunning) return;
 
@@ -113,21 +454,14 @@ async function stepSimulation() {
 
   const myRunId = runId;
   try {
-    const res = await fetch("/api/step", { signal: controller.signal });
+    const res = await fetch(`/api/step?${frameParams()}`, {
+      signal: controller.signal,
+    });
     if (!isRunning || myRunId !== runId) return;
-    const data = await res.json();
+    const data = await readFrameResponse(res);
+    if (!data || !isRunning || myRunId !== runId) return;
     if (data.status === "success") {
-      lastAgents = data.agents;
-      redraw();
-      stepCountSpan.textContent = data.step;
-      agentCountSpan.textContent = data.agents.length;
-      let aggData = "";
-      for (const d of data.aggregateData) {
-        for (const key of Object.keys(d)) {
-          aggData += "| " + key + ": " + d[key] + " ";
-        }
-      }
-      aggregateData.textContent = aggData;
+      showFrame(data, data.agents);
     } else {
       setStatus(`Error: ${data.message}`);
       stopSimulation();
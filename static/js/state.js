@@ -20,6 +20,8 @@ let settings = {
   truckRatio: 0,
   suv_ratio: 0,
   motorcycle_ratio: 0,
+  isServerLoop: true,
+  realTimeFactor: 1,
 };
 
 let isRunning = false,
@@ -49,11 +51,26 @@ let isPanning = false,
   oxAtPan = 0,
   oyAtPan = 0;
 
-let lastAgents = [];
+// Agents of the last frame as columns of typed arrays (see decodeFrame)
+function emptyAgents() {
+  return { count: 0 };
+}
+let lastAgents = emptyAgents();
+let lastDensity = null; // agents per bin along the whole highway, when the server culls to the view
+
+// "delta" frames with only what changed, "binary" typed array frames or "json" for /api/step
+let frameFormat = "delta";
+
+// Agents the delta frames were applied to, by id, and the last frame applied (-1 = need a keyframe)
+let deltaState = { seq: -1, agents: new Map() };
+function resetDeltaState() {
+  deltaState = { seq: -1, agents: new Map() };
+}
 
 let simReady = false;
 
 let stepAbortController = null; // abort in-flight /api/step
+let eventSource = null; // /api/stream while the server loop runs
 let runId = 0; // drops late responses from older runs
 
 // UI helpers
@@ -34,6 +34,18 @@ function worldToScreen(x, y) {
   return [ox + x * s, oy + (maxY - y) * s];
 }
 
+// Part of the highway on screen (mm) and the scale (px per mm), sent so the server only returns these agents
+function visibleWindow() {
+  const cssH = viewport.clientHeight;
+  const yTop = screenToWorld(0, 0)[1];
+  const yBottom = screenToWorld(0, cssH)[1];
+  return {
+    y_min: Math.round(Math.min(yTop, yBottom)),
+    y_max: Math.round(Math.max(yTop, yBottom)),
+    zoom: s,
+  };
+}
+
 // Zoom
 function setZoom(newZoom, ax = null, ay = null) {
   newZoom = Math.min(zoomSlider.max, Math.max(zoomSlider.min, newZoom));
@@ -50,6 +62,7 @@ function setZoom(newZoom, ax = null, ay = null) {
   zoomSlider.value = String(zoom);
   zoomLabel.textContent = `${Math.round(zoom * 100)}%`;
   redraw();
+  scheduleViewUpdate();
 }
 
 zoomSlider.addEventListener("input", (e) =>
@@ -89,6 +102,7 @@ function resetView() {
   ox = (cssW - contentW) / 2;
   oy = (cssH - contentH) / 2;
   redraw();
+  scheduleViewUpdate();
 }
 
 // Panning
@@ -105,6 +119,7 @@ window.addEventListener("mousemove", (e) => {
   ox = oxAtPan + (e.clientX - panStartX);
   oy = oyAtPan + (e.clientY - panStartY);
   redraw();
+  scheduleViewUpdate();
 });
 window.addEventListener("mouseup", () => {
   isPanning = false;